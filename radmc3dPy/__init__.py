@@ -4,6 +4,7 @@
 
 """
 from radmc3dPy import analyze
+from radmc3dPy import archive
 from radmc3dPy import crd_trans
 from radmc3dPy import data
 from radmc3dPy import dustopac
@@ -18,9 +19,11 @@ from radmc3dPy import radsources
 from radmc3dPy import reggrid
 from radmc3dPy import setup
 from radmc3dPy import staratm
+from radmc3dPy import textio
+from radmc3dPy import uvfit
 
 __version__ = "0.30"
 __author__ = "Attila Juhasz"
 __copyright__ = "Copyright (C) 2011-2018 Attila Juhasz"
-__all__ = ["analyze", "crd_trans", "data", "dustopac","image","miescat", "models", "molecule", "natconst", "octree",
-           "params", "radsources", "reggrid", "setup", "staratm"]
+__all__ = ["analyze", "archive", "crd_trans", "data", "dustopac","image","miescat", "models", "molecule", "natconst", "octree",
+           "params", "radsources", "reggrid", "setup", "staratm", "textio", "uvfit"]
@@ -13,6 +13,10 @@ from __future__ import print_function
 import traceback
 from multiprocessing import Pool
 from functools import partial
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
 
 try:
     import numpy as np
@@ -48,10 +52,11 @@ from . octree import *
 from . reggrid import *
 from . molecule import *
 from . import crd_trans
+from . import textio
 
 def readData(ddens=False, dtemp=False, gdens=False, gtemp=False, gvel=False, ispec=None, 
              vturb=False, alvec=False, qvis=False, bfield=False, grid=None,
-             fdir=None, binary=False, old=False, octree=False):
+             fdir=None, binary=False, old=False, octree=False, mmap=False, lazy=False):
     """Reads the physical variables of the model (e.g. density, velocity, temperature).
 
     Parameters
@@ -98,6 +103,13 @@ def readData(ddens=False, dtemp=False, gdens=False, gtemp=False, gvel=False, isp
     octree: bool
             True for models with octree AMR and False for models with regular grid
 
+    mmap  : bool
+            If True the scalar fields of binary files are memory-mapped instead of read into memory
+
+    lazy  : bool
+            If True the requested variables are not read here but only on their first access
+            (see radmc3dData.readLazy())
+
     Returns
     -------
     Returns an instance of the radmc3dData class 
@@ -115,20 +127,26 @@ def readData(ddens=False, dtemp=False, gdens=False, gtemp=False, gvel=False, isp
             res.grid = radmc3dGrid()
             res.grid.readSpatialGrid(fdir=fdir, old=old)
 
+    if lazy:
+        res.readLazy(ddens=ddens, dtemp=dtemp, gdens=gdens, gtemp=gtemp, gvel=gvel, ispec=ispec, vturb=vturb,
+                     alvec=alvec, qvis=qvis, bfield=bfield, fdir=fdir, binary=binary, old=old, octree=octree,
+                     mmap=mmap)
+        return res
+
     if ddens:
-        res.readDustDens(binary=binary, fdir=fdir, old=old, octree=octree)
+        res.readDustDens(binary=binary, fdir=fdir, old=old, octree=octree, mmap=mmap)
     if dtemp:
-        res.readDustTemp(binary=binary, fdir=fdir, old=old, octree=octree)
+        res.readDustTemp(binary=binary, fdir=fdir, old=old, octree=octree, mmap=mmap)
     if gvel:
         res.readGasVel(binary=binary, octree=octree, fdir=fdir)
     if gtemp:
-        res.readGasTemp(binary=binary, octree=octree, fdir=fdir)
+        res.readGasTemp(binary=binary, octree=octree, fdir=fdir, mmap=mmap)
     if vturb:
-        res.readVTurb(binary=binary, octree=octree, fdir=fdir)
+        res.readVTurb(binary=binary, octree=octree, fdir=fdir, mmap=mmap)
     if alvec:
         res.readDustAlign(binary=binary, fdir=fdir, octree=octree)
     if qvis:
-        res.readViscousHeating(binary=binary, fdir=fdir, octree=octree)
+        res.readViscousHeating(binary=binary, fdir=fdir, octree=octree, mmap=mmap)
     if bfield:
         res.readBfield(binary=binary, fdir=fdir, octree=octree)
     if gdens:
@@ -138,7 +156,7 @@ def readData(ddens=False, dtemp=False, gdens=False, gtemp=False, gvel=False, isp
                              + 'The ispec input keyword should be set to the name of the gas species as it appears in\n'
                              + 'numberdens_gasspecname.inp')
         else:
-            res.readGasDens(ispec=ispec, binary=binary, octree=octree)
+            res.readGasNdens(ispec=ispec, binary=binary, octree=octree, fdir=fdir, mmap=mmap)
 
     return res
 
@@ -324,14 +342,9 @@ def readSpectrum(fname='', old=False):
             dum = rfile.readline()
             # Read the number of wavelengths
             nwav = int(rfile.readline())
-            # Read a blank line
-            dum = rfile.readline()
-
-            res = np.zeros([nwav, 2], dtype=np.float64)
-            for iwav in range(nwav):
-                dum = rfile.readline().split()
-                res[iwav, 0] = float(dum[0])
-                res[iwav, 1] = float(dum[1])
+            # Read the wavelength / flux pairs
+            res = textio.readNumbers(rfile, count=2 * nwav)
+            res = np.reshape(res, [nwav, 2])
 
     else:
         if fname.strip() == '':
@@ -342,11 +355,9 @@ def readSpectrum(fname='', old=False):
             nwav = int(rfile.readline())
             rfile.readline()
 
-            res = np.zeros([nwav, 2], dtype=float)
-            for iwav in range(nwav):
-                dum = rfile.readline().split()
-                res[iwav, 0] = cc / float(dum[0]) * 1e4
-                res[iwav, 1] = float(dum[1])
+            res = textio.readNumbers(rfile, count=2 * nwav)
+            res = np.reshape(res, [nwav, 2])
+            res[:, 0] = cc / res[:, 0] * 1e4
 
     return res
 
@@ -1083,10 +1094,95 @@ def findContainerLeafIDRec(x=None, y=None, z=None, dx=None, dy=None, dz=None, ch
         return dum
 
 
-def interpolateOctree(data=None, x=None, y=None, z=None, var=None, nproc=1):
+# Variables supported by interpolateOctree() : name of the data attribute and the key in the returned dictionary
+_octreeInterpVars = {'ddens': 'rhodust', 'dtemp': 'dusttemp', 'gdens': 'rhogas', 'ndens': 'ndens_mol',
+                     'gtemp': 'gastemp', 'vturb': 'vturb', 'gvel': 'gasvel'}
+
+
+def _toSharedMemory(arr=None):
+    """Copies an array into a new shared memory block.
+
+    Returns
+    -------
+    A tuple of the SharedMemory object and the description of the array (name, shape, dtype) from which
+    _fromSharedMemory() can attach to it in another process
+    """
+
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def _fromSharedMemory(desc=None):
+    """Attaches to an array in shared memory created by _toSharedMemory().
+
+    Returns
+    -------
+    A tuple of the SharedMemory object (to be closed by the caller) and the array
+    """
+
+    shm = shared_memory.SharedMemory(name=desc[0])
+
+    return shm, np.ndarray(desc[1], dtype=np.dtype(desc[2]), buffer=shm.buf)
+
+
+def _locateOctreeLeavesWorker(indexDesc=None, cellIDDesc=None, x=None, y=None, z=None, ixRange=None):
+    """Finds the container leaves of the points x[ixRange[0]:ixRange[1]] x y x z of a regular mesh and writes their
+    tree indices into a shared array. The leaf index is attached from shared memory, so the tree is not pickled.
+
+    Parameters
+    ----------
+
+    indexDesc  : dict
+                 Attributes of the radmc3dOctreeIndex, the arrays key and cellID given as shared memory descriptions
+
+    cellIDDesc : tuple
+                 Shared memory description of the [nx, ny, nz] output array
+
+    x          : ndarray
+                 Coordinates of the mesh in the first dimension
+
+    y          : ndarray
+                 Coordinates of the mesh in the second dimension
+
+    z          : ndarray
+                 Coordinates of the mesh in the third dimension
+
+    ixRange    : tuple
+                 Range of the mesh indices in the first dimension to be processed
+    """
+
+    shmList = []
+    try:
+        index = radmc3dOctreeIndex()
+        for key, val in indexDesc.items():
+            if key in ['key', 'cellID']:
+                shm, val = _fromSharedMemory(val)
+                shmList.append(shm)
+            setattr(index, key, val)
+        shm, cellID = _fromSharedMemory(cellIDDesc)
+        shmList.append(shm)
+
+        i0, i1 = ixRange
+        cellID[i0:i1] = index.getContainerLeafID(x[i0:i1, np.newaxis, np.newaxis], y[np.newaxis, :, np.newaxis],
+                                                 z[np.newaxis, np.newaxis, :])
+        # Drop the views into the shared buffers before closing them
+        del index, cellID
+    finally:
+        for shm in shmList:
+            shm.close()
+
+    return
+
+
+def interpolateOctree(data=None, x=None, y=None, z=None, var=None, nproc=1, index=None):
     """
     Nearest neighbour inteprolation on an octree
 
+    The regular mesh x, y, z is built by broadcasting, the container leaves of all points are found at once with a
+    spatial index of the leaves (see radmc3dOctreeIndex) and the variables are gathered with fancy indexing.
+
     data        : radmc3dData
                   Data container
 
@@ -1101,218 +1197,93 @@ def interpolateOctree(data=None, x=None, y=None, z=None, var=None, nproc=1):
 
     var         : list
                   Name of the variables to be interpolated, supported names are:
-                  ddens, dtemp, gdens, ndens, gtemp, gvel, vturb
+                  ddens, dtemp, gdens, ndens, gtemp, gvel (or vx, vy, vz), vturb
 
     nproc       : int
-                  Number of processes to be used (for parallel computing) 
+                  Number of processes to be used for finding the container leaves. The leaf index is shared with the
+                  processes through shared memory.
+
+    index       : radmc3dOctreeIndex, optional
+                  Spatial index of the leaves of data.grid (see radmc3dOctree.getLeafIndex()). If not set it is built
+                  on each call, so it should be passed for repeated interpolations on the same grid.
 
     Returns:
     --------
-    A dictionary with the interpolated fields 
+    A dictionary with the interpolated fields (rhodust, dusttemp, rhogas, ndens_mol, gastemp, vturb, gasvel with
+    [nx, ny, nz] or [nx, ny, nz, ndim] dimensions, zero outside of the grid) and the tree indices of the container
+    leaves (cellID, flattened, -1 outside of the grid)
 
     """
 
     if var is None:
         var = ['ddens']
+    if isinstance(var, str):
+        var = [var]
+
+    for v in var:
+        if (v not in _octreeInterpVars) & (v not in ['vx', 'vy', 'vz']):
+            raise ValueError('Unknown variable to be interpolated : ' + str(v) + '\n Allowed variable names are : '
+                             + ', '.join(_octreeInterpVars.keys()))
+
+    if (nproc > 1) & (shared_memory is None):
+        print('multiprocessing.shared_memory is not available, falling back to a single process')
+        nproc = 1
 
     if nproc == 1:
         print("Nearest neighbour interpolation using " + ("%d" % nproc) + ' process')
     else:
         print("Nearest neighbour interpolation using " + ("%d" % nproc) + ' processes')
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    z = np.asarray(z, dtype=np.float64)
     nx = x.shape[0]
     ny = y.shape[0]
     nz = z.shape[0]
 
-    npoint = nx * ny * nz
+    if index is None:
+        index = data.grid.getLeafIndex()
 
     if nproc > 1:
-        cellCRD = np.zeros([data.grid.nCell, 3], dtype=np.float64)
-        cellHW = np.zeros([data.grid.nCell, 3], dtype=np.float64)
-
-        cellCRD[:, 0] = data.grid.x
-        cellCRD[:, 1] = data.grid.y
-        cellCRD[:, 2] = data.grid.z
-        cellHW[:, 0] = data.grid.dx
-        cellHW[:, 1] = data.grid.dy
-        cellHW[:, 2] = data.grid.dz
-        childID = np.array(data.grid.childID)
-
-        chunkSize = int(np.ceil(float(npoint) / nproc))
-
-        crdList = np.zeros([npoint, 3], dtype=np.float64)
-        for ind in range(npoint):
-            ix = int(np.floor(ind / ny / nz))
-            iy = int(np.floor((ind - ix * ny * nz) / nz))
-            iz = int(ind - ix * ny * nz - iy * nz)
-
-            crdList[ind, 0] = x[ix]
-            crdList[ind, 1] = y[iy]
-            crdList[ind, 2] = z[iz]
-
-        pool = Pool(processes=nproc)
-        target = partial(findContainerLeafID, cellCRD, cellHW, data.grid.xi, data.grid.yi, data.grid.zi, childID,
-                         data.grid.isLeaf, data.grid.nChild)
-        res = pool.map(target, crdList, chunksize=chunkSize)
-        res = np.array(res)
-        pool.close()
-
-        idata = {'cellID': None, 'rhodust': None, 'dusttemp': None, 'rhogas': None, 'ndens_mol': None, 'gtemp': None,
-                 'vturb': None, 'gvel': None}
-
-        idata['cellID'] = res
-
-        if 'ddens' in var:
-            ndust = data.rhodust.shape[1]
-            idata['rhodust'] = np.zeros([nx, ny, nz, ndust], dtype=np.float64)
-            for ind in range(npoint):
-                ix = int(np.floor(ind / ny / nz))
-                iy = int(np.floor((ind - ix * ny * nz) / nz))
-                iz = int(ind - ix * ny * nz - iy * nz)
-
-                if res[ind] >= 0:
-                    idata['rhodust'][ix, iy, iz, :] = data.rhodust[data.grid.leafID[res[ind]], :]
-                else:
-                    idata['rhodust'][ix, iy, iz, :] = 0
-
-        if 'dtemp' in var:
-            ndust = data.dusttemp.shape[1]
-            idata['dusttemp'] = np.zeros([nx, ny, nz, ndust], dtype=np.float64)
-            for ind in range(npoint):
-                ix = int(np.floor(ind / ny / nz))
-                iy = int(np.floor((ind - ix * ny * nz) / nz))
-                iz = int(ind - ix * ny * nz - iy * nz)
-
-                if res[ind] is not None:
-                    idata['dusttemp'][ix, iy, iz, :] = data.dusttemp[data.grid.leafID[res[ind]], :]
-                else:
-                    idata['dusttemp'][ix, iy, iz, :] = 0
-
-        if 'gdens' in var:
-            idata['rhogas'] = np.zeros([nx, ny, nz], dtype=np.float64)
-            for ind in range(npoint):
-                ix = int(np.floor(ind / ny / nz))
-                iy = int(np.floor((ind - ix * ny * nz) / nz))
-                iz = int(ind - ix * ny * nz - iy * nz)
-
-                if res[ind] is not None:
-                    idata['rhogas'][ix, iy, iz] = data.rhogas[data.grid.leafID[res[ind]]]
-                else:
-                    idata['rhogas'][ix, iy, iz] = 0
-
-        if 'ndens' in var:
-            idata['ndens_mol'] = np.zeros([nx, ny, nz], dtype=np.float64)
-            for ind in range(npoint):
-                ix = int(np.floor(ind / ny / nz))
-                iy = int(np.floor((ind - ix * ny * nz) / nz))
-                iz = int(ind - ix * ny * nz - iy * nz)
-
-                if res[ind] is not None:
-                    idata['ndens_mol'][ix, iy, iz] = data.ndens_mol[data.grid.leafID[res[ind]]]
-                else:
-                    idata['ndens_mol'][ix, iy, iz] = 0
-
-        if 'gtemp' in var:
-            idata['gastemp'] = np.zeros([nx, ny, nz], dtype=np.float64)
-            for ind in range(npoint):
-                ix = int(np.floor(ind / ny / nz))
-                iy = int(np.floor((ind - ix * ny * nz) / nz))
-                iz = int(ind - ix * ny * nz - iy * nz)
-
-                if res[ind] is not None:
-                    idata['gastemp'][ix, iy, iz] = data.gastemp[data.grid.leafID[res[ind]]]
-                else:
-                    idata['gastemp'][ix, iy, iz] = 0
-
-        if 'vturb' in var:
-            idata['vturb'] = np.zeros([nx, ny, nz], dtype=np.float64)
-            for ind in range(npoint):
-                ix = int(np.floor(ind / ny / nz))
-                iy = int(np.floor((ind - ix * ny * nz) / nz))
-                iz = int(ind - ix * ny * nz - iy * nz)
-
-                if res[ind] is not None:
-                    idata['vturb'][ix, iy, iz] = data.vturb[data.grid.leafID[res[ind]]]
-                else:
-                    idata['vturb'][ix, iy, iz] = 0
-
-        if 'gvel' in var:
-            idata['gvel'] = np.zeros([nx, ny, nz, 3], dtype=np.float64)
-            for ind in range(npoint):
-                ix = int(np.floor(ind / ny / nz))
-                iy = int(np.floor((ind - ix * ny * nz) / nz))
-                iz = int(ind - ix * ny * nz - iy * nz)
-
-                if res[ind] is not None:
-                    idata['gasvel'][ix, iy, iz, :] = data.gasvel[data.grid.leafID[res[ind]], :]
-                else:
-                    idata['gasvel'][ix, iy, iz, :] = 0
+        shmList = []
+        try:
+            indexDesc = dict(index.__dict__)
+            for key in ['key', 'cellID']:
+                shm, indexDesc[key] = _toSharedMemory(getattr(index, key))
+                shmList.append(shm)
+            cellIDShm, cellIDDesc = _toSharedMemory(np.zeros([nx, ny, nz], dtype=np.int64))
+            shmList.append(cellIDShm)
+
+            bounds = np.linspace(0, nx, min(nproc, nx) + 1).astype(np.int64)
+            ixRange = [(bounds[i], bounds[i + 1]) for i in range(bounds.shape[0] - 1)]
+            pool = Pool(processes=nproc)
+            try:
+                pool.map(partial(_locateOctreeLeavesWorker, indexDesc, cellIDDesc, x, y, z), ixRange)
+            finally:
+                pool.close()
+                pool.join()
+
+            cellID = np.ndarray(cellIDDesc[1], dtype=np.dtype(cellIDDesc[2]), buffer=cellIDShm.buf).copy()
+        finally:
+            for shm in shmList:
+                shm.close()
+                shm.unlink()
     else:
-
-        idata = {}
-        if 'ddens' in var:
-            ndust = data.rhodust.shape[1]
-            idata['rhodust'] = np.zeros([nx, ny, nz, ndust], dtype=np.float64)
-        if 'dtemp' in var:
-            ndust = data.dusttemp.shape[1]
-            idata['dusttemp'] = np.zeros([nx, ny, nz, ndust], dtype=np.float64)
-        if 'gdens' in var:
-            idata['rhogas'] = np.zeros([nx, ny, nz], dtype=np.float64)
-        if 'ndens' in var:
-            idata['ndens_mol'] = np.zeros([nx, ny, nz], dtype=np.float64)
-        if 'gtemp' in var:
-            idata['gastemp'] = np.zeros([nx, ny, nz], dtype=np.float64)
-        if 'vturb' in var:
-            idata['vturb'] = np.zeros([nx, ny, nz], dtype=np.float64)
-        if 'gvel' in var:
-            idata['gvel'] = np.zeros([nx, ny, nz, 3], dtype=np.float64)
-
-        idata['cellID'] = np.zeros(npoint, dtype=np.int)
-
-        for ind in range(npoint):
-
-            ix = int(np.floor(ind / ny / nz))
-            iy = int(np.floor((ind - ix * ny * nz) / nz))
-            iz = int(ind - ix * ny * nz - iy * nz)
-
-            cellID = data.grid.getContainerLeafID((x[ix], y[iy], z[iz]))
-
-            if cellID is not None:
-                idata['cellID'][ind] = cellID
-                if 'ddens' in var:
-                    if cellID >= 0:
-                        idata['rhodust'][ix, iy, iz, :] = data.rhodust[data.grid.leafID[cellID]]
-                    else:
-                        idata['rhodust'][ix, iy, iz, :] = 0.0
-                if 'dtemp' in var:
-                    if cellID >= 0:
-                        idata['dusttemp'][ix, iy, iz, :] = data.dusttemp[data.grid.leafID[cellID]]
-                    else:
-                        idata['dusttemp'][ix, iy, iz, :] = 0.0
-                if 'gdens' in var:
-                    if cellID >= 0:
-                        idata['rhogas'][ix, iy, iz] = data.ndens_mol[data.grid.leafID[cellID]]
-                    else:
-                        idata['rhogas'][ix, iy, iz] = 0.0
-                if 'ndens' in var:
-                    if cellID >= 0:
-                        idata['ndens_mol'][ix, iy, iz] = data.ndens_mol[data.grid.leafID[cellID]]
-                    else:
-                        idata['ndens_mol'][ix, iy, iz] = 0.0
-                if 'gtemp' in var:
-                    if cellID >= 0:
-                        idata['gastemp'][ix, iy, iz] = data.gastemp[data.grid.leafID[cellID]]
-                    else:
-                        idata['gastemp'][ix, iy, iz] = 0.0
-                if 'vturb' in var:
-                    if cellID >= 0:
-                        idata['vturb'][ix, iy, iz] = data.vturb[data.grid.leafID[cellID]]
-                    else:
-                        idata['vturb'][ix, iy, iz] = 0.0
-                if 'gvel' in var:
-                    if cellID >= 0:
-                        idata['gasvel'][ix, iy, iz, :] = data.gasvel[data.grid.leafID[cellID], :]
-                    else:
-                        idata['gasvel'][ix, iy, iz, :] = 0.0
+        cellID = index.getContainerLeafID(x[:, np.newaxis, np.newaxis], y[np.newaxis, :, np.newaxis],
+                                          z[np.newaxis, np.newaxis, :])
+
+    inside = cellID >= 0
+    leafID = data.grid.leafID[np.where(inside, cellID, 0)]
+
+    idata = {'cellID': cellID.ravel()}
+    for v in var:
+        # The velocity components used by plotSlice2D() are all taken from the gas velocity
+        if v in ['vx', 'vy', 'vz']:
+            v = 'gvel'
+        key = _octreeInterpVars[v]
+        if key not in idata:
+            idata[key] = getattr(data, key)[leafID]
+            idata[key][~inside] = 0.
 
     return idata
 
@@ -0,0 +1,315 @@
+"""This module contains functions to store a complete RADMC-3D model (grid, physical fields and the small input
+files such as opacities, stellar sources and parameters) in a single archive file
+
+HDF5 files (via h5py) are used if h5py is available, otherwise the archive falls back to an uncompressed numpy
+NPZ file. Both formats store the arrays in their native binary form, so an archive can be loaded much faster than
+the formatted RADMC-3D input files and a model catalogue needs a single file per model instead of a directory.
+The archive is organised into groups, each containing named arrays and a set of scalar attributes.
+
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import traceback
+import os
+import glob
+import json
+import warnings
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print(' Numpy cannot be imported ')
+    print(' To use the python module of RADMC-3D you need to install Numpy')
+    print(traceback.format_exc())
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+    print('h5py cannot be imported. Model archives will be written in NPZ format instead of HDF5.')
+
+from . reggrid import radmc3dGrid
+from . octree import radmc3dOctree
+
+# Input files (glob patterns) of a model directory that are stored verbatim in an archive
+archiveFiles = ['problem_params.inp', 'radmc3d.inp', 'dustopac.inp', 'dustkappa_*.inp', 'dustkapscatmat_*.inp',
+                'dustkapalignfact_*.inp', 'stars.inp', 'stellarsrc_templates.inp', 'stellarsrc_density.inp',
+                'stellarsrc_density.binp', 'external_source.inp', 'lines.inp', 'molecule_*.inp',
+                'wavelength_micron.inp', 'camera_wavelength_micron.inp', 'mcmono_wavelength_micron.inp']
+
+# Classes that can be reconstructed from an archive
+_archiveClasses = {'radmc3dGrid': radmc3dGrid, 'radmc3dOctree': radmc3dOctree}
+
+_hdf5Signature = b'\x89HDF\r\n\x1a\n'
+
+
+def _getFormat(fname='', fmt=None, signature=True):
+    """Returns the format of an archive ('hdf5' or 'npz').
+
+    Parameters
+    ----------
+
+    fname     : str
+                Name of the archive file
+
+    fmt       : str, optional
+                Format requested explicitly ('hdf5' or 'npz')
+
+    signature : bool
+                If True and the file exists its format is taken from the file signature, otherwise from the extension
+    """
+
+    if fmt is None:
+        if signature and os.path.isfile(fname):
+            with open(fname, 'rb') as rfile:
+                sig = rfile.read(len(_hdf5Signature))
+            fmt = 'hdf5' if sig == _hdf5Signature else 'npz'
+        elif os.path.splitext(fname)[1].lower() in ['.h5', '.hdf5']:
+            fmt = 'hdf5'
+        elif os.path.splitext(fname)[1].lower() == '.npz':
+            fmt = 'npz'
+        else:
+            fmt = 'npz' if h5py is None else 'hdf5'
+
+    fmt = fmt.lower()
+    if fmt not in ['hdf5', 'npz']:
+        raise ValueError('Unknown archive format ' + fmt + '. Supported formats are hdf5 and npz.')
+    if (fmt == 'hdf5') & (h5py is None):
+        raise ImportError('h5py is required to read/write HDF5 archives. Install h5py or use the npz format.')
+
+    return fmt
+
+
+def _toNative(val):
+    """Converts numpy scalars to native python types so that they can be JSON encoded.
+    """
+    if isinstance(val, np.generic):
+        return val.item()
+    return val
+
+
+def writeArchive(fname='', groups=None, fmt=None, compression=None):
+    """Writes an archive file.
+
+    Parameters
+    ----------
+
+    fname       : str
+                  Name of the archive file
+
+    groups      : dict
+                  Content of the archive, a dictionary of group name : (arrays, attrs), where arrays is a dictionary
+                  of numpy arrays and attrs is a dictionary of JSON serializable values
+
+    fmt         : {'hdf5', 'npz'}, optional
+                  Format of the archive. If not set HDF5 is used if h5py is available and NPZ otherwise.
+
+    compression : str, optional
+                  Compression filter of the HDF5 datasets (e.g. 'gzip', 'lzf'). NPZ archives are never compressed.
+
+    Returns
+    -------
+    The format of the archive written
+    """
+
+    if fname == '':
+        raise ValueError('Unknown archive file name.')
+    if groups is None:
+        groups = {}
+
+    fmt = _getFormat(fname, fmt, signature=False)
+
+    print('Writing ' + fname)
+    if fmt == 'hdf5':
+        with h5py.File(fname, 'w') as wfile:
+            for gname, (arrays, attrs) in groups.items():
+                grp = wfile.create_group(gname)
+                grp.attrs['attrs'] = json.dumps({k: _toNative(v) for k, v in attrs.items()})
+                for name, arr in arrays.items():
+                    arr = np.asarray(arr)
+                    if arr.size > 1:
+                        # Chunked datasets can be read partially and compressed
+                        grp.create_dataset(name, data=arr, chunks=True, compression=compression)
+                    else:
+                        grp.create_dataset(name, data=arr)
+    else:
+        content = {}
+        for gname, (arrays, attrs) in groups.items():
+            content[gname + '/__attrs__'] = np.array(json.dumps({k: _toNative(v) for k, v in attrs.items()}))
+            for name, arr in arrays.items():
+                content[gname + '/' + name] = np.asarray(arr)
+        # Write through a file object, otherwise numpy appends an .npz extension to the file name
+        with open(fname, 'wb') as wfile:
+            np.savez(wfile, **content)
+
+    return fmt
+
+
+def readArchive(fname=''):
+    """Reads an archive file.
+
+    Parameters
+    ----------
+
+    fname : str
+            Name of the archive file
+
+    Returns
+    -------
+    A dictionary of group name : (arrays, attrs) (see writeArchive())
+    """
+
+    if not os.path.isfile(fname):
+        raise ValueError(fname + ' cannot be found.')
+
+    fmt = _getFormat(fname)
+
+    print('Reading ' + fname)
+    groups = {}
+    if fmt == 'hdf5':
+        with h5py.File(fname, 'r') as rfile:
+            for gname, grp in rfile.items():
+                attrs = json.loads(grp.attrs['attrs'])
+                arrays = {name: ds[()] for name, ds in grp.items()}
+                groups[gname] = (arrays, attrs)
+    else:
+        with np.load(fname, allow_pickle=False) as rfile:
+            for key in rfile.files:
+                gname, name = key.split('/', 1)
+                if gname not in groups:
+                    groups[gname] = ({}, {})
+                if name == '__attrs__':
+                    groups[gname][1].update(json.loads(str(rfile[key])))
+                else:
+                    groups[gname][0][name] = rfile[key]
+
+    return groups
+
+
+def packObject(obj=None):
+    """Converts the attributes of an object (e.g. a grid) into arrays and attributes that can be archived.
+
+    Parameters
+    ----------
+
+    obj : object
+          Object whose attributes should be packed. Numpy arrays and lists of numbers or strings are stored as
+          arrays, scalars and strings as attributes. Other attributes are skipped with a warning.
+
+    Returns
+    -------
+    A tuple of (arrays, attrs) dictionaries
+    """
+
+    arrays = {}
+    attrs = {'class': obj.__class__.__name__}
+    lists = []
+    for key, val in obj.__dict__.items():
+        if isinstance(val, (bool, int, float, str, np.bool_, np.integer, np.floating)) or (val is None):
+            attrs[key] = _toNative(val)
+            continue
+
+        if isinstance(val, (list, tuple)):
+            lists.append(key)
+            val = np.array(val)
+
+        if isinstance(val, np.ndarray) and (val.dtype.kind in 'biufU'):
+            arrays[key] = val
+        else:
+            if key in lists:
+                lists.remove(key)
+            warnings.warn('Attribute ' + key + ' of ' + attrs['class'] + ' cannot be archived and is skipped.',
+                          RuntimeWarning)
+
+    attrs['__lists__'] = lists
+
+    return arrays, attrs
+
+
+def unpackObject(arrays=None, attrs=None, obj=None):
+    """Restores the attributes of an object packed by packObject().
+
+    Parameters
+    ----------
+
+    arrays : dict
+             Arrays of the object
+
+    attrs  : dict
+             Attributes of the object
+
+    obj    : object, optional
+             Object whose attributes should be set. If not set a new instance of the archived class is created.
+
+    Returns
+    -------
+    The object
+    """
+
+    if obj is None:
+        cname = attrs.get('class', None)
+        if cname not in _archiveClasses:
+            raise ValueError('Unknown archived class ' + str(cname))
+        obj = _archiveClasses[cname]()
+
+    lists = attrs.get('__lists__', [])
+    for key, val in attrs.items():
+        if key not in ['class', '__lists__']:
+            setattr(obj, key, val)
+    for key, val in arrays.items():
+        setattr(obj, key, val.tolist() if key in lists else val)
+
+    return obj
+
+
+def packFiles(fdir='', files=None):
+    """Reads the content of model input files as raw bytes.
+
+    Parameters
+    ----------
+
+    fdir  : str
+            Model directory
+
+    files : list, optional
+            File names or glob patterns relative to fdir. If not set archiveFiles is used.
+
+    Returns
+    -------
+    A dictionary of file name : uint8 array
+    """
+
+    if files is None:
+        files = archiveFiles
+
+    content = {}
+    for pattern in files:
+        for fname in sorted(glob.glob(os.path.join(fdir, pattern))):
+            with open(fname, 'rb') as rfile:
+                content[os.path.basename(fname)] = np.frombuffer(rfile.read(), dtype=np.uint8)
+
+    return content
+
+
+def unpackFiles(fdir='', content=None):
+    """Writes files stored by packFiles() to a directory.
+
+    Parameters
+    ----------
+
+    fdir    : str
+              Directory into which the files should be written
+
+    content : dict
+              Dictionary of file name : uint8 array
+    """
+
+    if content is None:
+        return
+
+    for name, buf in content.items():
+        fname = os.path.join(fdir, name)
+        print('Writing ' + fname)
+        with open(fname, 'wb') as wfile:
+            wfile.write(np.asarray(buf, dtype=np.uint8).tobytes())
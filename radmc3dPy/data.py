@@ -6,6 +6,8 @@ from __future__ import print_function
 import traceback
 import os
 import warnings
+import zlib
+from functools import partial
 
 try:
     import numpy as np
@@ -17,8 +19,10 @@ except ImportError:
 
 from . import natconst as nc
 from . import crd_trans
+from . import textio
+from . import archive
 from . dustopac import *
-from . reggrid import radmc3dGrid
+from . reggrid import radmc3dGrid, extrapolate_geo
 from . octree import radmc3dOctree
     
 class radmc3dData(object):
@@ -84,11 +88,25 @@ class radmc3dData(object):
     radfield  : ndarray
                 the radiation field calculated by "radmc3d mcmono"
 
+    writeChunkSize : int
+                Maximum number of array elements the field writers copy and write at once
+
+    precision : int
+                Floating point precision of the physical fields in bytes (4 - single, 8 - double). Binary files
+                are written with this precision and formatted ASCII files are read into arrays of this precision.
+
+    Fields registered with readLazy() are not read until they are first accessed. After that they behave as
+    ordinary attributes until they are dropped again with release().
+
     """
 
-    def __init__(self):
+    # Physical fields of the model (attribute names)
+    _fieldNames = ['rhodust', 'dusttemp', 'rhogas', 'gasndens', 'ndens_mol', 'ndens_cp', 'gasvel', 'gastemp', 'vturb',
+                   'alvec', 'qvis', 'bfield', 'radfield']
+
+    def __init__(self, grid=None, precision=8):
 
-        self.grid = None
+        self.grid = grid
  
         self.rhodust = np.zeros(0, dtype=np.float64)
         self.dusttemp = np.zeros(0, dtype=np.float64)
@@ -108,70 +126,687 @@ class radmc3dData(object):
         self.bfield = np.zeros(0, dtype=np.float64)
         self.radfield = np.zeros(0, dtype=np.float64)
 
-    def _scalarfieldWriter(self, fname, arr, binary=False):
-        """Writes a scalar field to a file.
+        self.writeChunkSize = 4 * 1024 * 1024
+        self.precision = precision
+        self._getPrecisionDtype(precision)
+
+    def _getPrecisionDtype(self, precision=None):
+        """Returns the numpy data type belonging to a floating point precision.
 
         Parameters
         ----------
 
-        arr   : ndarray
-                Scalar variable to be written
+        precision : int, optional
+                    Precision in bytes (4 - single, 8 - double). If None radmc3dData.precision is used.
+
+        Returns
+        -------
+
+        Returns np.float32 or np.float64
+        """
+
+        if precision is None:
+            precision = self.precision
+
+        if precision == 4:
+            return np.float32
+        elif precision == 8:
+            return np.float64
+        else:
+            raise ValueError('Unknown precision ' + str(precision) + '. RADMC-3D binary files store 4 byte '
+                             + 'floats or 8 byte doubles, so precision should be either 4 or 8.')
+
+    def setPrecision(self, precision=8):
+        """Sets the floating point precision of the data and converts the physical fields already present.
+
+        Parameters
+        ----------
+
+        precision : int
+                    Precision in bytes (4 - single, 8 - double)
+        """
+
+        dtype = self._getPrecisionDtype(precision)
+        self.precision = precision
+
+        for name in self._fieldNames:
+            arr = self.__dict__.get(name, None)
+            if isinstance(arr, np.ndarray) and (arr.dtype != dtype):
+                setattr(self, name, arr.astype(dtype))
+
+    def __getattr__(self, name):
+        """Reads a lazily registered field on its first access (see readLazy()).
+        """
+
+        # Only called if the normal attribute lookup fails, i.e. if the field has not been loaded yet
+        loaders = self.__dict__.get('_lazyLoaders', {})
+        if name not in loaders:
+            raise AttributeError("'" + self.__class__.__name__ + "' object has no attribute '" + name + "'")
+
+        # Readers may look at the current content of the field (e.g. readGasNdens() appends species), so
+        # start from an empty array
+        self.__dict__[name] = np.zeros(0, dtype=np.float64)
+        try:
+            loaders[name]()
+        except Exception:
+            del self.__dict__[name]
+            raise
+
+        return self.__dict__[name]
+
+    def readLazy(self, ddens=False, dtemp=False, gdens=False, gtemp=False, gvel=False, ispec=None, vturb=False,
+                 alvec=False, qvis=False, bfield=False, radfield=False, fdir=None, binary=False, old=False,
+                 octree=False, mmap=False):
+        """Registers physical variables to be read on demand.
+
+        The files are not read here. Each registered field is read the first time it is accessed (e.g.
+        data.rhodust) and is kept afterwards. Use release() to free the memory of the loaded fields.
+
+        Parameters
+        ----------
+
+        ddens    : bool
+                   If True the dust density is registered
+
+        dtemp    : bool
+                   If True the dust temperature is registered
+
+        gdens    : bool
+                   If True the gas number density of species ispec is registered
+
+        gtemp    : bool
+                   If True the gas temperature is registered
+
+        gvel     : bool
+                   If True the gas velocity is registered
+
+        ispec    : str
+                   Name of the gas species in the 'numberdens_ispec.inp' filename
+
+        vturb    : bool
+                   If True the microturbulent velocity field is registered
+
+        alvec    : bool
+                   If True the dust alignment vector field is registered
+
+        qvis     : bool
+                   If True the viscous heating (heatsource.inp) is registered
+
+        bfield   : bool
+                   If True the magnetic field is registered
+
+        radfield : bool
+                   If True the mean intensity (mean_intensity.out) is registered
+
+        fdir     : str, optional
+                   Directory of the model
+
+        binary   : bool
+                   Set it to True for C-style binary and False for formatted ASCII files
+
+        old      : bool, optional
+                   If set to True the file format of the previous, 2D version of radmc will be used
+
+        octree   : bool
+                   True for models with octree AMR and False for models with regular grid
+
+        mmap     : bool
+                   If True the scalar fields of binary files are memory-mapped instead of read into memory
+        """
+
+        loaders = {}
+        if ddens:
+            loaders['rhodust'] = partial(self.readDustDens, binary=binary, fdir=fdir, old=old, octree=octree,
+                                         mmap=mmap)
+        if dtemp:
+            loaders['dusttemp'] = partial(self.readDustTemp, binary=binary, fdir=fdir, old=old, octree=octree,
+                                          mmap=mmap)
+        if gdens:
+            if not ispec:
+                raise ValueError('Unknown ispec. The gas number density cannot be registered without the name of '
+                                 + 'the gas species')
+            loaders['gasndens'] = partial(self.readGasNdens, ispec=ispec, binary=binary, fdir=fdir, octree=octree,
+                                          mmap=mmap)
+        if gtemp:
+            loaders['gastemp'] = partial(self.readGasTemp, binary=binary, fdir=fdir, octree=octree, mmap=mmap)
+        if gvel:
+            loaders['gasvel'] = partial(self.readGasVel, binary=binary, fdir=fdir, octree=octree)
+        if vturb:
+            loaders['vturb'] = partial(self.readVTurb, binary=binary, fdir=fdir, octree=octree, mmap=mmap)
+        if alvec:
+            loaders['alvec'] = partial(self.readDustAlign, binary=binary, fdir=fdir)
+        if qvis:
+            loaders['qvis'] = partial(self.readViscousHeating, binary=binary, fdir=fdir, octree=octree, mmap=mmap)
+        if bfield:
+            loaders['bfield'] = partial(self.readBfield, binary=binary, fdir=fdir)
+        if radfield:
+            loaders['radfield'] = partial(self.readRadiationField, binary=binary, fdir=fdir)
+
+        if '_lazyLoaders' not in self.__dict__:
+            self._lazyLoaders = {}
+        self._lazyLoaders.update(loaders)
+
+        # Drop the current content so that the next access goes through the loader
+        for name in loaders:
+            self.__dict__.pop(name, None)
+
+    def release(self, *names):
+        """Frees the memory of lazily read fields.
+
+        The released fields stay registered and are read again from file on their next access.
+
+        Parameters
+        ----------
+
+        names : str
+                Names of the fields to be released (e.g. 'rhodust', 'dusttemp'). If omitted all fields
+                registered with readLazy() are released.
+        """
+
+        loaders = self.__dict__.get('_lazyLoaders', {})
+        if len(names) == 0:
+            names = list(loaders.keys())
+
+        for name in names:
+            if name not in loaders:
+                raise ValueError(name + ' is not a lazily read field. Only fields registered with readLazy() can be '
+                                 + 'released.')
+            self.__dict__.pop(name, None)
+
+    def saveArchive(self, fname='', fdir=None, files=None, ispec=None, fmt=None, compression=None):
+        """Saves the grid and the physical fields into a single archive file (see the archive module).
+
+        Parameters
+        ----------
+
+        fname       : str
+                      Name of the archive file
+
+        fdir        : str, optional
+                      Model directory. If set, the small input files of the model (e.g. problem_params.inp,
+                      radmc3d.inp, dustopac.inp, dustkappa_*.inp, stars.inp, lines.inp, molecule_*.inp) found in
+                      this directory are stored in the archive as well.
+
+        files       : list, optional
+                      File names or glob patterns (relative to fdir) to be stored in the archive. If not set
+                      archive.archiveFiles is used.
+
+        ispec       : str, optional
+                      Name of the gas species of gasndens (needed to write numberdens_ispec.inp on export)
+
+        fmt         : {'hdf5', 'npz'}, optional
+                      Format of the archive. If not set HDF5 is used if h5py is available and NPZ otherwise.
+
+        compression : str, optional
+                      Compression filter of the HDF5 datasets (e.g. 'gzip', 'lzf')
+        """
+
+        if self.grid is None:
+            raise ValueError('Unknown grid. The grid has to be set before the model can be archived.')
+
+        groups = {'grid': archive.packObject(self.grid)}
+
+        fields = {}
+        for name in self._fieldNames:
+            # getattr() also reads the lazily registered fields
+            arr = getattr(self, name, None)
+            if isinstance(arr, np.ndarray) and (arr.size > 0):
+                fields[name] = arr
+        attrs = {'precision': self.precision}
+        if ispec is not None:
+            attrs['ispec'] = ispec
+        groups['data'] = (fields, attrs)
+
+        if fdir is not None:
+            groups['files'] = (archive.packFiles(fdir=fdir, files=files), {})
+
+        archive.writeArchive(fname=fname, groups=groups, fmt=fmt, compression=compression)
+
+    def loadArchive(self, fname=''):
+        """Loads the grid and the physical fields from an archive file written by saveArchive().
+
+        Parameters
+        ----------
+
+        fname : str
+                Name of the archive file
+
+        Returns
+        -------
+        A dictionary of file name : content (uint8 array) of the model input files stored in the archive,
+        to be passed to exportToRadmc3d()
+        """
+
+        groups = archive.readArchive(fname=fname)
+
+        if 'grid' in groups:
+            self.grid = archive.unpackObject(*groups['grid'])
+
+        if 'data' in groups:
+            fields, attrs = groups['data']
+            self.precision = attrs.get('precision', self.precision)
+            if 'ispec' in attrs:
+                self.ispec = attrs['ispec']
+            for name, arr in fields.items():
+                setattr(self, name, arr)
+
+        files = {}
+        if 'files' in groups:
+            files = groups['files'][0]
+
+        return files
+
+    def exportToRadmc3d(self, fdir='', binary=True, files=None, ispec=None):
+        """Writes the native RADMC-3D input files of the model into a directory, e.g. right before a run of a model
+        loaded from an archive.
+
+        Parameters
+        ----------
+
+        fdir   : str
+                 Directory into which the files should be written. It is created if it does not exist.
+
+        binary : bool
+                 If True the physical fields are written in binary format, otherwise in formatted ASCII
+
+        files  : dict, optional
+                 Model input files (file name : content) as returned by loadArchive(), written verbatim
+
+        ispec  : str, optional
+                 Name of the gas species of gasndens. If not set the name stored in the archive is used and the
+                 gas number density is only written if the name is known.
+        """
+
+        if not os.path.isdir(fdir):
+            os.makedirs(fdir)
+
+        archive.unpackFiles(fdir=fdir, content=files)
+
+        if files is None:
+            files = {}
+
+        octree = isinstance(self.grid, radmc3dOctree)
+        if octree:
+            self.grid.writeSpatialGrid(fname=os.path.join(fdir, 'amr_grid.inp'))
+        else:
+            self.grid.writeSpatialGrid(fdir=fdir)
+        if ('wavelength_micron.inp' not in files) & (self.grid.nwav > 0):
+            self.grid.writeWavelengthGrid(fname=os.path.join(fdir, 'wavelength_micron.inp'))
+
+        if ispec is None:
+            ispec = self.__dict__.get('ispec', None)
+
+        ext = '.binp' if binary else '.inp'
+        # Field name, file name, vector dimension (0 for scalar fields)
+        fieldFiles = [('rhodust', 'dust_density' + ext, 0),
+                      ('dusttemp', 'dust_temperature' + ('.bdat' if binary else '.dat'), 0),
+                      ('gasndens', 'numberdens_' + str(ispec) + ext, 0),
+                      ('gastemp', 'gas_temperature' + ext, 0),
+                      ('vturb', 'microturbulence' + ext, 0),
+                      ('qvis', 'heatsource' + ext, 0),
+                      ('gasvel', 'gas_velocity' + ext, 3),
+                      ('alvec', 'grainalign_dir' + ext, 4),
+                      ('bfield', 'Bfield' + ext, 3)]
+
+        for name, ffname, ndim in fieldFiles:
+            arr = getattr(self, name, None)
+            if (not isinstance(arr, np.ndarray)) or (arr.size == 0):
+                continue
+            if (name == 'gasndens') & (ispec is None):
+                warnings.warn('The name of the gas species is unknown, the gas number density is not written.',
+                              RuntimeWarning)
+                continue
+
+            fname = os.path.join(fdir, ffname)
+            print('Writing ' + fname)
+            # Fields read from file are already stored at the leaf cells, generated ones on the full tree
+            if octree and (arr.shape[0] != self.grid.nLeaf):
+                arr = self.grid.convArrTree2Leaf(arr)
+            if ndim > 0:
+                self._vectorfieldWriter(fname, arr, binary=binary, ndim=ndim)
+            else:
+                self._scalarfieldWriter(fname, arr, binary=binary, octree=octree)
+
+    def _fortranOrderWriter(self, wfile=None, arr=None, binary=False, dtype=np.float64, fmt='%.9e', ncol=1,
+                            chunksize=None):
+        """Writes an array to an open file in Fortran-order, chunk by chunk.
+
+        The array is never flattened as a whole. Instead, the transpose of the array (whose C-order is the
+        Fortran-order of the original array) is split along its leading axes into chunks of at most chunksize
+        elements and only these chunks are copied to contiguous memory before they are written.
+
+        Parameters
+        ----------
+
+        wfile     : file
+                    File object opened for writing
+
+        arr       : ndarray
+                    Array to be written
+
+        binary    : bool
+                    If True the data is written in C-compliant binary format, otherwise as formatted ASCII text
+
+        dtype     : numpy.dtype
+                    Data type of the values in binary mode (each chunk is converted separately)
+
+        fmt       : str
+                    Format string of a single value in ASCII mode
+
+        ncol      : int
+                    Number of values per line in ASCII mode. The length of the first dimension of the array
+                    should be a multiple of ncol.
+
+        chunksize : int, optional
+                    Maximum number of elements written in one chunk. If None radmc3dData.writeChunkSize is used.
+        """
+
+        if chunksize is None:
+            chunksize = self.writeChunkSize
+        chunksize = max(chunksize, ncol)
+
+        tarr = np.asarray(arr).T
+        # Number of leading axes of the transposed array we need to loop over to get small enough chunks
+        nlead = 0
+        while (nlead < tarr.ndim - 1) and (np.prod(tarr.shape[nlead:]) > chunksize):
+            nlead += 1
+
+        first = True
+        for idx in np.ndindex(*tarr.shape[:nlead]):
+            sub = tarr[idx]
+            if (sub.ndim == 1) & (sub.shape[0] > chunksize):
+                step = (chunksize // ncol) * ncol
+                chunks = [sub[i:i + step] for i in range(0, sub.shape[0], step)]
+            else:
+                chunks = [sub]
+
+            for chunk in chunks:
+                if binary:
+                    np.ascontiguousarray(chunk, dtype=dtype).tofile(wfile)
+                elif ncol == 1:
+                    # Separator only between the chunks, the last value is not followed by a newline
+                    if not first:
+                        wfile.write('\n')
+                    np.ascontiguousarray(chunk).tofile(wfile, sep="\n", format=fmt)
+                else:
+                    np.savetxt(wfile, np.reshape(chunk, [-1, ncol]), fmt=fmt)
+                first = False
+
+    def _scalarfieldWriter(self, fname='', data=None, binary=False, octree=False, precision=None):
+        """Writes a scalar field to a file.
+
+        Parameters
+        ----------
 
         fname  : str
                 Name of the file containing a scalar variable
 
+        data   : ndarray
+                Scalar variable to be written
+
         binary : bool
                 If True the file will be in binary format, if False the file format is formatted ASCII text
 
+        octree : bool
+                If True the data is defined on an octree (the leaf cells only). This is also assumed if the
+                grid is an instance of radmc3dOctree.
+
+        precision : int, optional
+                Precision of the values in a binary file in bytes (4 - single, 8 - double). If None
+                radmc3dData.precision is used.
+
+        The data is streamed to the file in Fortran-order species by species and slab by slab
+        (see _fortranOrderWriter), so no flattened copy of the whole array is made.
         """
 
+        if precision is None:
+            precision = self.precision
+        dtype = self._getPrecisionDtype(precision)
+
         with open(fname, 'w') as wfile:
             # octree
-            if isinstance(self.grid, radmc3dOctree):
+            if octree | isinstance(self.grid, radmc3dOctree):
                 # ! this part is not tested yet !
-                if len(arr.shape) == 1:
+                if len(data.shape) == 1:
                     if binary:
-                        hdr = np.array([1, 8, arr.shape[0], 1], dtype=np.int64)
+                        hdr = np.array([1, precision, data.shape[0], 1], dtype=np.int64)
                     else:
-                        hdr = np.array([1, arr.shape[0], 1], dtype=np.int64)
-                elif len(arr.shape) == 2:
+                        hdr = np.array([1, data.shape[0], 1], dtype=np.int64)
+                elif len(data.shape) == 2:
                     if binary:
-                        hdr = np.array([1, 8, arr.shape[0], arr.shape[1]], dtype=np.int64)
+                        hdr = np.array([1, precision, data.shape[0], data.shape[1]], dtype=np.int64)
                     else:
-                        hdr = np.array([1, arr.shape[0], arr.shape[1]], dtype=np.int64)
+                        hdr = np.array([1, data.shape[0], data.shape[1]], dtype=np.int64)
                 else:
                     raise ValueError('Incorrect shape. Data stored in an Octree-type grid should have 1 or 2 '
                                      + 'dimensions, with the second dimension being the dust species. '
-                                     + ' The data to be written has a dimension of ' + ("%d" % len(arr.shape))
+                                     + ' The data to be written has a dimension of ' + ("%d" % len(data.shape))
                                      + '\n No data has been written')
             else: # regular grid
                 # determine header
-                if len(arr.shape) == 3:
+                if len(data.shape) == 3:
                     if binary:
-                        hdr = np.array([1, 8, self.grid.nx * self.grid.ny * self.grid.nz], dtype=int)
+                        hdr = np.array([1, precision, self.grid.nx * self.grid.ny * self.grid.nz], dtype=int)
                     else:
                         hdr = np.array([1, self.grid.nx * self.grid.ny * self.grid.nz], dtype=int)
-                elif len(arr.shape) == 4:
+                elif len(data.shape) == 4:
                     if binary:
-                        hdr = np.array([1, 8, self.grid.nx * self.grid.ny * self.grid.nz, arr.shape[3]], dtype=int)
+                        hdr = np.array([1, precision, self.grid.nx * self.grid.ny * self.grid.nz, data.shape[3]],
+                                       dtype=int)
                     else:
-                        hdr = np.array([1, self.grid.nx * self.grid.ny * self.grid.nz, arr.shape[3]], dtype=int)
+                        hdr = np.array([1, self.grid.nx * self.grid.ny * self.grid.nz, data.shape[3]], dtype=int)
                 else:
                     raise ValueError('Incorrect shape. Data stored in a regular grid should have 3 or 4 dimensions'
                                          + ' with the fourth dimension being the dust species. '
-                                         + ' The data to be written has a dimension of ' + ("%d" % len(arr.shape))
+                                         + ' The data to be written has a dimension of ' + ("%d" % len(data.shape))
                                          + '\n No data has been written')
 
             # write out header and data
             if binary:
                 hdr.tofile(wfile)
-                arr.flatten(order='f').tofile(wfile)
+                self._fortranOrderWriter(wfile, data, binary=True, dtype=dtype)
             else:
                 hdr.tofile(wfile, sep="\n", format="%d")
                 wfile.write('\n')
-                arr.flatten(order='f').tofile(wfile, sep="\n", format="%.9e")
+                self._fortranOrderWriter(wfile, data, binary=False, fmt="%.9e")
+
+    def _getCellRange(self, crange=None, ncell=0, axis=''):
+        """Checks a cell index range and converts it to start/stop indices.
+
+        Parameters
+        ----------
+
+        crange : tuple, optional
+                 Two element tuple/list with the first (inclusive) and last (exclusive) cell index along the axis,
+                 i.e. the same convention as for python slices. If None the whole axis is used
+
+        ncell  : int
+                 Number of cells along the axis
+
+        axis   : str
+                 Name of the axis (only used in error messages)
 
-    def _scalarfieldReader(self, fname='', binary=False, octree=False, ndim=3):
+        Returns
+        -------
+
+        Returns a tuple with the start and stop index
+        """
+
+        if crange is None:
+            return 0, ncell
+
+        if len(crange) != 2:
+            raise ValueError('The cell index range along the ' + axis + ' axis should have two elements, '
+                             + '(first cell, last cell + 1).')
+        i0, i1 = int(crange[0]), int(crange[1])
+        if (i0 < 0) | (i1 > ncell) | (i0 >= i1):
+            raise ValueError('Invalid cell index range along the ' + axis + ' axis ' + ("[%d, %d)" % (i0, i1))
+                             + '. The grid has ' + ("%d" % ncell) + ' cells along this axis.')
+        return i0, i1
+
+    def _getSpeciesList(self, idust=None, nspec=1):
+        """Checks the dust species indices of a selection and converts them to a list.
+
+        Parameters
+        ----------
+
+        idust : int, list, optional
+                Index or list of indices of the dust species. If None all species are selected
+
+        nspec : int
+                Number of species in the data file
+
+        Returns
+        -------
+
+        Returns a list of species indices
+        """
+
+        if idust is None:
+            return list(range(nspec))
+
+        if isinstance(idust, int) | isinstance(idust, np.integer):
+            idust = [idust]
+        idust = [int(i) for i in idust]
+
+        if (min(idust) < 0) | (max(idust) >= nspec):
+            raise ValueError('Dust species index out of range. The data file contains ' + ("%d" % nspec)
+                             + ' species, the requested indices are ' + str(idust))
+        return idust
+
+    def _getScalarfieldSubset(self, data=None, idust=None, xrange=None, yrange=None, zrange=None, octree=False):
+        """Selects dust species and/or a sub-volume from a scalar field that is already in memory.
+
+        Parameters
+        ----------
+
+        data   : ndarray
+                 Scalar field as returned by _scalarfieldReader, [nx, ny, nz, nspec] for regular grids and
+                 [nLeaf, nspec] for octrees
+
+        idust  : int, list, optional
+                 Index or list of indices of the dust species to be selected
+
+        xrange : tuple, optional
+                 Cell index range along the first dimension (regular grids only)
+
+        yrange : tuple, optional
+                 Cell index range along the second dimension (regular grids only)
+
+        zrange : tuple, optional
+                 Cell index range along the third dimension (regular grids only)
+
+        octree : bool
+                 If True the data is defined on an octree
+
+        Returns
+        -------
+
+        Returns the selected part of the array
+        """
+
+        specs = self._getSpeciesList(idust=idust, nspec=data.shape[-1])
+        if octree:
+            return data[:, specs]
+
+        x0, x1 = self._getCellRange(xrange, data.shape[0], 'x')
+        y0, y1 = self._getCellRange(yrange, data.shape[1], 'y')
+        z0, z1 = self._getCellRange(zrange, data.shape[2], 'z')
+        return data[x0:x1, y0:y1, z0:z1, :][:, :, :, specs]
+
+    def _readScalarfieldSlab(self, fname='', dtype=np.float64, offset=0, nspec=1, idust=None, xrange=None,
+                             yrange=None, zrange=None, mmap=False):
+        """Reads selected dust species and/or a sub-volume from a binary scalar field on a regular grid.
+
+        Only the selected cells of the selected species are read. The data is stored in Fortran-order, so the
+        selection consists of contiguous runs of x1-x0 values (one for each y and z in the range), which are read
+        one by one with a seek in between. If the x (and y) range covers the whole axis, the runs of consecutive y
+        (and z) indices are contiguous in the file and are read at once. No buffer larger than the selection is
+        allocated.
+
+        Parameters
+        ----------
+
+        fname  : str
+                 Name of the binary file
+
+        dtype  : numpy.dtype
+                 Data type of the payload (np.float32 or np.float64)
+
+        offset : int
+                 Size of the file header in bytes
+
+        nspec  : int
+                 Number of species in the file
+
+        idust  : int, list, optional
+                 Index or list of indices of the dust species to be read
+
+        xrange : tuple, optional
+                 Cell index range (first, last + 1) along the first dimension
+
+        yrange : tuple, optional
+                 Cell index range (first, last + 1) along the second dimension
+
+        zrange : tuple, optional
+                 Cell index range (first, last + 1) along the third dimension
+
+        mmap   : bool
+                 If True the selection is returned as a view of a read-only memory map of the file
+
+        Returns
+        -------
+
+        Returns a 4 dimensional array with the selected data [nx_sel, ny_sel, nz_sel, nspec_sel]
+        """
+
+        nx, ny, nz = self.grid.nx, self.grid.ny, self.grid.nz
+        x0, x1 = self._getCellRange(xrange, nx, 'x')
+        y0, y1 = self._getCellRange(yrange, ny, 'y')
+        z0, z1 = self._getCellRange(zrange, nz, 'z')
+        specs = self._getSpeciesList(idust=idust, nspec=nspec)
+
+        if mmap:
+            data = np.memmap(fname, dtype=dtype, mode='r', offset=offset, shape=(nx, ny, nz, nspec), order='F')
+            data = data[x0:x1, y0:y1, z0:z1, :]
+            # Contiguous species ranges are kept as views, any other selection is copied into memory
+            if specs == list(range(specs[0], specs[-1] + 1)):
+                return data[:, :, :, specs[0]:specs[-1] + 1]
+            else:
+                return data[:, :, :, specs]
+
+        itemsize = np.dtype(dtype).itemsize
+        data = np.zeros([x1 - x0, y1 - y0, z1 - z0, len(specs)], dtype=dtype)
+
+        #
+        # Length of the contiguous runs in the file: a run covers the whole y (z) range if the x (and y) range
+        # covers the whole axis
+        #
+        if (x0 == 0) & (x1 == nx) & (y0 == 0) & (y1 == ny):
+            ny_run, nz_run = y1 - y0, z1 - z0
+        elif (x0 == 0) & (x1 == nx):
+            ny_run, nz_run = y1 - y0, 1
+        else:
+            ny_run, nz_run = 1, 1
+        nrun = (x1 - x0) * ny_run * nz_run
+
+        with open(fname, 'rb') as rfile:
+            for i, ispec in enumerate(specs):
+                for iz in range(z0, z1, nz_run):
+                    for iy in range(y0, y1, ny_run):
+                        rfile.seek(offset + (((ispec * nz + iz) * ny + iy) * nx + x0) * itemsize)
+                        run = np.fromfile(rfile, count=nrun, dtype=dtype)
+                        if run.shape[0] != nrun:
+                            msg = 'Internal inconsistency in data file, number of cell entries is different from ' \
+                                  'indicated in the file header'
+                            raise ValueError(msg)
+                        data[:, iy - y0:iy - y0 + ny_run, iz - z0:iz - z0 + nz_run, i] = \
+                            np.reshape(run, [x1 - x0, ny_run, nz_run], order='F')
+
+        return data
+
+    def _scalarfieldReader(self, fname='', binary=False, octree=False, ndim=3, mmap=False, idust=None, xrange=None,
+                           yrange=None, zrange=None):
         """Reads a scalar field from file.
 
         Parameters
@@ -188,6 +823,29 @@ class radmc3dData(object):
 
         ndim   : int
                 Number of dimension of the data field (3 for gas variables, 4 for dust)
+
+        mmap   : bool
+                If True the data in a binary file is not read but memory-mapped (read-only). The returned
+                array is then a Fortran-ordered view of the file and data is only read from disk when it
+                is accessed.
+
+        idust  : int, list, optional
+                Index or list of indices of the dust species to be read. If None all species are read.
+
+        xrange : tuple, optional
+                Cell index range (first, last + 1) along the first dimension to be read (regular grids only).
+                If None the whole axis is read.
+
+        yrange : tuple, optional
+                Cell index range (first, last + 1) along the second dimension to be read (regular grids only).
+                If None the whole axis is read.
+
+        zrange : tuple, optional
+                Cell index range (first, last + 1) along the third dimension to be read (regular grids only).
+                If None the whole axis is read.
+
+        For binary files on regular grids only the requested species and cells are read from disk. For
+        formatted ASCII files the whole file has to be parsed and the selection is made afterwards.
         Returns
         -------
 
@@ -195,6 +853,14 @@ class radmc3dData(object):
         always a 4 dimensional array for convenience
         """
 
+        if mmap and not binary:
+            raise ValueError('Memory-mapping is only possible for binary files, ' + fname + ' is formatted ASCII')
+
+        subset = (idust is not None) | (xrange is not None) | (yrange is not None) | (zrange is not None)
+        if octree & ((xrange is not None) | (yrange is not None) | (zrange is not None)):
+            raise ValueError('Cell index ranges can only be used for regular grids. For octree grids only the '
+                             + 'dust species can be selected.')
+
         data = None
         with open(fname, 'r') as rfile:
             if binary:
@@ -216,14 +882,19 @@ class radmc3dData(object):
                         raise ValueError(msg)
 
                     if hdr[1] == 8:
-                        data = np.fromfile(rfile, count=-1, dtype=np.float64)
+                        dtype = np.float64
                     elif hdr[1] == 4:
-                        data = np.fromfile(rfile, count=-1, dtype=np.float32)
+                        dtype = np.float32
                     else:
                         msg = 'Unknown datatype/precision in ' + fname + '. RADMC-3D binary files store 4 byte ' \
                               + 'floats or 8 byte doubles. The precision in the file header is ' + ("%d" % hdr[1])
                         raise TypeError(msg)
 
+                    if mmap:
+                        data = np.memmap(fname, dtype=dtype, mode='r', offset=hdr.nbytes)
+                    else:
+                        data = np.fromfile(rfile, count=-1, dtype=dtype)
+
                     if ndim == 3:
                         if data.shape[0] == hdr[2]:
                             data = np.reshape(data, [self.grid.nLeaf, 1], order='f')
@@ -249,15 +920,31 @@ class radmc3dData(object):
                         raise ValueError(msg)
 
                     if hdr[1] == 8:
-                        data = np.fromfile(rfile, count=-1, dtype=np.float64)
+                        dtype = np.float64
                     elif hdr[1] == 4:
-                        data = np.fromfile(rfile, count=-1, dtype=np.float32)
+                        dtype = np.float32
                     else:
                         msg = 'Unknown datatype/precision in ' + fname + '. RADMC-3D binary files store 4 byte ' \
                               + 'floats or 8 byte doubles. The precision in the file header is ' \
                               + ("%d" % hdr[1])
                         raise TypeError(msg)
 
+                    if subset:
+                        if ndim == 3:
+                            nspec = 1
+                        else:
+                            nspec = hdr[3]
+                        return self._readScalarfieldSlab(fname=fname, dtype=dtype, offset=hdr.nbytes, nspec=nspec,
+                                                         idust=idust, xrange=xrange, yrange=yrange, zrange=zrange,
+                                                         mmap=mmap)
+
+                    # The payload follows the int64 header directly, so a memory map starting at the header
+                    # offset can be reshaped in Fortran-order without reading or copying anything
+                    if mmap:
+                        data = np.memmap(fname, dtype=dtype, mode='r', offset=hdr.nbytes)
+                    else:
+                        data = np.fromfile(rfile, count=-1, dtype=dtype)
+
                     if ndim == 3:
                         if data.shape[0] == hdr[2]:
                             #data = np.reshape(data, [1, self.grid.nz, self.grid.ny, self.grid.nx])
@@ -282,10 +969,14 @@ class radmc3dData(object):
                     #data = np.swapaxes(data, 1, 2)
 
             else: # if not binary
+                # Read the header
+                # hdr[0] = format number
+                # hdr[1] = nr of cells
+                # hdr[2] = nr of dust species
                 if ndim == 3:
-                    hdr = np.fromfile(rfile, count=3, sep=" ", dtype=np.int64)
+                    hdr = np.fromfile(rfile, count=2, sep=" ", dtype=np.int64)
                 else:
-                    hdr = np.fromfile(rfile, count=4, sep=" ", dtype=np.int64)
+                    hdr = np.fromfile(rfile, count=3, sep=" ", dtype=np.int64)
 
                 if octree:
                     if hdr[1] != self.grid.nLeaf:
@@ -294,10 +985,10 @@ class radmc3dData(object):
                               + ' nr of cells in amr_grid.inp : ' + ("%d" % self.grid.nLeaf)
                         raise ValueError(msg)
 
-                    data = np.fromfile(rfile, count=-1, sep=" ", dtype=np.float64)
+                    data = textio.readNumbers(rfile, dtype=self._getPrecisionDtype())
 
                     if ndim == 3:
-                        if data.shape[0] == hdr[2]:
+                        if data.shape[0] == hdr[1]:
                             data = np.reshape(data, [self.grid.nLeaf, 1], order='f')
                         else:
                             msg = 'Internal inconsistency in data file, number of cell entries is different from ' \
@@ -305,8 +996,8 @@ class radmc3dData(object):
                             raise ValueError(msg)
 
                     else:
-                        if data.shape[0] == hdr[2] * hdr[3]:
-                            data = np.reshape(data, [self.grid.nLeaf, hdr[3]], order='f')
+                        if data.shape[0] == hdr[1] * hdr[2]:
+                            data = np.reshape(data, [self.grid.nLeaf, hdr[2]], order='f')
                         else:
                             msg = 'Internal inconsistency in data file, number of cell entries is different from ' \
                                   'indicated in the file header'
@@ -324,7 +1015,7 @@ class radmc3dData(object):
                               + ("%d" % (self.grid.nx * self.grid.ny * self.grid.nz))
                         raise ValueError(msg)
 
-                    data = np.fromfile(rfile, count=-1, sep=" ", dtype=np.float64)
+                    data = textio.readNumbers(rfile, dtype=self._getPrecisionDtype())
                     if ndim == 3:
                         if data.shape[0] == hdr[1]:
 #                            data = np.reshape(data, [1, self.grid.nz, self.grid.ny, self.grid.nx])
@@ -348,9 +1039,13 @@ class radmc3dData(object):
 #                    data = np.swapaxes(data, 0, 3)
 #                    data = np.swapaxes(data, 1, 2)
 
+        if subset:
+            data = self._getScalarfieldSubset(data=data, idust=idust, xrange=xrange, yrange=yrange, zrange=zrange,
+                                              octree=octree)
+
         return data
 
-    def _vectorfieldWriter(self, fname, arr, binary=False, ndim=3):
+    def _vectorfieldWriter(self, fname, arr, binary=False, ndim=3, precision=None):
         """
         Parameters
         ----------
@@ -363,7 +1058,16 @@ class radmc3dData(object):
         ndim : int
             if only depends spatially : ndim = 3
             if also depends on a fourth parameter : ndim = 4
+        precision : int, optional
+            precision of the values in a binary file in bytes (4 or 8). If None radmc3dData.precision is used
+
+        The data is streamed to the file in chunks (see _fortranOrderWriter), so no flattened copy of the
+        whole array is made.
         """
+        if precision is None:
+            precision = self.precision
+        dtype = self._getPrecisionDtype(precision)
+
         with open(fname, 'w') as wfile:
             # octree
             if isinstance(self.grid, radmc3dOctree):
@@ -371,14 +1075,14 @@ class radmc3dData(object):
                 # determine header information 
                 if len(arr.shape) == 1:
                     if binary:
-                        hdr = np.array([1, 8, arr.shape[0], 1], dtype=np.int64)
+                        hdr = np.array([1, precision, arr.shape[0], 1], dtype=np.int64)
                     else:
                         hdr = np.array([1, arr.shape[0], 1], dtype=np.int64)
                 elif len(arr.shape) == 2:
                     if binary:
-                        hdr = np.array([1, 8, arr.shape[0], arr.shape[1]], dtype=np.int64)
+                        hdr = np.array([1, precision, arr.shape[0], arr.shape[1]], dtype=np.int64)
                     else:
-                        hdr = np.array([1, arr.shape[0], arr.shapre[1]], dtype=np.int64)
+                        hdr = np.array([1, arr.shape[0], arr.shape[1]], dtype=np.int64)
                 else:
                     raise ValueError('Incorrect shape. Data stored in an Octree-type grid should have 1 or 2 '
                                      + 'dimensions, with the second dimension being the dust species. '
@@ -387,20 +1091,21 @@ class radmc3dData(object):
                 # write header and data 
                 if binary:
                     hdr.tofile(wfile)
-                    arr.flatten(order='f').tofile(wfile)
+                    self._fortranOrderWriter(wfile, arr, binary=True, dtype=dtype)
 
                 else:
-                    hdr.tofile(wfile, sep=" ", format="%d\n")
-                    arr.flatten(order='f').tofile(wfile, sep=" ", format="%.9e\n")                    
+                    hdr.tofile(wfile, sep="\n", format="%d")
+                    wfile.write('\n')
+                    self._fortranOrderWriter(wfile, arr, binary=False, fmt="%.9e")
 
             else: # regular grid
                 # determine header information 
                 nrcells = self.grid.nx * self.grid.ny * self.grid.nz
                 if binary:
                     if ndim == 3:
-                        hdr = np.array([1, 8, nrcells], dtype=np.int64)
+                        hdr = np.array([1, precision, nrcells], dtype=np.int64)
                     elif ndim == 4:
-                        hdr = np.array([1, 8, nrcells, arr.shape[3]], dtype=np.int64)
+                        hdr = np.array([1, precision, nrcells, arr.shape[3]], dtype=np.int64)
                     else:
                         raise ValueError('Incorrect shape')
                 else:
@@ -417,12 +1122,12 @@ class radmc3dData(object):
                 # write header and data 
                 if binary:
                     hdr.tofile(wfile)
-                    arr.flatten(order='f').tofile(wfile)
+                    self._fortranOrderWriter(wfile, arr, binary=True, dtype=dtype)
                 else:
                     hdr.tofile(wfile, sep="\n", format='%d')
                     wfile.write('\n')
-                    arr = np.reshape(arr, [3, np.prod(arr.shape[1:])], order='f')
-                    np.savetxt(wfile, arr.T, fmt='%.9e')
+                    # one line per cell with the three components
+                    self._fortranOrderWriter(wfile, arr, binary=False, fmt='%.9e', ncol=3)
 
     def _vectorfieldReader(self, fname, binary=False, ndim=3):
         """ read ordingary vector field data 
@@ -454,10 +1159,10 @@ class radmc3dData(object):
                     else:
                         dtype = np.float64
                 else:
-                    hdr = np.fromfile(rfile, count=2, dtype=np.int64)
+                    hdr = np.fromfile(rfile, count=2, sep=' ', dtype=np.int64)
                     iformat = hdr[0]
                     nLeaf = hdr[1]
-                    dtype = np.float64
+                    dtype = self._getPrecisionDtype()
 
                 if self.grid.nLeaf != nLeaf:
                     raise ValueError('Number of cells in ' + fname + ' is different from that in amr_grid.inp'
@@ -469,7 +1174,7 @@ class radmc3dData(object):
                 if binary:
                     arr = np.fromfile(rfile, count=-1, sep='', dtype=dtype)
                 else:
-                    arr = np.fromfile(rfile, count=-1, sep=' ', dtype=dtype)
+                    arr = textio.readNumbers(rfile, dtype=dtype)
 
                 arr = np.reshape(arr, [self.nLeaf, 3], order='F')
 
@@ -503,13 +1208,13 @@ class radmc3dData(object):
                     if ndim == 4:
                         ndust = hdr[2]
 
-                    dtype = np.float64
+                    dtype = self._getPrecisionDtype()
 
                 # read data 
                 if binary:
                     arr = np.fromfile(rfile, count=-1, sep='', dtype=dtype)
                 else:
-                    arr = np.fromfile(rfile, count=-1, sep=' ', dtype=dtype)
+                    arr = textio.readNumbers(rfile, dtype=dtype)
 
                 # first reconstruct the array 
                 if ndim == 3:
@@ -752,7 +1457,8 @@ class radmc3dData(object):
 
         return dmass
 
-    def readDustDens(self, fname='', fdir=None, binary=False, old=False, octree=False):
+    def readDustDens(self, fname='', fdir=None, binary=False, old=False, octree=False, mmap=False, idust=None,
+                     xrange=None, yrange=None, zrange=None):
         """Reads the dust density.
 
         Parameters
@@ -770,6 +1476,21 @@ class radmc3dData(object):
 
         octree  : bool, optional
                   If the data is defined on an octree-like AMR
+
+        mmap    : bool, optional
+                  If True (binary files only) the data is memory-mapped instead of read into memory
+
+        idust   : int, list, optional
+                  Index or list of indices of the dust species to be read. If None all species are read.
+
+        xrange  : tuple, optional
+                  Cell index range (first, last + 1) along the first dimension to be read (regular grids only)
+
+        yrange  : tuple, optional
+                  Cell index range (first, last + 1) along the second dimension to be read (regular grids only)
+
+        zrange  : tuple, optional
+                  Cell index range (first, last + 1) along the third dimension to be read (regular grids only)
         """
 
         if self.grid is None:
@@ -794,7 +1515,8 @@ class radmc3dData(object):
                 fname = os.path.join(fdir, fname)
 
             print('Reading '+fname)
-            self.rhodust = self._scalarfieldReader(fname=fname, binary=binary, octree=octree, ndim=4)
+            self.rhodust = self._scalarfieldReader(fname=fname, binary=binary, octree=octree, ndim=4, mmap=mmap,
+                                                   idust=idust, xrange=xrange, yrange=yrange, zrange=zrange)
         #
         # Read the output of the previous 2d version of the code
         #
@@ -802,7 +1524,7 @@ class radmc3dData(object):
             fname = 'dustdens.inp'
             print('Reading '+fname)
 
-            data = np.fromfile(fname, count=-1, sep=" ", dtype=np.float64)
+            data = textio.readFile(fname)
             # 4 element header: Nr of dust species, nr, ntheta, ?
             hdr = np.array(data[:4], dtype=np.int64)
             data = np.reshape(data[4:], [hdr[1], hdr[2], 1, hdr[0]])
@@ -810,7 +1532,8 @@ class radmc3dData(object):
             self.rhodust[:, :hdr[2], 0, :] = data[:, :, 0, :]
             self.rhodust[:, hdr[2]:, 0, :] = data[:, ::-1, 0, :]
 
-    def readDustTemp(self, fname='', fdir=None, binary=False, octree=False, old=False):
+    def readDustTemp(self, fname='', fdir=None, binary=False, octree=False, old=False, mmap=False, idust=None,
+                     xrange=None, yrange=None, zrange=None):
         """Reads the dust temperature.
 
         Parameters
@@ -827,6 +1550,21 @@ class radmc3dData(object):
 
         old     : bool, optional
                   If True dust temperature will be written in the old RADMC format
+
+        mmap    : bool, optional
+                  If True (binary files only) the data is memory-mapped instead of read into memory
+
+        idust   : int, list, optional
+                  Index or list of indices of the dust species to be read. If None all species are read.
+
+        xrange  : tuple, optional
+                  Cell index range (first, last + 1) along the first dimension to be read (regular grids only)
+
+        yrange  : tuple, optional
+                  Cell index range (first, last + 1) along the second dimension to be read (regular grids only)
+
+        zrange  : tuple, optional
+                  Cell index range (first, last + 1) along the third dimension to be read (regular grids only)
         """
 
         if self.grid is None:
@@ -850,13 +1588,14 @@ class radmc3dData(object):
 
             print('Reading '+fname)
 
-            self.dusttemp = self._scalarfieldReader(fname=fname, binary=binary, octree=octree, ndim=4)
+            self.dusttemp = self._scalarfieldReader(fname=fname, binary=binary, octree=octree, ndim=4, mmap=mmap,
+                                                    idust=idust, xrange=xrange, yrange=yrange, zrange=zrange)
         else:
 
             fname = 'dusttemp_final.dat'
             print('Reading '+fname)
 
-            data = np.fromfile(fname, count=-1, sep=" ", dtype=np.float64)
+            data = textio.readFile(fname)
             # 4 element header: Nr of dust species, nr, ntheta, ?
             hdr = np.array(data[:4], dtype=np.int64)
             data = data[4:]
@@ -932,7 +1671,7 @@ class radmc3dData(object):
                         if hdr[1] == 8:
                             self.gasvel = np.fromfile(rfile, count=-1, dtype=np.float64)
                         elif hdr[1] == 4:
-                            self.gasvel = np.fromfile(rfile, count=-1, dtype=float)
+                            self.gasvel = np.fromfile(rfile, count=-1, dtype=np.float32)
                         else:
                             raise TypeError(
                                 'Unknown datatype/precision in ' + fname + '. RADMC-3D binary files store 4 byte '
@@ -963,8 +1702,8 @@ class radmc3dData(object):
                                   + ' nr cells in ' + fname + ' : ' + ("%d" % hdr[1]) + '\n '\
                                   + ' nr of cells in amr_grid.inp : ' +  ("%d" % self.grid.nLeaf)
                             raise RuntimeError(msg)
-                        data = np.fromfile(rfile, count=-1, sep=" ", dtype=np.float64)
-                        self.gasvel = np.reshape(data, [hdr[1], 3])
+                        data = textio.readNumbers(rfile, dtype=self._getPrecisionDtype())
+                        self.gasvel = np.reshape(data, [self.grid.nLeaf, 3])
                     else:
                         if (self.grid.nx * self.grid.ny * self.grid.nz) != hdr[1]:
                             msg = 'Number of grid cells in ' + fname + ' is different from that in amr_grid.inp ' \
@@ -972,17 +1711,11 @@ class radmc3dData(object):
                                   + ' nr of cells in amr_grid.inp : '\
                                   + ("%d" % (self.grid.nx * self.grid.ny * self.grid.nz))
                             raise RuntimeError(msg)
-                        data = np.fromfile(rfile, count=-1, sep=" ", dtype=np.float64)
-# the reshape method doesn't work
-#                        self.gasvel = np.reshape(data, [self.grid.nx, self.grid.ny, self.grid.nz, 3])
-                        self.gasvel = np.zeros([self.grid.nx, self.grid.ny, self.grid.nz, 3], dtype=np.float64)
-                        ik = 0
-                        for iz in range(self.grid.nz):
-                            for iy in range(self.grid.ny):
-                                for ix in range(self.grid.nx):
-                                    for iv in range(3):
-                                        self.gasvel[ix,iy,iz,iv] = data[ik]
-                                        ik = ik + 1
+                        data = textio.readNumbers(rfile, dtype=self._getPrecisionDtype())
+                        # The three velocity components of a cell are written next to each other, i.e. the
+                        # velocity component is the fastest varying index in Fortran-order
+                        data = np.reshape(data, [3, self.grid.nx, self.grid.ny, self.grid.nz], order='F')
+                        self.gasvel = np.moveaxis(data, 0, -1)
 
             else:
                 raise FileNotFoundError(fname + 'was not found')
@@ -1052,7 +1785,7 @@ class radmc3dData(object):
 
         self.bfield = self._vectorfieldReader(fname, binary=binary, ndim=3)
 
-    def readVTurb(self, fname='', fdir=None, binary=True, octree=False):
+    def readVTurb(self, fname='', fdir=None, binary=True, octree=False, mmap=False):
         """Reads the turbulent velocity field.
 
         Parameters
@@ -1067,6 +1800,9 @@ class radmc3dData(object):
 
         octree  : bool, optional
                   If the data is defined on an octree-like AMR
+
+        mmap    : bool, optional
+                  If True (binary files only) the data is memory-mapped instead of read into memory
         """
         if self.grid is None:
             if octree:
@@ -1089,13 +1825,13 @@ class radmc3dData(object):
             if fdir is not None:
                 fname = fdir + '/' + fname
 
-        self.vturb = self._scalarfieldReader(fname=fname, binary=binary, octree=octree, ndim=3)
+        self.vturb = self._scalarfieldReader(fname=fname, binary=binary, octree=octree, ndim=3, mmap=mmap)
         if octree:
             self.vturb = np.squeeze(self.vturb)
 
         return True
 
-    def readGasNdens(self, ispec='', fdir=None, binary=True, octree=False):
+    def readGasNdens(self, ispec='', fdir=None, binary=True, octree=False, mmap=False):
         """Reads the number density of gas species  
 
         Parameters
@@ -1109,6 +1845,9 @@ class radmc3dData(object):
 
         octree  : bool, optional
                   If the data is defined on an octree-like AMR
+
+        mmap    : bool, optional
+                  If True (binary files only) the data is memory-mapped instead of read into memory
         """
 
         # determine file name
@@ -1122,7 +1861,7 @@ class radmc3dData(object):
             fname = os.path.join(fdir, fname)
 
         print('Reading gas density (' + fname + ')')
-        igas = self._scalarfieldReader(fname=fname, binary=binary, octree=octree, ndim=3)
+        igas = self._scalarfieldReader(fname=fname, binary=binary, octree=octree, ndim=3, mmap=mmap)
 
         if len(self.gasndens) == 0:
             self.gasndens = igas
@@ -1132,7 +1871,7 @@ class radmc3dData(object):
         if octree:
             self.gasndens = np.squeeze(self.gasndens)
 
-    def readGasTemp(self, fname='', binary=True, octree=False):
+    def readGasTemp(self, fname='', fdir=None, binary=True, octree=False, mmap=False):
         """Reads the gas temperature.
 
         Parameters
@@ -1142,11 +1881,17 @@ class radmc3dData(object):
                   Name of the file that contains the gas temperature. If omitted 'gas_temperature.inp'
                   (or if binary=True 'gas_tempearture.binp') is used.
 
+        fdir    : str, optional
+                  Directory of the file
+
         binary  : bool
                   If true the data will be read in binary format, otherwise the file format is ascii
 
         octree  : bool, optional
                   If the data is defined on an octree-like AMR
+
+        mmap    : bool, optional
+                  If True (binary files only) the data is memory-mapped instead of read into memory
         """
 
         if self.grid is None:
@@ -1165,13 +1910,16 @@ class radmc3dData(object):
             if fname == '':
                 fname = 'gas_temperature.inp'
 
-        self.gastemp = self._scalarfieldReader(fname=fname, binary=binary, octree=octree, ndim=3)
+        if fdir is not None:
+            fname = os.path.join(fdir, fname)
+
+        self.gastemp = self._scalarfieldReader(fname=fname, binary=binary, octree=octree, ndim=3, mmap=mmap)
         if octree:
             self.gastemp = np.squeeze(self.gastemp)
 
         return True
 
-    def readViscousHeating(self, fname='', fdir=None, binary=True, octree=False):
+    def readViscousHeating(self, fname='', fdir=None, binary=True, octree=False, mmap=False):
         """Reads the heatsource.inp
 
         Parameters
@@ -1186,6 +1934,9 @@ class radmc3dData(object):
 
         octree  : bool, optional
                   If the data is defined on an octree-like AMR
+
+        mmap    : bool, optional
+                  If True (binary files only) the data is memory-mapped instead of read into memory
         """
         if self.grid is None:
             if octree:
@@ -1207,7 +1958,7 @@ class radmc3dData(object):
                 if fdir is not None:
                     fname= fdir + fname
 
-        self.qvis = self._scalarfieldReader(fname=fname, binary=binary, octree=octree, ndim=3)
+        self.qvis = self._scalarfieldReader(fname=fname, binary=binary, octree=octree, ndim=3, mmap=mmap)
         if octree:
             self.qvis = np.squeeze(self.qvis)
 
@@ -1225,14 +1976,17 @@ class radmc3dData(object):
         tot_lum = lum.sum()
         return tot_lum
  
-    def readRadiationField(self, fname='', fdir=None, binary=False, rtype=None):
-        """ read the radiation field
+    def _getRadiationFieldName(self, fname='', fdir=None, binary=False, rtype=None):
+        """ determine the name of the mean intensity file
+
         Parameters
         ----------
         rtype : str
-            the type of radiation field 
-            None = just the total radiation field
-            'star' = radiation field from star
+            the type of radiation field (None or 'star')
+
+        Returns
+        -------
+        fname : str
         """
         if fname == '':
             if rtype is None:
@@ -1250,43 +2004,88 @@ class radmc3dData(object):
         if fdir is not None:
             fname = os.path.join(fdir, fname)
 
-        with open(fname, 'r') as rfile:
-            # read header 
-            if binary:
-                # iformat, precision, nrcells, nfreq
-                hdr = np.fromfile(rfile, count=4, dtype=np.int64, sep='')
-                iformat = hdr[0] 
-                precis = hdr[1]
-                nrcells = hdr[2]
-                self.grid.radnfreq = hdr[3]
-                if precis == 4:
-                    dtype = np.float32
-                else:
-                    dtype = np.float64
+        return fname
+
+    def _readRadiationFieldHeader(self, rfile=None, binary=False):
+        """ read the header and the frequency grid of a mean intensity file
+        the frequency grid is stored in self.grid.radfreq and self.grid.radwav
+
+        Parameters
+        ----------
+        rfile : file
+            file object opened for reading, positioned at the beginning of the file
+        binary : bool
+            binary file or not
+
+        Returns
+        -------
+        nrcells : int
+            number of cells in the file
+        dtype : numpy.dtype
+            data type of the values
+        """
+        if binary:
+            # iformat, precision, nrcells, nfreq
+            hdr = np.fromfile(rfile, count=4, dtype=np.int64, sep='')
+            iformat = hdr[0] 
+            precis = hdr[1]
+            nrcells = hdr[2]
+            self.grid.radnfreq = hdr[3]
+            if precis == 4:
+                dtype = np.float32
             else:
-                # iformat, nrcells, nfreq
-                hdr = np.fromfile(rfile, count=3, dtype=np.int64, sep=' ')
-                iformat = hdr[0]
-                nrcells = hdr[1]
-                self.grid.radnfreq = hdr[2]
                 dtype = np.float64
+        else:
+            # iformat, nrcells, nfreq
+            hdr = np.fromfile(rfile, count=3, dtype=np.int64, sep=' ')
+            iformat = hdr[0]
+            nrcells = hdr[1]
+            self.grid.radnfreq = hdr[2]
+            dtype = np.float64
 
-            self.grid.radnwav = self.grid.radnfreq
+        self.grid.radnwav = self.grid.radnfreq
 
-            # read frequency 
-            if binary:
-                freq = np.fromfile(rfile, count=self.grid.radnfreq, dtype=dtype, sep='')
-            else:
-                freq = np.fromfile(rfile, count=self.grid.radnfreq, dtype=dtype, sep=' ')
+        # read frequency 
+        if binary:
+            freq = np.fromfile(rfile, count=self.grid.radnfreq, dtype=dtype, sep='')
+        else:
+            freq = np.fromfile(rfile, count=self.grid.radnfreq, dtype=dtype, sep=' ')
 
-            self.grid.radfreq = freq
-            self.grid.radwav = nc.cc * 1e4 / freq           
+        self.grid.radfreq = freq
+        self.grid.radwav = nc.cc * 1e4 / freq
+
+        if nrcells != self.grid.nx * self.grid.ny * self.grid.nz:
+            raise ValueError('Number of grid cells in the radiation field (' + ("%d" % nrcells) + ') is different '
+                             + 'from that in amr_grid.inp (' + ("%d" % (self.grid.nx * self.grid.ny * self.grid.nz))
+                             + ')')
+
+        if not binary:
+            dtype = self._getPrecisionDtype()
+
+        return nrcells, dtype
+
+    def readRadiationField(self, fname='', fdir=None, binary=False, rtype=None):
+        """ read the radiation field
+        Parameters
+        ----------
+        rtype : str
+            the type of radiation field 
+            None = just the total radiation field
+            'star' = radiation field from star
+
+        For large fields see iterRadiationField(), which reads the field frequency chunk by frequency chunk.
+        """
+        fname = self._getRadiationFieldName(fname=fname, fdir=fdir, binary=binary, rtype=rtype)
+
+        with open(fname, 'r') as rfile:
+            # read header 
+            nrcells, dtype = self._readRadiationFieldHeader(rfile, binary=binary)
  
             # read data
             if binary:
                 data = np.fromfile(rfile, count=-1, dtype=dtype, sep='')
             else:
-                data = np.fromfile(rfile, count=-1, dtype=np.float64, sep=' ')
+                data = textio.readNumbers(rfile, dtype=dtype)
 
             # reformat
             data = np.reshape(data, [self.grid.nx, self.grid.ny, self.grid.nz, self.grid.radnfreq], order='F')
@@ -1299,6 +2098,87 @@ class radmc3dData(object):
         else:
             raise ValueError('rtype unknown')
 
+    def iterRadiationField(self, fname='', fdir=None, binary=False, rtype=None, chunksize=1):
+        """ iterate over the radiation field in chunks of frequencies
+        only one chunk of the field is in memory at a time. The file header is read when this method is called
+        and the frequency grid is stored in self.grid.radfreq and self.grid.radwav (as in readRadiationField()),
+        so it can be used right away, e.g. as nuCell of integrateOverFrequency()
+
+        Parameters
+        ----------
+        fname : str, optional
+            name of the file. If omitted mean_intensity.out (.bout) or mean_intensity_star.out (.bout)
+        fdir : str, optional
+            directory of the file
+        binary : bool
+            binary file or not
+        rtype : str
+            the type of radiation field 
+            None = just the total radiation field
+            'star' = radiation field from star
+        chunksize : int
+            number of frequencies in a chunk
+
+        Returns
+        -------
+        generator yielding (islice, data) tuples, where islice is the slice of the chunk in the frequency 
+        grid and data is an ndarray with [nx, ny, nz, nfreq_chunk] dimensions. 
+        The generator can be passed to integrateOverFrequency() or integrateOverWavelength()
+        """
+        fname = self._getRadiationFieldName(fname=fname, fdir=fdir, binary=binary, rtype=rtype)
+
+        if chunksize < 1:
+            raise ValueError('chunksize should be at least 1')
+
+        if binary:
+            mode = 'rb'
+        else:
+            mode = 'r'
+
+        # The header (and with it the frequency grid) is read right away, so self.grid.radfreq is set when this
+        # method returns, before the first chunk is requested
+        rfile = open(fname, mode)
+        try:
+            nrcells, dtype = self._readRadiationFieldHeader(rfile, binary=binary)
+        except Exception:
+            rfile.close()
+            raise
+
+        return self._iterRadiationFieldChunks(rfile=rfile, fname=fname, binary=binary, nrcells=nrcells, dtype=dtype,
+                                              chunksize=chunksize)
+
+    def _iterRadiationFieldChunks(self, rfile=None, fname='', binary=False, nrcells=0, dtype=np.float64,
+                                  chunksize=1):
+        """Generator reading the radiation field chunk by chunk from a file positioned after the header (see
+        iterRadiationField()). The file is closed when the generator is exhausted or closed.
+        """
+
+        with rfile:
+            nfreq = self.grid.radnfreq
+            dim = [self.grid.nx, self.grid.ny, self.grid.nz]
+
+            if binary:
+                offset = rfile.tell()
+                nbytes = np.dtype(dtype).itemsize
+                chunks = None
+            else:
+                chunks = textio.iterNumbers(rfile, count=nrcells * chunksize, dtype=dtype)
+
+            for ifreq in range(0, nfreq, chunksize):
+                nchunk = min(chunksize, nfreq - ifreq)
+                # in Fortran-order the field of each frequency is a contiguous block of nrcells values
+                if binary:
+                    rfile.seek(offset + ifreq * nrcells * nbytes)
+                    data = np.fromfile(rfile, count=nrcells * nchunk, dtype=dtype, sep='')
+                else:
+                    data = next(chunks, np.zeros(0, dtype=dtype))
+
+                if data.shape[0] != nrcells * nchunk:
+                    raise ValueError('Internal inconsistency in ' + fname + ', the file contains less values than '
+                                     + 'indicated in the file header')
+
+                yield slice(ifreq, ifreq + nchunk), np.reshape(data, dim + [nchunk], order='F')
+
     def readFluxField(self, fname='', fdir=None, binary=False):
         """ read the flux field. basically the same as mean_intensity.out, but with directions
         """
@@ -1328,7 +2208,7 @@ class radmc3dData(object):
 
             else:
                 # iformat, nrcells, nfreq
-                hdr = np.fromfile(rfile, count=3, dtype=np.int64, sep=sep)
+                hdr = np.fromfile(rfile, count=3, dtype=np.int64, sep=' ')
                 iformat = hdr[0]
                 nrcells = hdr[1]
                 self.grid.radnfreq = hdr[2]
@@ -1349,7 +2229,7 @@ class radmc3dData(object):
             if binary:
                 data = np.fromfile(rfile, count=-1, dtype=dtype, sep='')
             else:
-                data = np.fromfile(rfile, count=-1, dtype=dtype, sep=' ')
+                data = textio.readNumbers(rfile, dtype=self._getPrecisionDtype())
 
             # reformat
             data = np.reshape(data, [3,self.grid.nx, self.grid.ny, self.grid.nz, self.grid.radnfreq], order='F')
@@ -1359,7 +2239,7 @@ class radmc3dData(object):
 
         self.fluxfield = data 
 
-    def writeDustDens(self, fname='', binary=False, old=False, octree=False,fdir=None):
+    def writeDustDens(self, fname='', binary=False, old=False, octree=False,fdir=None, precision=None):
         """Writes the dust density.
 
         Parameters
@@ -1376,6 +2256,10 @@ class radmc3dData(object):
 
         octree  : bool, optional
                   If the data is defined on an octree-like AMR
+
+        precision : int, optional
+                  Precision of the values in a binary file in bytes (4 - single, 8 - double).
+                  If None radmc3dData.precision is used.
         """
 
         #
@@ -1398,9 +2282,9 @@ class radmc3dData(object):
 
             if octree:
                 self._scalarfieldWriter(data=self.grid.convArrTree2Leaf(self.rhodust), fname=fname, binary=binary,
-                                        octree=True)
+                                        octree=True, precision=precision)
             else:
-                self._scalarfieldWriter(fname, self.rhodust, binary=binary)
+                self._scalarfieldWriter(fname, self.rhodust, binary=binary, precision=precision)
 
         #
         # Write dust density for the previous 2D version of the code
@@ -1423,7 +2307,7 @@ class radmc3dData(object):
                         for iy in range(ntheta):
                             wfile.write("%.7e\n" % self.rhodust[ix, iy, 0, idust])
 
-    def writeDustTemp(self, fname='', binary=False, octree=False, fdir=None):
+    def writeDustTemp(self, fname='', binary=False, octree=False, fdir=None, precision=None):
         """Writes the dust density.
 
         Parameters
@@ -1437,6 +2321,10 @@ class radmc3dData(object):
 
         octree  : bool, optional
                   If the data is defined on an octree-like AMR
+
+        precision : int, optional
+                  Precision of the values in a binary file in bytes (4 - single, 8 - double).
+                  If None radmc3dData.precision is used.
         """
         if fname == '':
             if binary:
@@ -1452,11 +2340,11 @@ class radmc3dData(object):
         print('Writing ' + fname)
         if octree:
             self._scalarfieldWriter(data=self.grid.convArrTree2Leaf(self.dusttemp), fname=fname, binary=binary,
-                                    octree=True)
+                                    octree=True, precision=precision)
         else:
-            self._scalarfieldWriter(fname, self.dusttemp, binary=binary)
+            self._scalarfieldWriter(fname, self.dusttemp, binary=binary, precision=precision)
 
-    def writeGasNdens(self, fname='', ispec='', binary=True, fdir=None):
+    def writeGasNdens(self, fname='', ispec='', binary=True, fdir=None, precision=None):
         """Writes the gas number density.
 
         Parameters
@@ -1474,6 +2362,9 @@ class radmc3dData(object):
         binary  : bool
                   If true the data will be written in binary format, otherwise the file format is ascii
 
+        precision : int, optional
+                  Precision of the values in a binary file in bytes (4 - single, 8 - double).
+                  If None radmc3dData.precision is used.
         """
         # specify the species
         if ispec == '':
@@ -1493,11 +2384,12 @@ class radmc3dData(object):
 
         print('Writing ' + fname)
         if isinstance(self.grid, radmc3dOctree):
-            self._scalarfieldWriter(data=self.grid.convArrTree2Leaf(self.gasndens), fname=fname, binary=binary)
+            self._scalarfieldWriter(data=self.grid.convArrTree2Leaf(self.gasndens), fname=fname, binary=binary,
+                                    precision=precision)
         else:
-            self._scalarfieldWriter(fname, self.gasndens, binary=binary)
+            self._scalarfieldWriter(fname, self.gasndens, binary=binary, precision=precision)
 
-    def writeGasTemp(self, fname='', binary=True, octree=False, fdir=None):
+    def writeGasTemp(self, fname='', binary=True, octree=False, fdir=None, precision=None):
         """Writes the gas temperature.
 
         Parameters
@@ -1512,6 +2404,10 @@ class radmc3dData(object):
 
         octree  : bool, optional
                   If the data is defined on an octree-like AMR
+
+        precision : int, optional
+                Precision of the values in a binary file in bytes (4 - single, 8 - double).
+                If None radmc3dData.precision is used.
         """
         if fname == '':
             if binary:
@@ -1528,11 +2424,11 @@ class radmc3dData(object):
 
         if octree:
             self._scalarfieldWriter(data=self.grid.convArrTree2Leaf(self.gastemp), fname=fname, binary=binary,
-                                    octree=True)
+                                    octree=True, precision=precision)
         else:
-            self._scalarfieldWriter(data=self.gastemp, fname=fname, binary=binary, octree=False)
+            self._scalarfieldWriter(data=self.gastemp, fname=fname, binary=binary, octree=False, precision=precision)
 
-    def writeViscousHeating(self, fname='',binary=False, octree=False, fdir=None):
+    def writeViscousHeating(self, fname='',binary=False, octree=False, fdir=None, precision=None):
         """Writes the heating 
 
         Parameters
@@ -1546,6 +2442,10 @@ class radmc3dData(object):
 
         octree  : bool, optional
                   If the data is defined on an octree-like AMR
+
+        precision : int, optional
+                  Precision of the values in a binary file in bytes (4 - single, 8 - double).
+                  If None radmc3dData.precision is used.
         """
         if fname == '':
             fname = 'heatsource.inp'
@@ -1562,11 +2462,11 @@ class radmc3dData(object):
         print(' - Total luminosity: %f (Lsun)'%(tot_lum/nc.ls))
         if octree:
             self._scalarfieldWriter(data=self.grid.convArrTree2Leaf(self.qvis), fname=fname, binary=binary,
-                                    octree=True)
+                                    octree=True, precision=precision)
         else:
-            self._scalarfieldWriter(data=self.qvis, fname=fname, binary=binary, octree=False)
+            self._scalarfieldWriter(data=self.qvis, fname=fname, binary=binary, octree=False, precision=precision)
 
-    def writeGasVel(self, fname='', binary=False, octree=False, fdir=None):
+    def writeGasVel(self, fname='', binary=False, octree=False, fdir=None, precision=None):
         """Writes the gas velocity.
 
         Parameters
@@ -1581,6 +2481,10 @@ class radmc3dData(object):
 
         octree  : bool, optional
                   If the data is defined on an octree-like AMR
+
+        precision : int, optional
+                Precision of the values in a binary file in bytes (4 - single, 8 - double).
+                If None radmc3dData.precision is used.
         """
 
         if fname == '':
@@ -1592,7 +2496,7 @@ class radmc3dData(object):
         if fdir is not None:
             fname = os.path.join(fdir, fname)
 
-        self._vectorfieldWriter(fname, self.gasvel, binary=binary, ndim=3)
+        self._vectorfieldWriter(fname, self.gasvel, binary=binary, ndim=3, precision=precision)
 
         """ keep this for reference. can be deleted if checked later on 
         if binary:
@@ -1684,7 +2588,7 @@ class radmc3dData(object):
 #                                wfile.write("%.9e %.9e %.9e\n" % (self.gasvel[ix, iy, iz, 0], self.gasvel[ix, iy, iz, 1],
 #                                                               self.gasvel[ix, iy, iz, 2]))
         """
-    def writeDustAlign(self, fname='', binary=False, fdir=None):
+    def writeDustAlign(self, fname='', binary=False, fdir=None, precision=None):
         """Writes the dust alignment. Note that the alignment direction is only in cartesian directions 
 
         Parameters
@@ -1697,6 +2601,9 @@ class radmc3dData(object):
         binary : bool
                 If true the data will be written in binary format, otherwise the file format is ascii
 
+        precision : int, optional
+                Precision of the values in a binary file in bytes (4 - single, 8 - double).
+                If None radmc3dData.precision is used.
         """
         # determine default file name
         if fname == '':
@@ -1710,9 +2617,9 @@ class radmc3dData(object):
             fname = os.path.join(fdir, fname)
 
         # write out the data 
-        self._vectorfieldWriter(fname, self.alvec, binary=binary, ndim=4)
+        self._vectorfieldWriter(fname, self.alvec, binary=binary, ndim=4, precision=precision)
 
-    def writeBfield(self, fname='', binary=False, fdir=None):
+    def writeBfield(self, fname='', binary=False, fdir=None, precision=None):
         """Writes the Bfield
 
         Parameters
@@ -1725,6 +2632,9 @@ class radmc3dData(object):
         binary : bool
                 If true the data will be written in binary format, otherwise the file format is ascii
 
+        precision : int, optional
+                Precision of the values in a binary file in bytes (4 - single, 8 - double).
+                If None radmc3dData.precision is used.
         """
 
         if fname == '':
@@ -1736,9 +2646,9 @@ class radmc3dData(object):
         if fdir is not None:
             fname = os.path.join(fdir, fname)
 
-        self._vectorfieldWriter(fname, self.bfield, binary=binary, ndim=3)
+        self._vectorfieldWriter(fname, self.bfield, binary=binary, ndim=3, precision=precision)
 
-    def writeVTurb(self, fname='', binary=True, octree=False, fdir=None):
+    def writeVTurb(self, fname='', binary=True, octree=False, fdir=None, precision=None):
         """Writes the microturbulence file.
 
         Parameters
@@ -1753,6 +2663,10 @@ class radmc3dData(object):
 
         octree  : bool, optional
                   If the data is defined on an octree-like AMR
+
+        precision : int, optional
+                  Precision of the values in a binary file in bytes (4 - single, 8 - double).
+                  If None radmc3dData.precision is used.
         """
 
         if fname == '':
@@ -1769,18 +2683,305 @@ class radmc3dData(object):
 
         if octree:
             self._scalarfieldWriter(data=self.grid.convArrTree2Leaf(self.vturb), fname=fname, binary=binary,
-                                    octree=True)
+                                    octree=True, precision=precision)
+        else:
+            self._scalarfieldWriter(data=self.vturb, fname=fname, binary=binary, octree=False, precision=precision)
+
+    def _getVTKLeafOrder(self):
+        """Returns the tree indices of the leaf cells of an octree in the order of the leaf arrays.
+        """
+
+        ii = np.where(self.grid.leafID >= 0)[0]
+        order = np.zeros(self.grid.nLeaf, dtype=np.int64)
+        order[self.grid.leafID[ii]] = ii
+
+        return order
+
+    def _getVTKGrid(self):
+        """Calculates the cartesian coordinates of the cell corners for the vtk output.
+
+        Returns
+        -------
+
+        Returns a tuple (points, dims, cells). points is an ndarray with [npoint, 3] dimensions containing the
+        cartesian coordinates of the points. For regular grids dims contains the number of cell walls in the
+        three dimensions (the points are ordered with the first index being the fastest) and cells is None.
+        For octrees dims is None and cells is an ndarray with [nLeaf, 8] dimensions containing the indices of the
+        points that define each leaf cell as a hexahedron (VTK cell type #12). Corners shared by neighbouring
+        leaves are stored only once.
+        """
+
+        if self.grid.crd_sys not in ['car', 'sph']:
+            raise ValueError('Unsupported coordinate system ' + str(self.grid.crd_sys) + '. Only cartesian (car) and '
+                             + 'spherical (sph) grids can be written to vtk files.')
+
+        if isinstance(self.grid, radmc3dOctree):
+            order = self._getVTKLeafOrder()
+            # ---------------------------------------------------------------------------------------------
+            # The indexing of a hexahedron is as follows
+            #
+            #                  7________6
+            #                 /|      / |
+            #                / |     /  |
+            #               4_------5   |             z ^   ^ y
+            #               |  3____|___2               |  /
+            #               | /     |  /                | /
+            #               |/      | /                 |/
+            #               0-------1                   0-----> x
+            #
+            # The offsets below are in units of the half cell widths
+            # ---------------------------------------------------------------------------------------------
+            sx = np.array([-1., 1., 1., -1., -1., 1., 1., -1.])
+            sy = np.array([-1., -1., 1., 1., -1., -1., 1., 1.])
+            sz = np.array([-1., -1., -1., -1., 1., 1., 1., 1.])
+            c1 = (self.grid.x[order, np.newaxis] + sx * self.grid.dx[order, np.newaxis]).ravel()
+            c2 = (self.grid.y[order, np.newaxis] + sy * self.grid.dy[order, np.newaxis]).ravel()
+            c3 = (self.grid.z[order, np.newaxis] + sz * self.grid.dz[order, np.newaxis]).ravel()
+
+            # Neighbouring leaves share corners. The corners are identified by their integer coordinates in units
+            # of the finest cell width (levelMax), so that each point is written only once
+            icrd = np.zeros([c1.shape[0], 3], dtype=np.int64)
+            for idim, (crd, ci) in enumerate(zip([c1, c2, c3], [self.grid.xi, self.grid.yi, self.grid.zi])):
+                width = np.ldexp(ci[1] - ci[0], -self.grid.levelMax * int(self.grid.act_dim[idim]))
+                icrd[:, idim] = np.rint((crd - ci[0]) / width)
+            icrd, ipoint, cells = np.unique(icrd, axis=0, return_index=True, return_inverse=True)
+            c1 = c1[ipoint]
+            c2 = c2[ipoint]
+            c3 = c3[ipoint]
+            cells = cells.reshape([self.grid.nLeaf, 8])
+            dims = None
+        else:
+            c1, c2, c3 = np.meshgrid(self.grid.xi, self.grid.yi, self.grid.zi, indexing='ij')
+            c1 = c1.ravel(order='F')
+            c2 = c2.ravel(order='F')
+            c3 = c3.ravel(order='F')
+            dims = [self.grid.xi.shape[0], self.grid.yi.shape[0], self.grid.zi.shape[0]]
+            cells = None
+
+        if self.grid.crd_sys == 'sph':
+            # r, theta, phi -> x, y, z
+            points = np.column_stack((c1 * np.sin(c2) * np.cos(c3), c1 * np.sin(c2) * np.sin(c3), c1 * np.cos(c2)))
         else:
-            self._scalarfieldWriter(data=self.vturb, fname=fname, binary=binary, octree=False)
+            points = np.column_stack((c1, c2, c3))
 
-    def writeVTK(self, vtk_fname='', ddens=False, dtemp=False, idust=None, gdens=False, gvel=False, gtemp=False):
-        """Writes physical variables to a legacy vtk file.
+        return points, dims, cells
+
+    def _getVTKField(self, arr=None):
+        """Converts a field to the cell order of the vtk output.
+
+        Parameters
+        ----------
+
+        arr : ndarray
+              Scalar or vector field, defined on the regular grid or on the octree (full tree or leaf cells only)
+
+        Returns
+        -------
+
+        Returns an ndarray with [ncell] dimensions for scalars and [ncell, ncomponent] for vectors
+        """
+
+        if isinstance(self.grid, radmc3dOctree):
+            ncell = self.grid.nLeaf
+            if arr.shape[0] != ncell:
+                arr = arr[self._getVTKLeafOrder()]
+            arr = np.reshape(arr, [ncell, -1])
+        else:
+            ncell = self.grid.nx * self.grid.ny * self.grid.nz
+            if np.prod(arr.shape[:3]) != ncell:
+                raise ValueError('The shape of the field ' + str(arr.shape) + ' does not match the grid ('
+                                 + ("%d" % self.grid.nx) + ', ' + ("%d" % self.grid.ny) + ', '
+                                 + ("%d" % self.grid.nz) + ')')
+            arr = np.reshape(arr, [ncell, -1], order='F')
+
+        if arr.shape[1] == 1:
+            arr = arr[:, 0]
+
+        return arr
+
+    def _writeVTKLegacy(self, fname='', points=None, dims=None, cells=None, celldata=None, binary=False):
+        """Writes the grid and the cell data to a legacy vtk file.
+
+        Parameters
+        ----------
+
+        fname    : str
+                   Name of the file
+
+        points, dims, cells : ndarray, list, ndarray
+                   Grid of the model as returned by _getVTKGrid()
+
+        celldata : list
+                   List of (name, ndarray) tuples containing the cell centered scalars and vectors
+
+        binary   : bool
+                   If True the data is written in (big endian) binary format, otherwise as ASCII text
+        """
+
+        def writeArray(wfile, arr):
+            if binary:
+                if arr.dtype.kind == 'f':
+                    dtype = '>f' + str(arr.dtype.itemsize)
+                else:
+                    dtype = '>i4'
+                np.ascontiguousarray(arr, dtype=dtype).tofile(wfile)
+            else:
+                if arr.dtype.kind == 'f':
+                    fmt = '%.9e'
+                else:
+                    fmt = '%d'
+                np.asarray(arr).tofile(wfile, sep=' ', format=fmt)
+            wfile.write(b'\n')
+
+        with open(fname, 'wb') as wfile:
+            hdr = '# vtk DataFile Version 3.0\nRADMC-3D Data\n'
+            if binary:
+                hdr += 'BINARY\n'
+            else:
+                hdr += 'ASCII\n'
+
+            if cells is None:
+                hdr += 'DATASET STRUCTURED_GRID\n'
+                hdr += 'DIMENSIONS %d %d %d\n' % (dims[0], dims[1], dims[2])
+                ncell = (dims[0] - 1) * (dims[1] - 1) * (dims[2] - 1)
+            else:
+                hdr += 'DATASET UNSTRUCTURED_GRID\n'
+                ncell = cells.shape[0]
+
+            hdr += 'POINTS %d double\n' % points.shape[0]
+            wfile.write(hdr.encode())
+            writeArray(wfile, points)
+
+            if cells is not None:
+                # Number of points followed by the point indices of each cell
+                conn = np.zeros([ncell, 9], dtype=np.int32)
+                conn[:, 0] = 8
+                conn[:, 1:] = cells
+                wfile.write(('CELLS %d %d\n' % (ncell, ncell * 9)).encode())
+                writeArray(wfile, conn)
+                wfile.write(('CELL_TYPES %d\n' % ncell).encode())
+                writeArray(wfile, np.zeros(ncell, dtype=np.int32) + 12)
+
+            if celldata:
+                wfile.write(('CELL_DATA %d\n' % ncell).encode())
+                for name, arr in celldata:
+                    if arr.dtype == np.float32:
+                        vtype = 'float'
+                    else:
+                        vtype = 'double'
+                    if arr.ndim == 1:
+                        wfile.write(('SCALARS %s %s 1\nLOOKUP_TABLE default\n' % (name, vtype)).encode())
+                    else:
+                        wfile.write(('VECTORS %s %s\n' % (name, vtype)).encode())
+                    writeArray(wfile, arr)
+
+    def _writeVTKXML(self, fname='', points=None, dims=None, cells=None, celldata=None, compress=False):
+        """Writes the grid and the cell data to a VTK XML file (.vts for regular grids, .vtu for octrees).
+
+        All arrays are stored as raw binary data in the appended section of the file.
+
+        Parameters
+        ----------
+
+        fname    : str
+                   Name of the file
+
+        points, dims, cells : ndarray, list, ndarray
+                   Grid of the model as returned by _getVTKGrid()
+
+        celldata : list
+                   List of (name, ndarray) tuples containing the cell centered scalars and vectors
+
+        compress : bool
+                   If True the arrays are compressed with zlib
+        """
+
+        vtypes = {'f4': 'Float32', 'f8': 'Float64', 'i8': 'Int64', 'u1': 'UInt8'}
+
+        # Arrays of the file: section, name, data
+        entries = [('Points', None, points)]
+        if cells is not None:
+            ncell = cells.shape[0]
+            entries.append(('Cells', 'connectivity', cells.astype(np.int64).ravel()))
+            entries.append(('Cells', 'offsets', np.arange(1, ncell + 1, dtype=np.int64) * 8))
+            entries.append(('Cells', 'types', np.zeros(ncell, dtype=np.uint8) + 12))
+        for name, arr in celldata:
+            entries.append(('CellData', name, arr))
+
+        # Encode the arrays and determine their offsets in the appended section
+        blocks = []
+        xml = {'Points': '', 'Cells': '', 'CellData': ''}
+        offset = 0
+        for section, name, arr in entries:
+            key = arr.dtype.kind + str(arr.dtype.itemsize)
+            if key not in vtypes:
+                arr = arr.astype(np.float64)
+                key = 'f8'
+            arr = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder('<'))
+
+            if compress:
+                raw = memoryview(arr).cast('B')
+                bsize = 1024 * 1024
+                cblocks = [zlib.compress(raw[i:i + bsize]) for i in range(0, max(raw.nbytes, 1), bsize)]
+                last = raw.nbytes - (len(cblocks) - 1) * bsize
+                block = [np.array([len(cblocks), bsize, last] + [len(b) for b in cblocks], dtype='<u8')] + cblocks
+            else:
+                block = [np.array([arr.nbytes], dtype='<u8'), arr]
+
+            tag = '        <DataArray type="' + vtypes[key] + '"'
+            if name is not None:
+                tag += ' Name="' + name + '"'
+            if arr.ndim > 1:
+                tag += ' NumberOfComponents="%d"' % arr.shape[1]
+            tag += ' format="appended" offset="%d"/>\n' % offset
+            xml[section] += tag
+
+            blocks.extend(block)
+            offset += sum([b.nbytes if isinstance(b, np.ndarray) else len(b) for b in block])
+
+        if cells is None:
+            gtype = 'StructuredGrid'
+            extent = '0 %d 0 %d 0 %d' % (dims[0] - 1, dims[1] - 1, dims[2] - 1)
+            gopen = '  <StructuredGrid WholeExtent="' + extent + '">\n    <Piece Extent="' + extent + '">\n'
+        else:
+            gtype = 'UnstructuredGrid'
+            gopen = '  <UnstructuredGrid>\n    <Piece NumberOfPoints="%d" NumberOfCells="%d">\n' \
+                    % (points.shape[0], cells.shape[0])
+
+        hdr = '<?xml version="1.0"?>\n'
+        hdr += '<VTKFile type="' + gtype + '" version="1.0" byte_order="LittleEndian" header_type="UInt64"'
+        if compress:
+            hdr += ' compressor="vtkZLibDataCompressor"'
+        hdr += '>\n' + gopen
+        hdr += '      <Points>\n' + xml['Points'] + '      </Points>\n'
+        if cells is not None:
+            hdr += '      <Cells>\n' + xml['Cells'] + '      </Cells>\n'
+        hdr += '      <CellData>\n' + xml['CellData'] + '      </CellData>\n'
+        hdr += '    </Piece>\n  </' + gtype + '>\n'
+        hdr += '  <AppendedData encoding="raw">\n   _'
+
+        with open(fname, 'wb') as wfile:
+            wfile.write(hdr.encode())
+            for b in blocks:
+                if isinstance(b, np.ndarray):
+                    b.tofile(wfile)
+                else:
+                    wfile.write(b)
+            wfile.write(b'\n  </AppendedData>\n</VTKFile>\n')
+
+    def writeVTK(self, vtk_fname='', ddens=False, dtemp=False, idust=None, gdens=False, gvel=False, gtemp=False,
+                 binary=False, xml=False, compress=False):
+        """Writes physical variables to a vtk file.
+
+        Regular grids are written as structured grids, octrees as unstructured grids of the leaf cells. All
+        variables are written as cell data, the gas velocity is converted to cartesian components.
 
         Parameters
         ----------
 
         vtk_fname : str
                     Name of the file to be written, if not specified 'radmc3d_data.vtk' will be used
+                    ('radmc3d_data.vts' or 'radmc3d_data.vtu' for XML files)
 
         ddens     : bool
                     If set to True the dust density will be written to the vtk file
@@ -1800,6 +3001,16 @@ class radmc3dData(object):
 
         gvel      : bool
                     If set to True the gas velocity will be written to the vtk file
+
+        binary    : bool
+                    If True the legacy vtk file is written in binary format, otherwise as ASCII text
+
+        xml       : bool
+                    If True a VTK XML file is written (.vts for regular grids and .vtu for octrees) instead of
+                    a legacy vtk file. XML files are always binary.
+
+        compress  : bool
+                    If True the arrays in the VTK XML file are compressed with zlib
         """
 
         if isinstance(idust, int):
@@ -1811,168 +3022,61 @@ class radmc3dData(object):
                       + 'it has not been specified for which dust species.'
                 raise ValueError(msg)
 
-
         if vtk_fname == '':
-            vtk_fname = 'radmc3d_data.vtk'
+            if not xml:
+                vtk_fname = 'radmc3d_data.vtk'
+            elif isinstance(self.grid, radmc3dOctree):
+                vtk_fname = 'radmc3d_data.vtu'
+            else:
+                vtk_fname = 'radmc3d_data.vts'
         else:
             vtk_fname = str(vtk_fname)
 
         #
         # Get the grid
         #
-
-        x = self.grid.xi
-        # For the theta axis I leave out the poles
-        #  The current cell type is hexahedron and the cells near the pole are
-        #    rather tetrahedra than hexahedra and this is not yet implemented
-        y = np.array(self.grid.yi[1:self.grid.nyi - 1])
-        z = self.grid.zi
-        nxi = x.shape[0]
-        nyi = y.shape[0]
-        nzi = z.shape[0]
+        points, dims, cells = self._getVTKGrid()
 
         #
-        # Gas velocity field (Should be corner centered)
-        # TODO
-        #  The lines below should be double checked and re-implemented as
-        #  the re-mapping of the cell centered velocity field to the cell corners
-        #  is physically not correct and very messy...
+        # Cell centered variables
         #
+        celldata = []
+        if ddens:
+            for ids in idust:
+                celldata.append(('dust_density_' + str(int(ids)), self._getVTKField(self.rhodust[..., ids])))
+        if dtemp:
+            for ids in idust:
+                celldata.append(('dust_temperature_' + str(int(ids)), self._getVTKField(self.dusttemp[..., ids])))
+        if gdens:
+            celldata.append(('gas_numberdensity', self._getVTKField(self.gasndens)))
+        if gtemp:
+            celldata.append(('gas_temperature', self._getVTKField(self.gastemp)))
         if gvel:
-            vgas = np.zeros([nxi, nyi, nzi, 3], dtype=np.float64)
-            vgas[0:nxi - 1, 0:nyi, 0:nzi - 1, :] = self.gasvel[:, 1:nyi + 1, :, :]
-            vgas[nxi - 1, :, :, :] = vgas[nxi - 2, :, :, :]
-            vgas[:, nyi - 1, :, :] = vgas[:, nyi - 2, :, :]
-            vgas[:, :, nzi - 1, :] = vgas[:, :, nzi - 2, :]
-
-        #
-        # Header
-        #
-        with open(vtk_fname, 'w') as wfile:
-            wfile.write('%s\n' % '# vtk DataFile Version 3.0')
-            wfile.write('%s\n' % 'RADMC-3D Data')
-            wfile.write('%s\n' % 'ASCII')
-            wfile.write('%s\n' % 'DATASET UNSTRUCTURED_GRID')
-
-            #
-            # Write out the coordinates of the cell corners
-            #
-            wfile.write('%s\n' % ('POINTS ' + str(nxi * nyi * nzi).strip() + ' double'))
-            print('Writing POINTS: ')
-            for ix in range(nxi):
-                print(ix, nxi)
-                for iy in range(nyi):
-                    for iz in range(nzi):
-                        crd = crd_trans.ctransSph2Cart([x[ix], z[iz], y[iy]])
-                        wfile.write('%.9e %9e %9e\n' % (crd[0], crd[1], crd[2]))
-
-                        # ---------------------------------------------------------------------------------------------
-                        # Write out the indices of the cell interface mesh that define a
-                        # hexahedron (VTK cell type #12)
-                        #
-                        # The indexing of a hexahedron is as follows
-                        #
-                        #                  7________6
-                        #                 /|      / |
-                        #                / |     /  |
-                        #               4_------5   |             z ^   ^ y
-                        #               |  3____|___2               |  /
-                        #               | /     |  /                | /
-                        #               |/      | /                 |/
-                        #               0-------1                   0-----> x
-                        #
-                        # ---------------------------------------------------------------------------------------------
-
-            wfile.write('%s %d %d\n' % ('CELLS ', ((nxi - 1) * (nyi - 1) * (nzi - 1)),
-                                        ((nxi - 1) * (nyi - 1) * (nzi - 1)) * 9))
-
-            for ix in range(nxi - 1):
-                print('Writing CELL COORDINATES: ', ix, self.grid.nxi - 2)
-                for iy in range(nyi - 1):
-                    for iz in range(nzi - 1):
-                        id1 = nzi * nyi * ix + nzi * iy + iz
-                        id2 = nzi * nyi * ix + nzi * (iy + 1) + iz
-                        id4 = nzi * nyi * ix + nzi * iy + ((iz + 1) % (nzi - 1))
-                        id3 = nzi * nyi * ix + nzi * (iy + 1) + ((iz + 1) % (nzi - 1))
-                        id5 = nzi * nyi * (ix + 1) + nzi * iy + iz
-                        id6 = nzi * nyi * (ix + 1) + nzi * (iy + 1) + iz
-                        id7 = nzi * nyi * (ix + 1) + nzi * (iy + 1) + ((iz + 1) % (nzi - 1))
-                        id8 = nzi * nyi * (ix + 1) + nzi * iy + ((iz + 1) % (nzi - 1))
-
-                        line = np.array([8, id1, id2, id3, id4, id5, id6, id7, id8])
-                        line.tofile(wfile, sep=' ', format='%d')
-                        wfile.write('\n')
-                        #
-                        # Now write out the type of each cell (#12)
-                        #
-            wfile.write('%s %d\n' % ('CELL_TYPES', ((nxi - 1) * (nyi - 1) * (nzi - 1))))
-
-            for ix in range(nxi - 1):
-                for iy in range(nyi - 1):
-                    for iz in range(nzi - 1):
-                        wfile.write('%d\n' % 12)
-                        #
-                        # Now write out the corner centered velocities
-                        #
-
-            if gvel:
-                wfile.write('%s %d\n' % ('POINT_DATA', (nxi * nyi * nzi)))
-                wfile.write('%s\n' % 'VECTORS gas_velocity double')
-                for ix in range(nxi):
-                    print('Writing velocity : ', ix, nxi - 1)
-                    for iy in range(nyi):
-                        for iz in range(nzi):
-                            vsph = np.array([vgas[ix, iy, iz, 0], vgas[ix, iy, iz, 2], vgas[ix, iy, iz, 1]])
-                            vxyz = crd_trans.vtransSph2Cart([x[ix], z[iz], y[iy]], vsph)
-
-                            wfile.write('%.9e %.9e %.9e\n' % (vxyz[0], vxyz[1], vxyz[2]))
-
-            #
-            # Write out the cell centered scalars
-            #
-            wfile.write('%s %d\n' % ('CELL_DATA', ((nxi - 1) * (nyi - 1) * (nzi - 1))))
-
-            if ddens:
-                for ids in idust:
-                    wfile.write('%s\n' % ('SCALARS dust_density_' + str(int(ids)) + ' double'))
-                    wfile.write('%s\n' % 'LOOKUP_TABLE default')
-
-                    for ix in range(nxi - 1):
-                        print('Writing dust density : ', ix, nxi - 2)
-                        for iy in range(nyi - 1):
-                            for iz in range(nzi - 1):
-                                wfile.write('%.9e\n' % self.rhodust[ix, iy, iz, ids])
-
-            if dtemp:
-                for ids in idust:
-                    wfile.write('%s\n' % ('SCALARS dust_temperature_' + str(int(ids)) + ' double'))
-                    wfile.write('%s\n' % 'LOOKUP_TABLE default')
-
-                    for ix in range(nxi - 1):
-                        print('Writing dust temperature : ', ix, nxi - 2)
-                        for iy in range(nyi - 1):
-                            for iz in range(nzi - 1):
-                                wfile.write('%.9e\n' % self.dusttemp[ix, iy, iz, ids])
-
-            if gdens:
-                wfile.write('%s\n' % 'SCALARS gas_numberdensity double')
-                wfile.write('%s\n' % 'LOOKUP_TABLE default')
-
-                for ix in range(nxi - 1):
-                    print('Writing gas density : ', ix, nxi - 2)
-                    for iy in range(nyi - 1):
-                        for iz in range(nzi - 1):
-                            wfile.write('%.9e\n' % self.gasndens[ix, iy, iz])
-
-            if gtemp:
-                wfile.write('%s\n' % 'SCALARS gas_temperature double')
-                wfile.write('%s\n' % 'LOOKUP_TABLE default')
-
-                for ix in range(nxi - 1):
-                    print('Writing dust temperature : ', ix, nxi - 2)
-                    for iy in range(nyi - 1):
-                        for iz in range(nzi - 1):
-                            wfile.write('%.9e\n' % self.gastemp[ix, iy, iz])
+            vel = self._getVTKField(self.gasvel)
+            if self.grid.crd_sys == 'sph':
+                # vr, vtheta, vphi -> vx, vy, vz at the cell centers
+                if isinstance(self.grid, radmc3dOctree):
+                    order = self._getVTKLeafOrder()
+                    theta = self.grid.y[order]
+                    phi = self.grid.z[order]
+                else:
+                    r, theta, phi = np.meshgrid(self.grid.x, self.grid.y, self.grid.z, indexing='ij')
+                    theta = theta.ravel(order='F')
+                    phi = phi.ravel(order='F')
+                st, ct = np.sin(theta), np.cos(theta)
+                sp, cp = np.sin(phi), np.cos(phi)
+                vel = np.column_stack((vel[:, 0] * st * cp + vel[:, 1] * ct * cp - vel[:, 2] * sp,
+                                       vel[:, 0] * st * sp + vel[:, 1] * ct * sp + vel[:, 2] * cp,
+                                       vel[:, 0] * ct - vel[:, 1] * st))
+            celldata.append(('gas_velocity', vel))
+
+        print('Writing ' + vtk_fname)
+        if xml:
+            self._writeVTKXML(fname=vtk_fname, points=points, dims=dims, cells=cells, celldata=celldata,
+                              compress=compress)
+        else:
+            self._writeVTKLegacy(fname=vtk_fname, points=points, dims=dims, cells=cells, celldata=celldata,
+                                 binary=binary)
 
     def getSigmaDust(self, idust=-1):
         """Calculates the dust surface density.
@@ -2028,13 +3132,40 @@ class radmc3dData(object):
         dum = np.squeeze(mass.sum(1))
         self.sigmagas = dum / np.squeeze(surf)
 
+def _integrateChunks(dat, weight):
+    """
+    sum the data multiplied by the weight along its last dimension
+    Parameters
+    ----------
+    dat : ndarray, iterator
+        ndarray or iterator yielding (islice, ndarray) tuples, where islice selects the elements of weight 
+        belonging to the last dimension of the chunk
+    weight : 1d ndarray
+    """
+    if isinstance(dat, np.ndarray):
+        chunks = [(slice(None), dat)]
+    else:
+        chunks = dat
+
+    dat_sum = None
+    for isl, chunk in chunks:
+        part = np.dot(chunk, weight[isl])
+        if dat_sum is None:
+            dat_sum = part
+        else:
+            dat_sum = dat_sum + part
+
+    return dat_sum
+
 def integrateOverFrequency(dat_nu, nuCell=None, nuWall=None, phys_nu=None):
     """
     integrate a gridded data over frequency, used to calculate energy density
     Parameters
     ----------
-    dat_nu : ndarray
+    dat_nu : ndarray, iterator
         can be of any dimension, but the frequency dependence is always the last dimension
+        it can also be an iterator over frequency chunks, see radmc3dData.iterRadiationField(), 
+        in which case only one chunk is in memory at a time
 
     nuCell : 1d ndarray, optional 
         frequency at the cell locations. the walls will be extrapolated
@@ -2048,30 +3179,15 @@ def integrateOverFrequency(dat_nu, nuCell=None, nuWall=None, phys_nu=None):
     if nuWall is None:
         nuWall = extrapolate_geo(nuCell)
 
-    dim = dat_nu.shape
-    ndim = len(dim)
-
-    nf = len(nuCell)
     df = np.abs(np.diff(nuWall))
 
-    if ndim > 1:
-        # reshape ito a 2d array
-        ndatcells = np.prod(dim[:-1])
-        flat_dat_nu = np.reshape(dat_nu, (ndatcells, nf))
-    else:
-        flat_dat_nu = dat_nu
-
     # integrate
     if phys_nu is None:
-        flat_dat_sum = np.sum(flat_dat_nu * df, axis=-1)
+        weight = df
     else:
-        flat_dat_sum = np.sum(flat_dat_nu * phys_nu * df, axis=-1)
+        weight = phys_nu * df
 
-    if ndim > 1:
-        dat_sum = np.reshape(flat_dat_sum, dim[:-1])
-    else:
-        dat_sum = flat_dat_sum
-    return dat_sum
+    return _integrateChunks(dat_nu, weight)
 
 def integrateOverWavelength(dat_w, wavCell=None, wavWall=None, phys_w=None):
     """
@@ -2081,41 +3197,27 @@ def integrateOverWavelength(dat_w, wavCell=None, wavWall=None, phys_w=None):
     ----------
     wav : 1d ndarray
         the wavelength axis where the radiation field is defined
-    dat_w : ndarray
+    dat_w : ndarray, iterator
         can be of any dimension, but the wavelength dependence is always the last dimension
+        it can also be an iterator over wavelength chunks, see radmc3dData.iterRadiationField(), 
+        in which case only one chunk is in memory at a time
     """
     if (wavCell is None) & (wavWall is None):
         raise ValueError('at least the wavelength cell or wall should be given')
 
     if wavCell is not None:
         # extrapolate to obtain the wavelength walls
-        wavWall = grid.extrapolate_geo(wavCell)
-
-    dim = dat_w.shape
-    ndim = len(dim)
+        wavWall = extrapolate_geo(wavCell)
 
-    nw = len(wavWall) - 1
     dw = np.diff(wavWall)
 
-    # flatten the array 
-    if ndim > 1:
-        ncells = np.prod(dim[:-1])
-        flat_dat_w = np.reshape(dat_w, (ncells, nw))
-    else:
-        flat_dat_w = dat_w
-
     # integrate
     if phys_w is None:
-        flat_dat_sum = np.sum(flat_dat_w * dw, axis=-1)
+        weight = dw
     else:
-        flat_dat_sum = np.sum(flat_dat_w * phys_w * dw, axis=-1)
+        weight = phys_w * dw
 
-    if ndim > 1:
-        dat_sum = np.reshape(flat_dat_sum, dim[:-1])
-    else:
-        dat_sum = flat_dat_sum
-
-    return dat_sum
+    return _integrateChunks(dat_w, weight)
 
 def integrate_x(dat_x, xCell=None, xWall=None, phys_x=None):
     """
@@ -2133,7 +3235,7 @@ def integrate_x(dat_x, xCell=None, xWall=None, phys_x=None):
 
     if xCell is not None:
         # extrapolate to obtain the walls
-        xWall = grid.extrapolate_geo(xCell)
+        xWall = extrapolate_geo(xCell)
 
     dim = dat_x.shape
     ndim = len(dim)
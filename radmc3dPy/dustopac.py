@@ -31,6 +31,7 @@ except ImportError:
 
 from . import natconst as nc
 from . import miescat
+from . import textio
 from . reggrid import *
 import warnings
 from scipy.interpolate import interp1d
@@ -343,16 +344,16 @@ class radmc3dDustOpac(object):
                     fname = os.path.join(fdir, fname)
                 print('Reading ' + fname)
 
+                data = textio.readFile(fname)
+
                 # Check the file format
-                iformat = np.fromfile(fname, count=1, sep=" ", dtype=np.int)
-                iformat = iformat[0]
+                iformat = int(data[0])
                 if iformat != 1:
                     msg = 'Format number of the file dustkapscatmat_' + ext[i] + '.inp (iformat=' + ("%d" % iformat) + \
                           ') is unkown'
                     raise ValueError(msg)
 
-                data = np.fromfile(fname, count=-1, sep=" ", dtype=np.float64)
-                hdr = np.array(data[:3], dtype=np.int)
+                hdr = np.array(data[:3], dtype=np.int64)
                 data = data[3:]
 
                 self.nwav.append(hdr[1])
@@ -404,15 +405,15 @@ class radmc3dDustOpac(object):
 
                     print('Reading '+fname)
 
+                    data = textio.readFile(fname)
+
                     # Check the file format
-                    iformat = np.fromfile(fname, count=1, sep=" ", dtype=np.int)
-                    iformat = iformat[0]
+                    iformat = int(data[0])
                     if (iformat < 1) | (iformat > 3):
                         msg = 'Unknown file format in the dust opacity file ' + fname
                         raise ValueError(msg)
 
-                    data = np.fromfile(fname, count=-1, sep=" ", dtype=np.float64)
-                    hdr = np.array(data[:2], dtype=np.int)
+                    hdr = np.array(data[:2], dtype=np.int64)
                     data = data[2:]
 
                     self.ext.append(ext[i])
@@ -457,14 +458,14 @@ class radmc3dDustOpac(object):
                             fname = fdir + '/' + fname
 
                     print('Reading '+fname)
-                    freq = np.fromfile('frequency.inp', count=-1, sep=" ", dtype=np.float64)
+                    freq = textio.readFile('frequency.inp')
                     nfreq = int(freq[0])
                     freq = freq[1:]
                     self.ext.append(ext[i])
                     self.idust.append(idust[i])
 
-                    data = np.fromfile(fname, count=-1, sep=" ", dtype=np.float64)
-                    hdr = np.array(data[:2], dtype=np.int)
+                    data = textio.readFile(fname)
+                    hdr = np.array(data[:2], dtype=np.int64)
                     data = data[2:]
                     if hdr[0] != nfreq:
                         msg = fname + ' contains a different number of frequencies than frequency.inp'
@@ -488,17 +489,16 @@ class radmc3dDustOpac(object):
 
                 print('Reading '+fname)
 
+                data = textio.readFile(fname)
+
                 # Check the file format
-                iformat = np.fromfile(fname, count=1, sep=" ", dtype=np.int)
-                iformat = iformat[0]
+                iformat = int(data[0])
                 if iformat != 1:
                     msg = 'Format number of the file dustkapscatmat_' + ext[i] + '.inp (iformat=' + ("%d" % iformat) + \
                           ') is unkown'
                     raise ValueError(msg)
 
-                data = np.fromfile(fname, count=-1, sep=" ", dtype=np.float64)
-
-                hdr = np.array(data[:3], dtype=np.int)
+                hdr = np.array(data[:3], dtype=np.int64)
                 data = data[3:]
 
                 # get the wavelength grid
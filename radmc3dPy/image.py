@@ -9,6 +9,11 @@ import traceback
 import copy
 import subprocess as sp
 import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 import pdb
 
@@ -28,6 +33,13 @@ except ImportError:
     print('This module is required to be able to calculate Airy-PSFs. Now PSF calculation is limited to Gaussian.')
     print(traceback.format_exc())
 
+try:
+    import scipy.fft as spfft
+except ImportError:
+    spfft = None
+    print('scipy.fft cannot be imported ')
+    print('Image convolution will use the single threaded numpy FFT.')
+
 try:
     from astropy.io import fits as pf
 except ImportError:
@@ -60,6 +72,13 @@ except ImportError:
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
 from . import natconst as nc
+from . import textio
+
+# Maximum number of PSFs kept in the cache of radmc3dImage.imConv()
+psfCacheSize = 64
+# Step of the radial table of the Airy PSF profile in units of pi * diameter * radius / wavelength (see getPSF())
+airyTableStep = 1e-3
+_psfCache = OrderedDict()
 
 class baseImage(object):
     """
@@ -255,7 +274,7 @@ class radmc3dImage(baseImage):
         self.imageJyppix = self.image * self.pixel_area / (dpc * nc.pc)**2 * 1e23
         self.dpc = dpc
 
-    def getClosurePhase(self, bl=None, pa=None, dpc=None):
+    def getClosurePhase(self, bl=None, pa=None, dpc=None, chunksize=256, nthreads=1):
         """Calculates clusure phases for a given model image for any arbitrary baseline triplet.
 
         Parameters
@@ -269,6 +288,11 @@ class radmc3dImage(baseImage):
 
         dpc : distance of the source in parsec
 
+        chunksize : int, optional
+              Number of baselines transformed at once (see getVisibility())
+
+        nthreads : int, optional
+              Number of threads used for the Fourier transform (see getVisibility())
 
         Returns
         -------
@@ -290,7 +314,9 @@ class radmc3dImage(baseImage):
         -----
 
         bl and pa should either be an array with dimension [N,3] or if they are lists each element of
-        the list should be a list of length 3, since closure phases are calculated only for closed triangles
+        the list should be a list of length 3, since closure phases are calculated only for closed triangles.
+        Baselines shared by several triangles are transformed only once. For Stokes images the closure phases
+        are calculated from the Stokes I image.
         """
 
         ntri = len(bl)
@@ -299,37 +325,32 @@ class radmc3dImage(baseImage):
                'ntri': ntri,
                'nbl': 3,
                'nwav': self.nwav,
-               'wav': self.wav,
-               'u': np.zeros([ntri, 3, self.nwav], dtype=np.float64),
-               'v': np.zeros([ntri, 3, self.nwav], dtype=np.float64),
-               'vis': np.zeros([ntri, 3, self.nwav], dtype=np.complex64),
-               'amp': np.zeros([ntri, 3, self.nwav], dtype=np.float64),
-               'phase': np.zeros([ntri, 3, self.nwav], dtype=np.float64),
-               'cp': np.zeros([ntri, self.nwav], dtype=np.float64)}
-
-        # l = self.x / nc.au / dpc / 3600. / 180. * np.pi
-        # m = self.y / nc.au / dpc / 3600. / 180. * np.pi
-        # dl = l[1] - l[0]
-        # dm = m[1] - m[0]
-
-        for itri in range(ntri):
-            print('Calculating baseline triangle # : ', itri)
-
-            dum = self.getVisibility(bl=res['bl'][itri, :], pa=res['pa'][itri, :], dpc=dpc)
-            res['u'][itri, :, :] = dum['u']
-            res['v'][itri, :, :] = dum['v']
-            res['vis'][itri, :, :] = dum['vis']
-            res['amp'][itri, :, :] = dum['amp']
-            res['phase'][itri, :, :] = dum['phase']
-            res['cp'][itri, :] = (dum['phase'].sum(0) / np.pi * 180.) % 360.
-            ii = res['cp'][itri, :] > 180.
-            if (res['cp'][itri, ii]).shape[0] > 0:
-                res['cp'][itri, ii] = res['cp'][itri, ii] - 360.
+               'wav': self.wav}
+
+        # Transform every distinct baseline once
+        blpa = np.stack([res['bl'].ravel(), res['pa'].ravel()], axis=1)
+        ublpa, inv = np.unique(blpa, axis=0, return_inverse=True)
+        inv = inv.ravel()
+        dum = self.getVisibility(bl=ublpa[:, 0], pa=ublpa[:, 1], dpc=dpc, chunksize=chunksize, nthreads=nthreads)
+
+        res['u'] = dum['u'][inv].reshape(ntri, 3, self.nwav)
+        res['v'] = dum['v'][inv].reshape(ntri, 3, self.nwav)
+        if dum['stokes']:
+            res['vis'] = dum['vis'][inv, 0].reshape(ntri, 3, self.nwav)
+            res['amp'] = dum['amp'][inv, 0].reshape(ntri, 3, self.nwav)
+            res['phase'] = dum['phase'][inv, 0].reshape(ntri, 3, self.nwav)
+        else:
+            res['vis'] = dum['vis'][inv].reshape(ntri, 3, self.nwav)
+            res['amp'] = dum['amp'][inv].reshape(ntri, 3, self.nwav)
+            res['phase'] = dum['phase'][inv].reshape(ntri, 3, self.nwav)
+
+        res['cp'] = (res['phase'].sum(1) / np.pi * 180.) % 360.
+        res['cp'][res['cp'] > 180.] -= 360.
 
         return res
 
     # --------------------------------------------------------------------------------------------------
-    def getVisibility(self, bl=None, pa=None, dpc=None):
+    def getVisibility(self, bl=None, pa=None, dpc=None, chunksize=256, nthreads=1):
         """Calculates visibilities for a given set of projected baselines and position angles
         with Discrete Fourier Transform.
 
@@ -344,6 +365,13 @@ class radmc3dImage(baseImage):
 
         dpc : distance of the source in parsec
 
+        chunksize : int, optional
+              Number of baselines transformed at once. The memory needed by the transform scales with
+              chunksize * (nx + ny).
+
+        nthreads : int, optional
+              Number of threads used to transform the wavelengths / baseline chunks in parallel
+
         Returns
         -------
         Returns a dictionary with the following keys:
@@ -358,6 +386,13 @@ class radmc3dImage(baseImage):
             * phase  : Fourier phase
             * wav    : wavelength 
             * nwav   : number of wavelengths
+
+        Notes
+        -----
+
+        The exponential kernel of the DFT is separable in the two image axes, so for each chunk of baselines
+        the transform is evaluated as two matrix products, exp(-2 pi i u l) x image x exp(-2 pi i v m),
+        instead of summing over the pixels baseline by baseline.
         """
 
         nbl = len(bl)
@@ -366,87 +401,164 @@ class radmc3dImage(baseImage):
                'nbl': nbl,
                'nwav': self.nwav,
                'wav': self.wav,
-               'u': np.zeros([nbl, self.nwav], dtype=np.float64),
-               'v': np.zeros([nbl, self.nwav], dtype=np.float64),
                'stokes':self.stokes}
-        if res['stokes']:
-            res.update({'vis': np.zeros([nbl, 4, self.nwav], dtype=np.complex64),
-                        'amp': np.zeros([nbl, 4, self.nwav], dtype=np.float64),
-                        'phase': np.zeros([nbl, 4, self.nwav], dtype=np.float64)})
-        else:
-            res.update({'vis': np.zeros([nbl, self.nwav], dtype=np.complex64),
-                        'amp': np.zeros([nbl, self.nwav], dtype=np.float64),
-                        'phase': np.zeros([nbl, self.nwav], dtype=np.float64)})
-
-        # res = {}
-        # res['bl'] = np.array(bl, dtype=float)
-        # res['pa'] = np.array(pa, dtype=float)
-        # res['nbl'] = res['bl'].shape[0]
-        #
-        # res['wav'] = np.array(self.wav)
-        # res['nwav'] = self.nwav
-        #
-        # res['u'] = np.zeros([res['nbl'], self.nwav], dtype=float)
-        # res['v'] = np.zeros([res['nbl'], self.nwav], dtype=float)
-        #
-        # res['vis'] = np.zeros([res['nbl'], self.nwav], dtype=np.complex64)
-        # res['amp'] = np.zeros([res['nbl'], self.nwav], dtype=np.float64)
-        # res['phase'] = np.zeros([res['nbl'], self.nwav], dtype=np.float64)
 
         l = self.x / nc.au / dpc / 3600. / 180. * np.pi
         m = self.y / nc.au / dpc / 3600. / 180. * np.pi
         dl = l[1] - l[0]
         dm = m[1] - m[0]
 
+        # Calculate spatial frequencies
+        wav = np.array(self.wav, dtype=np.float64)
+        res['u'] = np.outer(res['bl'] * np.cos(res['pa'] * np.pi / 180.), 1e6 / wav)
+        res['v'] = np.outer(res['bl'] * np.sin(res['pa'] * np.pi / 180.), 1e6 / wav)
+
         if res['stokes']:
-            for istokes in range(4):
-                for iwav in range(res['nwav']):
-    
-                    # Calculate spatial frequencies
-                    res['u'][:, iwav] = res['bl'] * np.cos(res['pa'] * np.pi / 180.) * 1e6 / self.wav[iwav]
-                    res['v'][:, iwav] = res['bl'] * np.sin(res['pa'] * np.pi / 180.) * 1e6 / self.wav[iwav]
-
-                    for ibl in range(res['nbl']):
-                        dum = complex(0.)
-                        imu = complex(0., 1.)
-
-                        for il in range(len(l)):
-                            phase = 2. * np.pi * (res['u'][ibl, iwav] * l[il] + res['v'][ibl, iwav] * m)
-                            cterm = np.cos(phase)
-                            sterm = -np.sin(phase)
-                            dum = dum + (self.image[il, :, istokes, iwav] * (cterm + imu * sterm)).sum() * dl * dm
-
-                        res['vis'][ibl, istokes, iwav] = dum
-                        res['amp'][ibl, istokes, iwav] = np.sqrt(abs(dum * np.conj(dum)))
-                        res['phase'][ibl, istokes, iwav] = np.arccos(np.real(dum) / res['amp'][ibl, istokes, iwav])
-                        if np.imag(dum) < 0.:
-                            res['phase'][ibl, istokes, iwav] = 2. * np.pi - res['phase'][ibl, istokes, iwav]
-
-#                        print('Calculating baseline # : ', ibl, ' stokes # : ', istokes, ' wavelength # : ', iwav)
+            image = self.image
+        else:
+            image = self.image[:, :, np.newaxis, :]
+        nstokes = image.shape[2]
+        vis = np.zeros([nbl, nstokes, self.nwav], dtype=np.complex128)
+
+        def transformChunk(task):
+            iwav, ibl0 = task
+            ibl1 = min(ibl0 + chunksize, nbl)
+            ephx = np.exp(-2j * np.pi * np.outer(l, res['u'][ibl0:ibl1, iwav]))
+            ephy = np.exp(-2j * np.pi * np.outer(m, res['v'][ibl0:ibl1, iwav]))
+            for istokes in range(nstokes):
+                dum = np.dot(image[:, :, istokes, iwav], ephy)
+                vis[ibl0:ibl1, istokes, iwav] = (ephx * dum).sum(0) * dl * dm
+
+        tasks = [(iwav, ibl0) for iwav in range(self.nwav) for ibl0 in range(0, nbl, chunksize)]
+        if nthreads > 1:
+            # The matrix products release the GIL, the chunks write to disjoint parts of vis
+            with ThreadPoolExecutor(max_workers=nthreads) as executor:
+                list(executor.map(transformChunk, tasks))
         else:
-            for iwav in range(res['nwav']):
+            for task in tasks:
+                transformChunk(task)
+
+        if not res['stokes']:
+            vis = vis[:, 0, :]
+
+        res['vis'] = vis.astype(np.complex64)
+        res['amp'] = np.abs(vis)
+        res['phase'] = np.arctan2(vis.imag, vis.real) % (2. * np.pi)
+
+        return res
+
+    # --------------------------------------------------------------------------------------------------
+    def sampleVisibilities(self, u=None, v=None, dpc=None, method='fft', offset=None, eps=1e-6, oversampling=2.,
+                           chunksize=10000):
+        """Calculates visibilities at arbitrary (u,v) points.
+
+        With method='fft' each channel of the image is zero-padded and Fourier transformed once, then the
+        transform is interpolated onto the requested (u,v) points with a Kaiser-Bessel gridding kernel (the image
+        is divided by the Fourier transform of the kernel before the FFT to correct for the interpolation). This
+        scales to millions of (u,v) points per channel. With method='dft' the exact direct Fourier transform is
+        evaluated, which can be used to check the accuracy of the FFT method on a subset of the points.
+
+        Parameters
+        ----------
 
-                # Calculate spatial frequencies
-                res['u'][:, iwav] = res['bl'] * np.cos(res['pa'] * np.pi / 180.) * 1e6 / self.wav[iwav]
-                res['v'][:, iwav] = res['bl'] * np.sin(res['pa'] * np.pi / 180.) * 1e6 / self.wav[iwav]
+        u         : ndarray
+                    Spatial frequencies along the x axis of the image in units of the wavelength. Either a one
+                    dimensional array (same points for all channels) or an array with dimensions [npt, nwav].
 
-                for ibl in range(res['nbl']):
-                    dum = complex(0.)
-                    imu = complex(0., 1.)
+        v         : ndarray
+                    Spatial frequencies along the y axis of the image in units of the wavelength (same shape as u)
 
-                    for il in range(len(l)):
-                        phase = 2. * np.pi * (res['u'][ibl, iwav] * l[il] + res['v'][ibl, iwav] * m)
-                        cterm = np.cos(phase)
-                        sterm = -np.sin(phase)
-                        dum = dum + (self.image[il, :, iwav] * (cterm + imu * sterm)).sum() * dl * dm
+        dpc       : float
+                    Distance of the source in parsec
 
-                    res['vis'][ibl, iwav] = dum
-                    res['amp'][ibl, iwav] = np.sqrt(abs(dum * np.conj(dum)))
-                    res['phase'][ibl, iwav] = np.arccos(np.real(dum) / res['amp'][ibl, iwav])
-                    if np.imag(dum) < 0.:
-                        res['phase'][ibl, iwav] = 2. * np.pi - res['phase'][ibl, iwav]
+        method    : {'fft', 'dft'}
+                    Gridded FFT with kernel interpolation or exact direct Fourier transform
 
-#                    print('Calculating baseline # : ', ibl, ' wavelength # : ', iwav)
+        offset    : tuple, optional
+                    Offset (dx, dy) of the source relative to the phase centre in arcsec along the image x and y axes
+
+        eps       : float
+                    Requested relative accuracy of the FFT method. It sets the support of the gridding kernel.
+
+        oversampling : float
+                    Ratio of the size of the zero-padded image to that of the original image in the FFT method
+
+        chunksize : int
+                    Number of (u,v) points interpolated / transformed at once, to bound the memory usage
+
+        Returns
+        -------
+        Returns a dictionary with the following keys:
+
+            * u      : spatial frequency along the x axis of the image [npt, nwav]
+            * v      : spatial frequency along the y axis of the image [npt, nwav]
+            * npt    : number of (u,v) points
+            * vis    : complex visibility at points (u,v) ([npt, nwav] or [npt, 4, nwav] for Stokes images)
+            * amp    : correlation amplitude
+            * phase  : Fourier phase
+            * wav    : wavelength
+            * nwav   : number of wavelengths
+        """
+
+        if method not in ['fft', 'dft']:
+            raise ValueError('Unknown method ' + str(method) + '. Supported methods are fft and dft.')
+
+        u = np.asarray(u, dtype=np.float64)
+        v = np.asarray(v, dtype=np.float64)
+        if u.shape != v.shape:
+            raise ValueError('u and v should have the same shape.')
+        if u.ndim == 1:
+            u = np.repeat(u[:, np.newaxis], self.nwav, axis=1)
+            v = np.repeat(v[:, np.newaxis], self.nwav, axis=1)
+        if u.shape[1] != self.nwav:
+            raise ValueError('The second dimension of u and v should be equal to the number of wavelengths '
+                             + 'in the image.')
+        npt = u.shape[0]
+
+        res = {'u': u,
+               'v': v,
+               'npt': npt,
+               'nwav': self.nwav,
+               'wav': self.wav,
+               'stokes': self.stokes}
+
+        l = self.x / nc.au / dpc / 3600. / 180. * np.pi
+        m = self.y / nc.au / dpc / 3600. / 180. * np.pi
+
+        if res['stokes']:
+            image = self.image
+        else:
+            image = self.image[:, :, np.newaxis, :]
+        nstokes = image.shape[2]
+        vis = np.zeros([npt, nstokes, self.nwav], dtype=np.complex128)
+
+        if method == 'fft':
+            support, beta = _getKBParams(eps=eps, oversampling=oversampling)
+            for iwav in range(self.nwav):
+                for istokes in range(nstokes):
+                    uvgrid = _getUVGrid(image[:, :, istokes, iwav], support=support, beta=beta,
+                                        oversampling=oversampling)
+                    vis[:, istokes, iwav] = _interpolateUVGrid(uvgrid, l, m, u[:, iwav], v[:, iwav],
+                                                               support=support, beta=beta, chunksize=chunksize)
+        else:
+            # The direct transform needs chunksize * (nx + ny) complex numbers
+            chunksize = max(1, min(chunksize, 2**22 // (l.shape[0] + m.shape[0])))
+            for iwav in range(self.nwav):
+                for istokes in range(nstokes):
+                    vis[:, istokes, iwav] = _directVisibility(image[:, :, istokes, iwav], l, m, u[:, iwav],
+                                                              v[:, iwav], chunksize=chunksize)
+
+        if offset is not None:
+            dl = offset[0] / 3600. / 180. * np.pi
+            dm = offset[1] / 3600. / 180. * np.pi
+            vis *= np.exp(-2j * np.pi * (u * dl + v * dm))[:, np.newaxis, :]
+
+        if not res['stokes']:
+            vis = vis[:, 0, :]
+
+        res['vis'] = vis
+        res['amp'] = np.abs(vis)
+        res['phase'] = np.arctan2(vis.imag, vis.real) % (2. * np.pi)
 
         return res
 
@@ -916,7 +1028,7 @@ class radmc3dImage(baseImage):
 
         return dum.sum(2)
 
-    def readImage(self, fname=None, binary=False, old=False):
+    def readImage(self, fname=None, binary=False, old=False, mmap=False):
         """Reads a rectangular image calculated by RADMC-3D 
 
         Parameters
@@ -931,6 +1043,10 @@ class radmc3dImage(baseImage):
         binary  : bool, optional
                  False - the image format is formatted ASCII if True - C-compliant binary (omitted if old=True)
 
+        mmap    : bool, optional
+                 If True the pixel values of a binary image are memory-mapped instead of being read into memory.
+                 The image is then a read-only view of the file and channels are only read when accessed.
+
         """
         if old:
             if fname is None:
@@ -957,10 +1073,10 @@ class radmc3dImage(baseImage):
                 self.stokes = False
                 self.image = np.zeros([self.nx, self.ny, self.nwav], dtype=np.float64)
                 for iwav in range(self.nwav):
+                    # Separator line, then one pixel value per line with x being the fastest varying index
                     dum = rfile.readline()
-                    for iy in range(self.nx):
-                        for ix in range(self.ny):
-                            self.image[ix, iy, iwav] = float(rfile.readline())
+                    data = textio.readLines(rfile, self.nx * self.ny)
+                    self.image[:, :, iwav] = np.reshape(data, [self.nx, self.ny], order='F')
 
         else:
             if binary:
@@ -968,29 +1084,39 @@ class radmc3dImage(baseImage):
                     fname = 'image.bout'
 
                 self.filename = fname
+                print('Reading '+ fname)
 
-                dum = np.fromfile(fname, count=4, dtype=int)
-                iformat = dum[0]
-                self.nx = dum[1]
-                self.ny = dum[2]
-                self.nfreq = dum[3]
-                self.nwav = self.nfreq
-                dum = np.fromfile(fname, count=-1, dtype=np.float64)
+                with open(fname, 'rb') as rfile:
+                    hdr = np.fromfile(rfile, count=4, dtype=np.int64)
+                    iformat = hdr[0]
+                    self.nx = int(hdr[1])
+                    self.ny = int(hdr[2])
+                    self.nfreq = int(hdr[3])
+                    self.nwav = self.nfreq
 
-                self.sizepix_x = dum[4]
-                self.sizepix_y = dum[5]
-                self.wav = dum[6:6 + self.nfreq]
-                self.freq = nc.cc / self.wav * 1e4
+                    dum = np.fromfile(rfile, count=2 + self.nfreq, dtype=np.float64)
+                    self.sizepix_x = dum[0]
+                    self.sizepix_y = dum[1]
+                    self.wav = dum[2:]
+                    self.freq = nc.cc / self.wav * 1e4
 
-                if iformat == 1:
-                    self.stokes = False
-                    self.image = np.reshape(dum[6 + self.nfreq:], [self.nfreq, self.ny, self.nx])
-                    self.image = np.swapaxes(self.image, 0, 2)
-                elif iformat == 3:
-                    self.stokes = True
-                    self.image = np.reshape(dum[6 + self.nfreq:], [self.nfreq, 4, self.ny, self.nx])
-                    self.image = np.swapaxes(self.image, 0, 3)
-                    self.image = np.swapaxes(self.image, 1, 2)
+                    if iformat == 1:
+                        self.stokes = False
+                        shape = (self.nfreq, self.ny, self.nx)
+                    elif iformat == 3:
+                        self.stokes = True
+                        shape = (self.nfreq, 4, self.ny, self.nx)
+                    else:
+                        raise ValueError('Unknown image format ' + ("%d" % iformat) + ' in ' + fname)
+
+                    if mmap:
+                        data = np.memmap(fname, dtype=np.float64, mode='r', offset=rfile.tell(), shape=shape)
+                    else:
+                        data = np.fromfile(rfile, count=int(np.prod(shape)), dtype=np.float64).reshape(shape)
+
+                # The pixel values are stored with x being the fastest varying index, so the transposed view
+                # has the [nx, ny, (4,) nwav] layout, with every channel being a contiguous block of the file
+                self.image = data.T
 
             else:
 
@@ -1026,39 +1152,23 @@ class radmc3dImage(baseImage):
                     self.sizepix_x = float(dum[0])
                     self.sizepix_y = float(dum[1])
                     # Wavelength of the image
-                    self.wav = np.zeros(self.nwav, dtype=np.float64)
-                    for iwav in range(self.nwav):
-                        self.wav[iwav] = float(rfile.readline())
-                    self.wav = np.array(self.wav)
+                    self.wav = textio.readLines(rfile, self.nwav)
                     self.freq = nc.cc / self.wav * 1e4
 
+                    # The pixel values are stored with x being the fastest varying index (the blank lines
+                    # separating the frequencies are ignored by the parser)
                     # If we have a normal total intensity image
                     if iformat == 1:
                         self.stokes = False
-
-                        self.image = np.zeros([self.nx, self.ny, self.nwav], dtype=np.float64)
-                        for iwav in range(self.nwav):
-                            # Blank line
-                            dum = rfile.readline()
-                            for iy in range(self.nx):
-                                for ix in range(self.ny):
-                                    self.image[ix, iy, iwav] = float(rfile.readline())
+                        data = textio.readNumbers(rfile, count=self.nx * self.ny * self.nwav)
+                        self.image = np.reshape(data, [self.nx, self.ny, self.nwav], order='F')
 
                     # If we have the full stokes image
                     elif iformat == 3:
                         self.stokes = True
-                        self.image = np.zeros([self.nx, self.ny, 4, self.nwav], dtype=np.float64)
-                        for iwav in range(self.nwav):
-                            # Blank line
-                            dum = rfile.readline()
-                            for iy in range(self.nx):
-                                for ix in range(self.ny):
-                                    dum = rfile.readline().split()
-                                    imstokes = [float(i) for i in dum]
-                                    self.image[ix, iy, 0, iwav] = float(dum[0])
-                                    self.image[ix, iy, 1, iwav] = float(dum[1])
-                                    self.image[ix, iy, 2, iwav] = float(dum[2])
-                                    self.image[ix, iy, 3, iwav] = float(dum[3])
+                        data = textio.readNumbers(rfile, count=4 * self.nx * self.ny * self.nwav)
+                        data = np.reshape(data, [4, self.nx, self.ny, self.nwav], order='F')
+                        self.image = np.moveaxis(data, 0, 2)
 
         self.x = ((np.arange(self.nx, dtype=np.float64) + 0.5) - self.nx / 2) * self.sizepix_x
         self.y = ((np.arange(self.ny, dtype=np.float64) + 0.5) - self.ny / 2) * self.sizepix_y
@@ -1226,37 +1336,21 @@ class radmc3dImage(baseImage):
                     self.sizepix_x = float(dum[0])
                     self.sizepix_y = float(dum[1])
                     # Wavelength of the image
-                    self.wav = np.zeros(self.nwav, dtype=np.float64)
-                    for iwav in range(self.nwav):
-                        self.wav[iwav] = float(rfile.readline())
-                    self.wav = np.array(self.wav)
+                    self.wav = textio.readLines(rfile, self.nwav)
                     self.freq = nc.cc / self.wav * 1e4
 
+                    # The pixel values are stored with x being the fastest varying index (the blank lines
+                    # separating the frequencies are ignored by the parser)
                     # If we have a normal total intensity image
                     if iformat == 1:
-
-                        self.tausurf = np.zeros([self.nx, self.ny, self.nwav], dtype=np.float64)
-                        for iwav in range(self.nwav):
-                            # Blank line
-                            dum = rfile.readline()
-                            for iy in range(self.ny):
-                                for ix in range(self.nx):
-                                    self.tausurf[ix, iy, iwav] = float(rfile.readline())
+                        data = textio.readNumbers(rfile, count=self.nx * self.ny * self.nwav)
+                        self.tausurf = np.reshape(data, [self.nx, self.ny, self.nwav], order='F')
 
                     # If we have the full stokes image
                     elif iformat == 3:
-                        self.tausurf = np.zeros([self.nx, self.ny, 4, self.nwav], dtype=np.float64)
-                        for iwav in range(self.nwav):
-                            # Blank line
-                            dum = rfile.readline()
-                            for iy in range(self.ny):
-                                for ix in range(self.nx):
-                                    dum = rfile.readline().split()
-                                    imstokes = [float(i) for i in dum]
-                                    self.tausurf[ix, iy, 0, iwav] = float(dum[0])
-                                    self.tausurf[ix, iy, 1, iwav] = float(dum[1])
-                                    self.tausurf[ix, iy, 2, iwav] = float(dum[2])
-                                    self.tausurf[ix, iy, 3, iwav] = float(dum[3])
+                        data = textio.readNumbers(rfile, count=4 * self.nx * self.ny * self.nwav)
+                        data = np.reshape(data, [4, self.nx, self.ny, self.nwav], order='F')
+                        self.tausurf = np.moveaxis(data, 0, 2)
 
         # x and y axis
         self.x = ((np.arange(self.nx, dtype=np.float64) + 0.5) - self.nx / 2) * self.sizepix_x
@@ -1307,19 +1401,12 @@ class radmc3dImage(baseImage):
                 # number of wavelengths
                 nwav = int(rfile.readline())
                 self.nwav = nwav
-                self.wav = np.zeros([self.nwav], dtype=np.float64)
-
-                self.image = np.zeros([1, 1, self.nwav], dtype=np.float64)
 
-                # Blank line
-                dum = rfile.readline()
-
-                for iwav in range(self.nwav):
-                    # actual data
-                    dum = rfile.readline()
-                    dum = dum.split()        
-                    self.wav[iwav] = float(dum[0])
-                    self.image[0, 0, iwav] = float(dum[1])
+                # actual data, one wavelength and flux pair per line
+                data = textio.readNumbers(rfile, count=2 * self.nwav)
+                data = np.reshape(data, [self.nwav, 2])
+                self.wav = data[:, 0]
+                self.image = np.reshape(data[:, 1], [1, 1, self.nwav])
 
                 # calculate frequency
                 self.nfreq = nwav
@@ -1346,7 +1433,7 @@ class radmc3dImage(baseImage):
                 self.imageJyppix = self.image * nc.jy
 
 
-    def imConv(self, dpc=1., psfType='gauss', fwhm=None, pa=None, tdiam_prim=8.2, tdiam_sec=0.94):
+    def imConv(self, dpc=1., psfType='gauss', fwhm=None, pa=None, tdiam_prim=8.2, tdiam_sec=0.94, nthreads=1):
         """Convolves a RADMC-3D image with a two dimensional Gaussian psf. The output images will have the same
         brightness units as the input images.
 
@@ -1378,10 +1465,19 @@ class radmc3dImage(baseImage):
                       secondary mirror/obscuration is present, this parameter should be set to zero. 
                       (should only be set if psfType='airy')
 
+        nthreads    : int, optional
+                      Number of threads used by the FFTs (requires scipy.fft)
+
         Returns
         -------
 
         Returns a radmc3dImage 
+
+        Notes
+        -----
+
+        The PSFs are kept in a cache (see clearPSFCache()) and the channels sharing the same PSF are convolved
+        together with real FFTs of the stacked cube.
         """
 
         dx = self.sizepix_x / nc.au / dpc # in arcseconds
@@ -1403,114 +1499,41 @@ class radmc3dImage(baseImage):
             raise ValueError('number of elements for pa must be 1 or equal to nfreq')
 
         if self.stokes:
-            if self.nfreq == 1:
-                # Generate the  psf
-                dum = getPSF(nx=self.nx, ny=self.ny, pscale=[dx, dy], psfType=psfType, fwhm=fwhm[0], pa=pa[0],
-                             tdiam_prim=tdiam_prim, tdiam_sec=tdiam_sec, wav=self.wav[0])
-                psf = dum['psf']
-                f_psf = np.fft.fft2(psf)
-
-                cimage = np.zeros([self.nx, self.ny, 4, 1], dtype=np.float64)
-                for istokes in range(4):
-                    imag = self.image[:, :, istokes, 0]
-#                    f_imag = np.fft.fft2(imag)
-#                    f_cimag = f_psf * f_imag
-#                    cimage[:, :, istokes, 0] = np.abs(np.fft.ifftshift(np.fft.ifft2(f_cimag)))
-#                    cimage[:, :, istokes, 0] = np.real(np.fft.ifftshift(np.fft.ifft2(f_cimag)))
-
-                    cimage[:,:,istokes,0] = getConvolve(imag, psf)
-            else:
-                # If we have a simple Gaussian PSF it will be wavelength independent so we can take it out from the
-                # frequency loop
-                if psfType.lower().strip() == 'gauss':
-                    cimage = np.zeros([self.nx, self.ny, 4, self.nfreq], dtype=np.float64)
-                    # Generate the gaussian psf
-                    for ifreq in range(nfreq):
-                        if nfwhm == 1:
-                            ifwhm = 0
-                        else:
-                            ifwhm = ifreq
-                        if npa == 1:
-                            ipa = 0
-                        else:
-                            ipa = ifreq
-
-                        dum = getPSF(nx=self.nx, ny=self.ny, pscale=[dx, dy], psfType=psfType, fwhm=fwhm[ifwhm], 
-                                 pa=pa[ipa],tdiam_prim=tdiam_prim, tdiam_sec=tdiam_sec, wav=self.wav[ifreq])
-                        psf = dum['psf']
-                        f_psf = np.fft.fft2(psf)
-
-                        for istokes in range(4):
-                            imag = self.image[:, :, istokes, ifreq]
-
-                            cimage[:,:,istokes,ifreq] = getConvolve(imag, psf)
-
-                # If we have an Airy-PSF calculated from the aperture size(s) and wavelenght, the PSF will depend
-                # on the frequency so it has to be re-calculated for each wavelength
-                elif psfType.lower().strip() == 'airy':
-                    cimage = np.zeros([self.nx, self.ny, 4, self.nfreq], dtype=np.float64)
-                    for ifreq in range(nfreq):
-                        if nfwhm == 1:
-                            ifwhm = 0
-                        else:
-                            ifwhm = ifreq
-                        if npa == 1:
-                            ipa = 0
-                        else:
-                            ipa = ifreq
-
-                        # Generate the wavelength-dependent airy-psf
-                        dum = getPSF(nx=self.nx, ny=self.ny, pscale=[dx, dy], psfType=psfType, fwhm=fwhm[ifwhm], 
-                                     pa=pa[ipa], tdiam_prim=tdiam_prim, tdiam_sec=tdiam_sec, wav=self.wav[ifreq])
-                        psf = dum['psf']
-                        f_psf = np.fft.fft2(psf)
-
-                        for istokes in range(4):
-                            imag = self.image[:, :, istokes, ifreq]
-                            cimage[:,:,istokes,ifreq] = getConvolve(imag, psf)
-
+            image = self.image
         else:
-            # If we have a simple Gaussian PSF it will be wavelength independent so we can take it out from the
-            # frequency loop
-            if psfType.lower().strip() == 'gauss':
-                cimage = np.zeros([self.nx, self.ny, self.nfreq], dtype=np.float64)
-                for ifreq in range(nfreq):
-                    if nfwhm == 1:
-                        ifwhm = 0
-                    else:
-                        ifwhm = ifreq
-                    if npa == 1:
-                        ipa = 0
-                    else:
-                        ipa = ifreq
-
-                    dum = getPSF(nx=self.nx, ny=self.ny, pscale=[dx, dy], psfType=psfType, fwhm=fwhm[ifwhm],
-                            pa=pa[ipa],tdiam_prim=tdiam_prim, tdiam_sec=tdiam_sec, wav=self.wav[ifreq])
-
-                    psf = dum['psf']
-
-                    cimage[:,:,ifreq] = getConvolve(self.image[:,:,ifreq], psf)
-
-            # If we have an Airy-PSF calculated from the aperture size(s) and wavelenght, the PSF will depend
-            # on the frequency so it has to be re-calculated for each wavelength
-            elif psfType.lower().strip() == 'airy':
-                cimage = np.zeros([self.nx, self.ny, self.nfreq], dtype=np.float64)
-                for ifreq in range(nfreq):
-                    # Generate the wavelength-dependent airy-psf
-                    if nfwhm == 1:
-                        ifwhm = 0
-                    else:
-                        ifwhm = ifreq
-                    if npa == 1:
-                        ipa = 0
-                    else:
-                        ipa = ifreq
+            image = self.image[:, :, np.newaxis, :]
+        cimage = np.zeros(image.shape, dtype=np.float64)
 
-                    dum = getPSF(nx=self.nx, ny=self.ny, pscale=[dx, dy], psfType=psfType, fwhm=fwhm[ifwhm], 
-                            pa=pa[ipa], tdiam_prim=tdiam_prim, tdiam_sec=tdiam_sec, wav=self.wav[ifreq])
-                    psf = dum['psf']
+        # Group the channels by their PSF, so that every distinct PSF is calculated and transformed only once
+        # (a Gaussian PSF does not depend on the wavelength, an Airy PSF does)
+        if nfwhm == 1:
+            cfwhm = [fwhm[0]] * nfreq
+        else:
+            cfwhm = list(fwhm)
+        if npa == 1:
+            cpa = [pa[0]] * nfreq
+        else:
+            cpa = list(pa)
+
+        keys, psfs = _getCachedPSFs(nx=self.nx, ny=self.ny, pscale=[dx, dy], psfType=psfType, fwhm=cfwhm, pa=cpa,
+                                    tdiam_prim=tdiam_prim, tdiam_sec=tdiam_sec, wav=self.wav)
+        beams = {}
+        for ifreq in range(nfreq):
+            if keys[ifreq] not in beams:
+                beams[keys[ifreq]] = (psfs[ifreq], [])
+            beams[keys[ifreq]][1].append(ifreq)
+        psf = psfs[-1]
+
+        # Convolve all Stokes planes and channels sharing a PSF in one batch
+        for bpsf, ifreqs in beams.values():
+            if ifreqs == list(range(ifreqs[0], ifreqs[-1] + 1)):
+                sl = slice(ifreqs[0], ifreqs[-1] + 1)
+                _convolveStack(image[:, :, :, sl], bpsf, out=cimage[:, :, :, sl], nthreads=nthreads)
+            else:
+                cimage[:, :, :, ifreqs] = _convolveStack(image[:, :, :, ifreqs], bpsf, nthreads=nthreads)
 
-                    cimage[:,:,ifreq] = getConvolve(self.image[:,:,ifreq], psf)
+        if not self.stokes:
+            cimage = cimage[:, :, 0, :]
 
         # cimage = squeeze(cimage)
 
@@ -1561,8 +1584,336 @@ class radmc3dImage(baseImage):
 
         self.totflux = totflux
 
+def _getKBParams(eps=1e-6, oversampling=2.):
+    """Returns the support (in grid cells) and the shape parameter of the Kaiser-Bessel gridding kernel
+    for a given relative accuracy and oversampling factor (Beatty et al. 2005).
+    """
+
+    if oversampling < 1.25:
+        raise ValueError('The oversampling factor should be at least 1.25.')
+
+    support = int(np.clip(np.ceil(-np.log10(eps) / (1. - 1. / oversampling)**0.5 * 0.75) + 1, 3, 16))
+    beta = np.pi * np.sqrt((support / oversampling)**2 * (oversampling - 0.5)**2 - 0.8)
+
+    return support, beta
+
+
+def _kbKernel(x, support, beta):
+    """Kaiser-Bessel kernel, x is the distance from the kernel centre in grid cells.
+    """
+
+    arg = 1. - (2. * x / support)**2
+    # scipy's Bessel function is much faster than the numpy implementation
+    i0 = spc.i0 if spc else np.i0
+    return np.where(arg > 0., i0(beta * np.sqrt(np.clip(arg, 0., None))), 0.)
+
+
+def _kbCorrection(t, support, beta):
+    """Fourier transform of the Kaiser-Bessel kernel, t is the image coordinate in units of the padded image size.
+    """
+
+    z = beta**2 - (np.pi * support * t)**2
+    sz = np.sqrt(np.abs(z))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = np.where(z > 0., np.sinh(sz) / sz, np.sinc(sz / np.pi))
+    return support * corr
+
+
+def _getUVGrid(img=None, support=6, beta=None, oversampling=2.):
+    """Calculates the gridding-corrected, zero-padded FFT of an image (see radmc3dImage.sampleVisibilities()).
+
+    Parameters
+    ----------
+
+    img          : ndarray
+                   Two dimensional image [nx, ny]
+
+    support      : int
+                   Support of the gridding kernel in grid cells
+
+    beta         : float
+                   Shape parameter of the gridding kernel
+
+    oversampling : float
+                   Ratio of the size of the zero-padded image to that of the original image
+
+    Returns
+    -------
+    The complex uv-grid [npadx, npady]
+    """
+
+    nx, ny = img.shape
+    npadx = 2 * int(np.ceil(0.5 * oversampling * nx))
+    npady = 2 * int(np.ceil(0.5 * oversampling * ny))
+
+    # Correct for the interpolation with the kernel in the uv-plane
+    corrx = _kbCorrection((np.arange(nx) - 0.5 * (nx - 1)) / npadx, support, beta)
+    corry = _kbCorrection((np.arange(ny) - 0.5 * (ny - 1)) / npady, support, beta)
+
+    padded = np.zeros([npadx, npady], dtype=np.float64)
+    padded[:nx, :ny] = img / np.outer(corrx, corry)
+
+    return np.fft.fft2(padded)
+
+
+def _interpolateUVGrid(uvgrid=None, l=None, m=None, u=None, v=None, support=6, beta=None, chunksize=10000):
+    """Interpolates a uv-grid calculated by _getUVGrid() onto arbitrary (u,v) points.
+
+    Parameters
+    ----------
+
+    uvgrid    : ndarray
+                Complex uv-grid
+
+    l         : ndarray
+                Image x coordinates in radian
+
+    m         : ndarray
+                Image y coordinates in radian
+
+    u         : ndarray
+                Spatial frequencies along the x axis of the image in units of the wavelength
+
+    v         : ndarray
+                Spatial frequencies along the y axis of the image in units of the wavelength
+
+    support   : int
+                Support of the gridding kernel in grid cells
+
+    beta      : float
+                Shape parameter of the gridding kernel
+
+    chunksize : int
+                Number of (u,v) points interpolated at once
+
+    Returns
+    -------
+    The complex visibilities at (u,v)
+    """
+
+    nx = l.shape[0]
+    ny = m.shape[0]
+    npadx, npady = uvgrid.shape
+    dl = l[1] - l[0]
+    dm = m[1] - m[0]
+    # The grid is calculated for coordinates relative to the image centre
+    cl = 0.5 * (l[0] + l[-1])
+    cm = 0.5 * (m[0] + m[-1])
+    cx = 0.5 * (nx - 1)
+    cy = 0.5 * (ny - 1)
+    kern = np.arange(support)
+
+    vis = np.zeros(u.shape[0], dtype=np.complex128)
+    for i0 in range(0, u.shape[0], chunksize):
+        i1 = min(i0 + chunksize, u.shape[0])
+
+        # Position of the points in uv-grid cells and the grid cells within the kernel support
+        x = u[i0:i1] * npadx * dl
+        y = v[i0:i1] * npady * dm
+        kx0 = np.ceil(x - 0.5 * support).astype(np.int64)[:, np.newaxis]
+        ky0 = np.ceil(y - 0.5 * support).astype(np.int64)[:, np.newaxis]
+        kx = kx0 + kern
+        ky = ky0 + kern
+
+        # Kernel weights, including the phase term of the image centre offset within the padded image
+        wx = _kbKernel(x[:, np.newaxis] - kx, support, beta) * np.exp(2j * np.pi * kx0 * cx / npadx) \
+            * np.exp(2j * np.pi * kern * cx / npadx)
+        wy = _kbKernel(y[:, np.newaxis] - ky, support, beta) * np.exp(2j * np.pi * ky0 * cy / npady) \
+            * np.exp(2j * np.pi * kern * cy / npady)
+
+        # Sum over the kernel support with one gather per kernel cell (no [npt, support, support] temporaries)
+        indx = (kx % npadx) * npady
+        indy = ky % npady
+        dum = np.zeros(i1 - i0, dtype=np.complex128)
+        for i in range(support):
+            for j in range(support):
+                dum += wx[:, i] * wy[:, j] * uvgrid.take(indx[:, i] + indy[:, j])
+        vis[i0:i1] = dum * np.exp(-2j * np.pi * (u[i0:i1] * cl + v[i0:i1] * cm))
+
+    return vis * dl * dm
+
+
+def _directVisibility(img=None, l=None, m=None, u=None, v=None, chunksize=1000):
+    """Calculates the exact direct Fourier transform of an image at arbitrary (u,v) points.
+
+    Parameters
+    ----------
+
+    img       : ndarray
+                Two dimensional image [nx, ny]
+
+    l         : ndarray
+                Image x coordinates in radian
+
+    m         : ndarray
+                Image y coordinates in radian
+
+    u         : ndarray
+                Spatial frequencies along the x axis of the image in units of the wavelength
+
+    v         : ndarray
+                Spatial frequencies along the y axis of the image in units of the wavelength
+
+    chunksize : int
+                Number of (u,v) points transformed at once
+
+    Returns
+    -------
+    The complex visibilities at (u,v)
+    """
+
+    dl = l[1] - l[0]
+    dm = m[1] - m[0]
+
+    vis = np.zeros(u.shape[0], dtype=np.complex128)
+    for i0 in range(0, u.shape[0], chunksize):
+        i1 = min(i0 + chunksize, u.shape[0])
+        ephx = np.exp(-2j * np.pi * np.outer(u[i0:i1], l))
+        ephy = np.exp(-2j * np.pi * np.outer(v[i0:i1], m))
+        vis[i0:i1] = (np.dot(ephx, img) * ephy).sum(1)
+
+    return vis * dl * dm
+
+
+def _getCachedPSFs(nx=None, ny=None, pscale=None, psfType='gauss', fwhm=None, pa=None, tdiam_prim=8.2,
+                   tdiam_sec=0.94, wav=None):
+    """Returns the PSFs of a set of channels calculated by getPSF() from the PSF cache. The PSFs not found in the
+    cache are calculated (the Airy PSFs of all missing wavelengths in one call) and added to the cache.
+
+    Parameters
+    ----------
+
+    fwhm  : list
+            FWHM of the PSF of each channel
+
+    pa    : list
+            Position angle of the PSF of each channel
+
+    wav   : ndarray
+            Wavelength of each channel
+
+    The rest of the parameters are the same as for getPSF()
+
+    Returns
+    -------
+    A tuple of the list of cache keys and the list of two dimensional psfs of the channels
+    """
+
+    airy = psfType.strip().lower() == 'airy'
+    keys = []
+    for ichan in range(len(wav)):
+        if airy:
+            keys.append((nx, ny, float(pscale[0]), float(pscale[1]), 'airy', float(tdiam_prim), float(tdiam_sec),
+                         float(wav[ichan])))
+        else:
+            keys.append((nx, ny, float(pscale[0]), float(pscale[1]), psfType.strip().lower(),
+                         tuple(np.ravel(fwhm[ichan]).tolist()), float(pa[ichan])))
+
+    psfs = {}
+    missing = []
+    for ichan, key in enumerate(keys):
+        if key in psfs:
+            continue
+        if key in _psfCache:
+            _psfCache.move_to_end(key)
+            psfs[key] = _psfCache[key]
+        else:
+            # Placeholder until the missing PSFs are calculated
+            psfs[key] = None
+            missing.append(ichan)
+
+    if len(missing) > 0:
+        if airy:
+            dum = getPSF(nx=nx, ny=ny, pscale=pscale, psfType=psfType, tdiam_prim=tdiam_prim, tdiam_sec=tdiam_sec,
+                         wav=np.array([wav[i] for i in missing]))['psf']
+            for j, ichan in enumerate(missing):
+                psfs[keys[ichan]] = np.ascontiguousarray(dum[:, :, j])
+        else:
+            for ichan in missing:
+                psfs[keys[ichan]] = getPSF(nx=nx, ny=ny, pscale=pscale, psfType=psfType, fwhm=fwhm[ichan],
+                                           pa=pa[ichan], tdiam_prim=tdiam_prim, tdiam_sec=tdiam_sec,
+                                           wav=wav[ichan])['psf']
+
+        for ichan in missing:
+            _psfCache[keys[ichan]] = psfs[keys[ichan]]
+        while len(_psfCache) > psfCacheSize:
+            _psfCache.popitem(last=False)
+
+    return keys, [psfs[key] for key in keys]
+
+
+def clearPSFCache():
+    """Removes all PSFs from the cache used by radmc3dImage.imConv().
+    """
+    _psfCache.clear()
+
+
+def _convolveStack(imag=None, psf=None, out=None, nthreads=1, chunksize=8):
+    """Convolves a stack of images with the same PSF using real FFTs.
+
+    The result is the same as that of scipy.signal.fftconvolve(mode='same') applied to every image.
+
+    Parameters
+    ----------
+
+    imag      : ndarray
+                Images to be convolved, the first two dimensions being the image axes
+
+    psf       : ndarray
+                Two dimensional psf
+
+    out       : ndarray, optional
+                Array with the same shape as imag into which the convolved images are written
+
+    nthreads  : int
+                Number of threads used by the FFTs (requires scipy.fft)
+
+    chunksize : int
+                Number of images transformed at once
+
+    Returns
+    -------
+    The convolved images with the same shape as imag
+    """
+
+    nx, ny = imag.shape[:2]
+    if out is None:
+        out = np.zeros(imag.shape, dtype=np.float64)
+
+    # Zero padding to the size of the full linear convolution
+    fshape = [nx + psf.shape[0] - 1, ny + psf.shape[1] - 1]
+    if spfft is not None:
+        fshape = [spfft.next_fast_len(n, real=True) for n in fshape]
+        rfft2 = partial(spfft.rfft2, s=fshape, workers=nthreads)
+        irfft2 = partial(spfft.irfft2, s=fshape, workers=nthreads)
+    else:
+        rfft2 = partial(np.fft.rfft2, s=fshape)
+        irfft2 = partial(np.fft.irfft2, s=fshape)
+
+    f_psf = rfft2(psf)
+    ix0 = (psf.shape[0] - 1) // 2
+    iy0 = (psf.shape[1] - 1) // 2
+
+    # Chunks along the last axis, the planes of a chunk are copied into contiguous blocks for the FFTs
+    nlast = imag.shape[-1] if imag.ndim > 2 else 1
+    nplane = int(np.prod(imag.shape[2:-1])) if imag.ndim > 3 else 1
+    step = max(1, chunksize // nplane)
+    for i0 in range(0, nlast, step):
+        i1 = min(i0 + step, nlast)
+        block = imag[..., i0:i1] if imag.ndim > 2 else imag[:, :, np.newaxis]
+        planes = np.moveaxis(block.reshape(nx, ny, -1), 2, 0)
+        conved = irfft2(rfft2(planes) * f_psf)[:, ix0:ix0 + nx, iy0:iy0 + ny]
+        conved = np.moveaxis(conved, 0, 2).reshape(block.shape)
+        if imag.ndim > 2:
+            out[..., i0:i1] = conved
+        else:
+            out[:, :] = conved[:, :, 0]
+
+    return out
+
+
 def getPSF(nx=None, ny=None, psfType='gauss', pscale=None, fwhm=None, pa=None, tdiam_prim=8.2, tdiam_sec=0.94,
-           wav=None):
+           wav=None, exact=False):
     """Calculates a two dimensional Gaussian PSF.
 
     Parameters
@@ -1595,8 +1946,15 @@ def getPSF(nx=None, ny=None, psfType='gauss', pscale=None, fwhm=None, pa=None, t
                   mirror/obscuration is present, this parameter should be set to zero. 
                   (should be set only if psfType='airy')
 
-    wav         : float, optional
-                  Wavelength of observation in micrometer (should be set only if psfType='airy')
+    wav         : float or ndarray, optional
+                  Wavelength of observation in micrometer (should be set only if psfType='airy'). If an array
+                  is given, the Airy PSFs of all wavelengths are calculated at once.
+
+    exact       : bool, optional
+                  If False (default) the radial profile of the Airy PSF, which depends only on
+                  pi * tdiam_prim * r / wav, is calculated on a one dimensional table (with a step of
+                  airyTableStep) and interpolated onto the image grid for all wavelengths. If True the Bessel
+                  functions are evaluated in every pixel.
 
 
     Returns
@@ -1605,7 +1963,7 @@ def getPSF(nx=None, ny=None, psfType='gauss', pscale=None, fwhm=None, pa=None, t
     Returns a dictionary with the following keys:
 
         * psf : ndarray
-                The two dimensional psf
+                The two dimensional psf ([nx, ny, nwav] if psfType='airy' and wav is an array)
         * x   : ndarray
                 The x-axis of the psf 
         * y   : ndarray
@@ -1636,20 +1994,10 @@ def getPSF(nx=None, ny=None, psfType='gauss', pscale=None, fwhm=None, pa=None, t
         sin_pa = np.sin(pa / 180. * np.pi - np.pi / 2.)
         cos_pa = np.cos(pa / 180. * np.pi - np.pi / 2.)
 
-        # Define the psf
-        psf = np.zeros([nx, ny], dtype=np.float64)
-        cos_pa_x = cos_pa * x
-        cos_pa_y = cos_pa * y
-        sin_pa_x = sin_pa * x
-        sin_pa_y = sin_pa * y
-        for ix in range(nx):
-            for iy in range(ny):
-                # xx = cos_pa * x[ix] - sin_pa * y[iy]
-                # yy = sin_pa * x[ix] + cos_pa * y[iy]
-                xx = cos_pa_x[ix] - sin_pa_y[iy]
-                yy = sin_pa_x[ix] + cos_pa_y[iy]
-
-                psf[ix, iy] = np.exp(-0.5 * xx * xx / sigmax / sigmax - 0.5 * yy * yy / sigmay / sigmay)
+        # Define the psf on the rotated coordinates
+        xx = cos_pa * x[:, np.newaxis] - sin_pa * y[np.newaxis, :]
+        yy = sin_pa * x[:, np.newaxis] + cos_pa * y[np.newaxis, :]
+        psf = np.exp(-0.5 * xx * xx / sigmax / sigmax - 0.5 * yy * yy / sigmay / sigmay)
 
         psf /= norm
 
@@ -1660,37 +2008,50 @@ def getPSF(nx=None, ny=None, psfType='gauss', pscale=None, fwhm=None, pa=None, t
             msg = 'scipy.special was not imported. PSF calculation is limited to Gaussian only.'
             raise ImportError(msg)
 
+        wav_m = np.atleast_1d(np.asarray(wav, dtype=np.float64)) * 1e-6
+        eps = tdiam_sec / tdiam_prim
+
+        def airyProfile(u):
+            u = np.where(u == 0., 1e-5, u)
+            if tdiam_sec == 0.:
+                return (2.0 * spc.j1(u) / u)**2
+            else:
+                return 1.0 / (1.0 - eps**2)**2 * ((2.0 * spc.j1(u) / u)
+                                                  - (eps**2 * 2.0 * spc.j1(eps * u) / (eps * u)))**2
+
         # Unit conversion
         x_rad = x / 3600. / 180. * np.pi
         y_rad = y / 3600. / 180. * np.pi
-        x2 = x_rad**2
-        y2 = y_rad**2
-        wav_m = wav * 1e-6
-        psf = np.zeros([nx, ny], dtype=np.float64)
-        if tdiam_sec == 0.:
-            for ix in range(nx):
-                r = np.sqrt(x2[ix] + y2)
-                u = np.pi / wav_m * tdiam_prim * r
-
-                if 0. in u:
-                    ii = (u == 0.)
-                    u[ii] = 1e-5
-                psf[ix, :] = (2.0 * spc.j1(u) / u)**2
-        else:
-            for ix in range(nx):
-                r = np.sqrt(x2[ix] + y2)
-                u = np.pi / wav_m * tdiam_prim * r
-                eps = tdiam_sec / tdiam_prim
-                if 0. in u:
-                    ii = (u == 0.)
-                    u[ii] = 1e-5
-                psf[ix, :] = 1.0 / (1.0 - eps**2)**2 * ((2.0 * spc.j1(u) / u)
-                                                        - (eps**2 * 2.0 * spc.j1(eps * u) / (eps * u)))**2
-
-        dum = 0.44 * (wav * 1e-6 / tdiam_prim / np.pi * 180. * 3600.) * 2. * np.sqrt(2. * np.log(2.))
-        fwhm = [dum, dum]
-        norm = fwhm[0] * fwhm[1] * np.pi / (4. * np.log(2.)) / dx / dy
-        psf /= norm
+        r = np.sqrt(x_rad[:, np.newaxis]**2 + y_rad[np.newaxis, :]**2)
+        ufac = np.pi / wav_m * tdiam_prim
+
+        if not exact:
+            # The profile is the same function of u for all pixels and wavelengths, so it is tabulated once on
+            # a uniform grid and linearly interpolated
+            ftab = airyProfile(np.arange(int(np.ceil(r.max() * ufac.max() / airyTableStep)) + 2) * airyTableStep)
+
+        dum = 0.44 * (wav_m / tdiam_prim / np.pi * 180. * 3600.) * 2. * np.sqrt(2. * np.log(2.))
+        norm = dum * dum * np.pi / (4. * np.log(2.)) / dx / dy
+
+        # The wavelengths are processed plane by plane to keep the temporary arrays small. The planes are
+        # contiguous in memory and the [nx, ny, nwav] array is returned as a transposed view.
+        psf = np.zeros([wav_m.shape[0], nx, ny], dtype=np.float64)
+        for iwav in range(wav_m.shape[0]):
+            u = r * ufac[iwav]
+            if exact:
+                psf[iwav] = airyProfile(u)
+            else:
+                u /= airyTableStep
+                itab = u.astype(np.int64)
+                u -= itab
+                psf[iwav] = ftab[itab] * (1. - u)
+                u *= ftab[itab + 1]
+                psf[iwav] += u
+            psf[iwav] /= norm[iwav]
+        psf = psf.transpose(1, 2, 0)
+
+        if np.ndim(wav) == 0:
+            psf = psf[:, :, 0]
 
     res = {'psf': psf, 'x': x, 'y': y}
 
@@ -1725,7 +2086,7 @@ def getConvolve(imag, psf, method='2'):
 
     return conved
 
-def readImage(fname=None, binary=False, old=False):
+def readImage(fname=None, binary=False, old=False, mmap=False):
     """Reads an image calculated by RADMC-3D.
        This function is an interface to radmc3dImage.readImage().
 
@@ -1739,10 +2100,13 @@ def readImage(fname=None, binary=False, old=False):
 
         binary  : bool, optional
                  False - the image format is formatted ASCII if True - C-compliant binary (omitted if old=True)
+
+        mmap    : bool, optional
+                 If True the pixel values of a binary image are memory-mapped instead of being read into memory
     """
 
     dum = radmc3dImage()
-    dum.readImage(fname=fname, binary=binary, old=old)
+    dum.readImage(fname=fname, binary=binary, old=old, mmap=mmap)
     return dum
 
 def readFitsToImage(fname=None, dpc=None, wav=None, rms=None, recen=None, padnan=None):
@@ -3338,7 +3702,7 @@ def makeImage(circ=False, npix=None, incl=None, wav=None, sizeau=None, phi=None,
               lambdarange=None, nlam=None, loadlambda=False, stokes=False, doppcatch=False,
               maxnrscat=None, nphot_scat=None, 
               binary=False, fname='', 
-              tausurf=-1, tracetau=False, tracecolumn=False):
+              tausurf=-1, tracetau=False, tracecolumn=False, npixx=None, npixy=None, zoomau=None):
     """Calculates a rectangular image with RADMC-3D 
 
     Parameters
@@ -3431,6 +3795,17 @@ def makeImage(circ=False, npix=None, incl=None, wav=None, sizeau=None, phi=None,
     tracecolumn : bool, optional. Default=False
                   Set this to calculate column density in g/cm^2
 
+    npixx       : int, optional
+                  Number of pixels along the x axis of the image (together with npixy instead of npix)
+
+    npixy       : int, optional
+                  Number of pixels along the y axis of the image (together with npixx instead of npix)
+
+    zoomau      : list, optional
+                  Four elements list [xmin, xmax, ymin, ymax] of the boundaries of the image in au relative to the
+                  image center (instead of sizeau). The pixels are square only if npixx/npixy matches the aspect
+                  ratio of the window.
+
     Example
     -------
 
@@ -3439,9 +3814,72 @@ def makeImage(circ=False, npix=None, incl=None, wav=None, sizeau=None, phi=None,
 
     """
     #
-    # The basic keywords that should be set
+    # Kees' fix for the case when a locally compiled radmc3d exists in the current directory
     #
-    if npix is None:
+    prefix = ''
+    if os.path.isfile('radmc3d'):
+        prefix = './'
+
+    com = _getImageCommand(circ=circ, npix=npix, incl=incl, wav=wav, sizeau=sizeau, phi=phi, posang=posang,
+                           pointau=pointau, fluxcons=fluxcons, nostar=nostar, noscat=noscat, secondorder=secondorder,
+                           widthkms=widthkms, linenlam=linenlam, vkms=vkms, imolspec=imolspec, iline=iline,
+                           lambdarange=lambdarange, nlam=nlam, loadlambda=loadlambda, stokes=stokes,
+                           doppcatch=doppcatch, maxnrscat=maxnrscat, nphot_scat=nphot_scat, binary=binary,
+                           tausurf=tausurf, tracetau=tracetau, tracecolumn=tracecolumn, npixx=npixx, npixy=npixy,
+                           zoomau=zoomau)
+    com = prefix + 'radmc3d ' + com
+
+    print('executing command: '+com)
+
+    #
+    # Now finally run radmc3d and calculate the image
+    #
+    # dum = sp.Popen([com], stdout=sp.PIPE, shell=True).wait()
+    dum = sp.Popen([com], shell=True).wait()
+
+    possible_imname = ['image.out', 'circimage.out']
+
+    detect_image = False
+    for iname in possible_imname:
+        detect_image = detect_image | os.path.isfile(iname)
+
+    if detect_image is False:
+        msg = 'Did not succeed in making image. \n'
+        msg = msg + 'Failed command: '+com
+        raise ValueError(msg)
+
+    if fname != '':
+        for iname in possible_imname:
+            if os.path.isfile(iname):
+                os.system('mv %s %s'%(iname, fname))
+
+    if tausurf > 1e-3 and fname == '':
+        fname = 'tausurface.out'
+
+    if tracetau and fname == '':
+        fname = 'optdepth.out'
+
+    if tracecolumn and fname == '':
+        fname = 'columndens.out'
+
+    print('Ran command: '+com)
+    print('Resulting file: '+fname)
+
+    return 0
+
+def _getImageCommand(circ=False, npix=None, incl=None, wav=None, sizeau=None, phi=None, posang=None, pointau=None,
+                      fluxcons=True, nostar=False, noscat=False, secondorder=1,
+                      widthkms=None, linenlam=None, vkms=None, imolspec=None, iline=None,
+                      lambdarange=None, nlam=None, loadlambda=False, stokes=False, doppcatch=False,
+                      maxnrscat=None, nphot_scat=None, binary=False, tausurf=-1, tracetau=False, tracecolumn=False,
+                      npixx=None, npixy=None, zoomau=None):
+    """Returns the command line arguments of RADMC-3D to calculate an image (without the name of the executable).
+    The parameters are the same as for makeImage().
+    """
+    #
+    # The basic keywords that should be set
+    #
+    if (npix is None) & ((npixx is None) | (npixy is None)):
         msg = 'Unkonwn npix. Number of pixels must be set.'
         raise ValueError(msg)
 
@@ -3449,6 +3887,14 @@ def makeImage(circ=False, npix=None, incl=None, wav=None, sizeau=None, phi=None,
         msg = 'Unkonwn incl. Inclination angle must be set.'
         raise ValueError(msg)
 
+    if zoomau is not None:
+        if len(zoomau) != 4:
+            msg = 'zoomau must have four elements [xmin, xmax, ymin, ymax]'
+            raise ValueError(msg)
+        if sizeau is not None:
+            msg = 'Either zoomau or sizeau should be set but not both'
+            raise ValueError(msg)
+
     if wav is None:
         if (lambdarange is None) & (nlam is None) & (loadlambda is False):
             if vkms is None:
@@ -3475,15 +3921,7 @@ def makeImage(circ=False, npix=None, incl=None, wav=None, sizeau=None, phi=None,
             msg = 'lambdarange must have two and only two elements'
             raise ValueError(msg)
 
-    #
-    # Kees' fix for the case when a locally compiled radmc3d exists in the current directory
-    #
     com = ''
-    if os.path.isfile('radmc3d'):
-        com = com + './'
-
-#    com = com + 'radmc3d image'
-    com = com + 'radmc3d'
     if tausurf > 1e-3:
         com = com + ' tausurf ' + ("%.3f" % tausurf)
     else:
@@ -3497,12 +3935,18 @@ def makeImage(circ=False, npix=None, incl=None, wav=None, sizeau=None, phi=None,
         elif tracecolumn:
             com = com + ' tracecolumn'
 
-    com = com + ' npix ' + str(int(npix))
+    if npix is not None:
+        com = com + ' npix ' + str(int(npix))
+    else:
+        com = com + ' npixx ' + str(int(npixx)) + ' npixy ' + str(int(npixy))
     com = com + ' incl ' + str(incl)
 
     if sizeau is not None:
         com = com + ' sizeau ' + str(sizeau)
 
+    if zoomau is not None:
+        com = com + ' zoomau ' + ' '.join([repr(float(v)) for v in zoomau])
+
     if wav is not None:
         com = com + ' lambda ' + str(wav)
     elif (lambdarange is not None) & (nlam is not None):
@@ -3568,43 +4012,488 @@ def makeImage(circ=False, npix=None, incl=None, wav=None, sizeau=None, phi=None,
     if nphot_scat is not None:
         com = com + ' nphot_scat %d'%nphot_scat
 
-    print('executing command: '+com)
+    return com.strip()
+
+
+def _linkModelInputs(fdir='.', sdir=''):
+    """Links the files of a model directory into a scratch directory (output files of earlier runs are skipped).
+    Files are copied if symbolic links are not supported.
+    """
+
+    for name in os.listdir(fdir):
+        src = os.path.abspath(os.path.join(fdir, name))
+        if (not os.path.isfile(src)) or (os.path.splitext(name)[1] in ['.out', '.bout', '.uout']):
+            continue
+        try:
+            os.symlink(src, os.path.join(sdir, name))
+        except (OSError, NotImplementedError):
+            shutil.copy2(src, os.path.join(sdir, name))
+
+
+def _runImageView(view=None, fdir='.', exe='radmc3d', binary=False, scratchdir=None, keep=False):
+    """Runs RADMC-3D for a single view of makeImages() in its own scratch directory and reads the image.
+    """
+
+    kwargs = dict(view)
+    fname = kwargs.pop('fname', '')
+    kwargs['binary'] = binary
+    com = [exe] + _getImageCommand(**kwargs).split()
+
+    sdir = tempfile.mkdtemp(prefix='radmc3d_image_', dir=scratchdir)
+    try:
+        _linkModelInputs(fdir=fdir, sdir=sdir)
+        print('executing command: ' + ' '.join(com) + ' in ' + sdir)
+        with open(os.path.join(sdir, 'radmc3d.log'), 'w') as logfile:
+            sp.call(com, cwd=sdir, stdout=logfile, stderr=sp.STDOUT)
+
+        if kwargs.get('circ', False):
+            iname = os.path.join(sdir, 'circimage.out')
+        elif binary:
+            iname = os.path.join(sdir, 'image.bout')
+        else:
+            iname = os.path.join(sdir, 'image.out')
+
+        if not os.path.isfile(iname):
+            with open(os.path.join(sdir, 'radmc3d.log'), 'r') as rfile:
+                log = rfile.readlines()
+            msg = 'Did not succeed in making image. \n'
+            msg = msg + 'Failed command: ' + ' '.join(com) + '\n'
+            msg = msg + 'Last lines of the output of radmc3d: \n' + ''.join(log[-10:])
+            raise ValueError(msg)
+
+        if kwargs.get('circ', False):
+            im = readcircImage(fname=iname)
+        else:
+            im = readImage(fname=iname, binary=binary)
+
+        if fname != '':
+            shutil.copy(iname, os.path.join(fdir, fname))
+            im.filename = os.path.join(fdir, fname)
+    finally:
+        if not keep:
+            shutil.rmtree(sdir, ignore_errors=True)
+
+    return im
+
+
+def makeImages(views=None, fdir='.', nproc=None, binary=False, scratchdir=None, keep=False):
+    """Calculates images of several views of a model with RADMC-3D running in parallel
+
+    Every view is calculated by a separate radmc3d process in its own scratch directory, into which the input files
+    of the model directory are linked, so the processes do not overwrite each other's image.out. At most nproc
+    processes run at the same time.
+
+    Parameters
+    ----------
+
+    views      : list
+                 List of dictionaries, each containing the keyword arguments of makeImage() for one view
+                 (e.g. {'npix':100, 'incl':60., 'phi':0., 'posang':15., 'wav':10., 'sizeau':300., 'stokes':True}).
+                 If a view contains fname, its image file is also copied to fdir under this name.
+
+    fdir       : str
+                 Model directory containing the input files of RADMC-3D
+
+    nproc      : int, optional
+                 Maximum number of radmc3d processes running at the same time. If not set the number of CPUs is used.
+                 Note that radmc3d may use several OpenMP threads itself (setthreads in radmc3d.inp).
+
+    binary     : bool
+                 If True the images are written and read in C-style binary format
+
+    scratchdir : str, optional
+                 Directory in which the scratch directories are created (if not set the system temporary directory)
+
+    keep       : bool
+                 If True the scratch directories are not removed (e.g. for debugging)
+
+    Returns
+    -------
+    A list of radmc3dImage (radmc3dCircimage for views with circ=True) instances in the order of the views
+
+    Example
+    -------
+
+    images = makeImages(views=[{'npix':100, 'incl':incl, 'wav':870., 'sizeau':300.} for incl in [0., 45., 90.]],
+                        nproc=3)
+    """
+
+    if views is None:
+        msg = 'Unknown views. A list of view parameters must be set.'
+        raise ValueError(msg)
 
     #
-    # Now finally run radmc3d and calculate the image
+    # Kees' fix for the case when a locally compiled radmc3d exists in the model directory
     #
-    # dum = sp.Popen([com], stdout=sp.PIPE, shell=True).wait()
-    dum = sp.Popen([com], shell=True).wait()
+    exe = 'radmc3d'
+    if os.path.isfile(os.path.join(fdir, 'radmc3d')):
+        exe = os.path.abspath(os.path.join(fdir, 'radmc3d'))
 
-    possible_imname = ['image.out', 'circimage.out']
+    if nproc is None:
+        nproc = os.cpu_count()
+    nproc = max(1, min(nproc, len(views)))
 
-    detect_image = False
-    for iname in possible_imname:
-        detect_image = detect_image | os.path.isfile(iname)
+    # The work is done by the radmc3d processes, the threads only wait for them
+    with ThreadPoolExecutor(max_workers=nproc) as pool:
+        futures = [pool.submit(_runImageView, view=view, fdir=fdir, exe=exe, binary=binary, scratchdir=scratchdir,
+                               keep=keep) for view in views]
+        try:
+            images = [f.result() for f in futures]
+        except Exception:
+            for f in futures:
+                f.cancel()
+            raise
 
-    if detect_image is False:
-        msg = 'Did not succeed in making image. \n'
-        msg = msg + 'Failed command: '+com
+    return images
+
+
+def makeTiledImage(ntile=None, nproc=None, fdir='.', binary=False, scratchdir=None, keep=False, **kwargs):
+    """Calculates a large rectangular image with RADMC-3D as a mosaic of sub-images rendered in parallel
+
+    The field of the image is split into ntile x ntile tiles. Each tile is calculated by a separate radmc3d process
+    (see makeImages()) with the zoomau option, using the same pixel size and pixel grid as the full image, and the
+    tiles are stitched into a single image. The pixel values of the tiles are identical to those of the full image,
+    so the flux is conserved, while each radmc3d process only has to hold a fraction of the image in memory.
+
+    Parameters
+    ----------
+
+    ntile      : int, optional
+                 Number of tiles along each axis of the image. If not set it is chosen such that there are at least
+                 as many tiles as processes.
+
+    nproc      : int, optional
+                 Maximum number of radmc3d processes running at the same time. If not set the number of CPUs is used.
+
+    fdir       : str
+                 Model directory containing the input files of RADMC-3D
+
+    binary     : bool
+                 If True the tiles are written and read in C-style binary format
+
+    scratchdir : str, optional
+                 Directory in which the scratch directories of the tiles are created
+
+    keep       : bool
+                 If True the scratch directories are not removed
+
+    **kwargs   : Keyword arguments of makeImage() describing the full image. npix and sizeau must be set, circ and
+                 zoomau are not supported. The tiles are not kept in files (fname is ignored).
+
+    Returns
+    -------
+    Returns a radmc3dImage instance
+
+    Example
+    -------
+
+    im = makeTiledImage(npix=4000, sizeau=300., incl=60., wav=870., ntile=4, nproc=8)
+    """
+
+    npix = kwargs.pop('npix', None)
+    sizeau = kwargs.pop('sizeau', None)
+    if (npix is None) | (sizeau is None):
+        msg = 'Unknown npix or sizeau. The number of pixels and the size of the full image must be set.'
         raise ValueError(msg)
+    for key in ['circ', 'zoomau', 'npixx', 'npixy']:
+        if kwargs.get(key, None):
+            msg = key + ' is not supported by makeTiledImage()'
+            raise ValueError(msg)
+    kwargs.pop('fname', None)
+
+    if nproc is None:
+        nproc = os.cpu_count()
+    if ntile is None:
+        ntile = int(np.ceil(np.sqrt(nproc)))
+    ntile = max(1, min(int(ntile), int(npix)))
+
+    # Pixel boundaries of the tiles, the tiles share the pixel grid of the full image
+    npix = int(npix)
+    dx = float(sizeau) / npix
+    edges = np.round(np.linspace(0., npix, ntile + 1)).astype(np.int64)
+
+    views = []
+    bounds = []
+    for ix in range(ntile):
+        for iy in range(ntile):
+            view = dict(kwargs)
+            view['npixx'] = edges[ix + 1] - edges[ix]
+            view['npixy'] = edges[iy + 1] - edges[iy]
+            view['zoomau'] = [(edges[ix] - npix / 2.) * dx, (edges[ix + 1] - npix / 2.) * dx,
+                              (edges[iy] - npix / 2.) * dx, (edges[iy + 1] - npix / 2.) * dx]
+            views.append(view)
+            bounds.append((edges[ix], edges[ix + 1], edges[iy], edges[iy + 1]))
+
+    tiles = makeImages(views=views, fdir=fdir, nproc=nproc, binary=binary, scratchdir=scratchdir, keep=keep)
 
-    if fname != '':
-        for iname in possible_imname:
-            if os.path.isfile(iname):
-                os.system('mv %s %s'%(iname, fname))
+    #
+    # Stitch the tiles
+    #
+    res = radmc3dImage()
+    res.filename = None
+    res.nx = npix
+    res.ny = npix
+    # The pixel size is taken from the tiles (in cm as converted by radmc3d)
+    res.sizepix_x = tiles[0].sizepix_x
+    res.sizepix_y = tiles[0].sizepix_y
+    res.nwav = tiles[0].nwav
+    res.nfreq = tiles[0].nfreq
+    res.wav = tiles[0].wav
+    res.freq = tiles[0].freq
+    res.stokes = tiles[0].stokes
+    if res.stokes:
+        res.image = np.zeros([npix, npix, 4, res.nwav], dtype=np.float64)
+    else:
+        res.image = np.zeros([npix, npix, res.nwav], dtype=np.float64)
 
-    if tausurf > 1e-3 and fname == '':
-        fname = 'tausurface.out'
+    for tile, (x0, x1, y0, y1) in zip(tiles, bounds):
+        if ((tile.nx != x1 - x0) | (tile.ny != y1 - y0)
+                | (abs(tile.sizepix_x / res.sizepix_x - 1.) > 1e-6) | (abs(tile.sizepix_y / res.sizepix_y - 1.) > 1e-6)):
+            msg = 'The pixel grid of a tile does not match the pixel grid of the full image.'
+            raise ValueError(msg)
+        res.image[x0:x1, y0:y1] = tile.image
 
-    if tracetau and fname == '':
-        fname = 'optdepth.out'
+    res.x = ((np.arange(res.nx, dtype=np.float64) + 0.5) - res.nx / 2) * res.sizepix_x
+    res.y = ((np.arange(res.ny, dtype=np.float64) + 0.5) - res.ny / 2) * res.sizepix_y
 
-    if tracecolumn and fname == '':
-        fname = 'columndens.out'
+    return res
 
-    print('Ran command: '+com)
-    print('Resulting file: '+fname)
 
-    return 0
+def _readPipeLines(rfile=None, nline=0):
+    """Reads a given number of non-empty lines from a pipe. Blank lines are skipped and no line after the last
+    requested one is read, so the call does not block on a process waiting for its next command.
+    """
+
+    lines = []
+    while len(lines) < nline:
+        line = rfile.readline()
+        if line == '':
+            raise ValueError('The radmc3d child process terminated unexpectedly.')
+        if line.strip() != '':
+            lines.append(line)
+
+    return ''.join(lines)
+
+
+class radmc3dSession(object):
+    """
+    A RADMC-3D process running in child mode
+
+    In child mode radmc3d reads the model (grid, densities, temperatures, opacities) only once and then waits for
+    commands on its standard input. The results are written to its standard output, from where they are parsed
+    directly into radmc3dImage instances, so a series of images (e.g. at many inclinations) pays for the model
+    loading only once. The session can be used as a context manager, which stops the process at the end.
+
+    Parameters
+    ----------
+
+    fdir  : str
+            Model directory in which radmc3d is started
+
+    start : bool
+            If True the child process is started immediately
+
+    Attributes
+    ----------
+
+    fdir  : str
+            Model directory
+
+    proc  : subprocess.Popen
+            The radmc3d child process (None if the session is not running)
+
+    Example
+    -------
+
+    with radmc3dSession() as sess:
+        images = [sess.makeImage(npix=100, incl=incl, wav=870., sizeau=300.) for incl in np.arange(0., 90., 10.)]
+    """
+
+    def __init__(self, fdir='.', start=True):
+        self.fdir = fdir
+        self.proc = None
+        if start:
+            self.start()
+
+    def __enter__(self):
+        if not self.isRunning():
+            self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+
+    def isRunning(self):
+        """Returns True if the child process is running.
+        """
+        return (self.proc is not None) and (self.proc.poll() is None)
+
+    def start(self):
+        """Starts the radmc3d child process.
+        """
+
+        if self.isRunning():
+            return
+
+        #
+        # Kees' fix for the case when a locally compiled radmc3d exists in the model directory
+        #
+        exe = 'radmc3d'
+        if os.path.isfile(os.path.join(self.fdir, 'radmc3d')):
+            exe = os.path.abspath(os.path.join(self.fdir, 'radmc3d'))
+
+        print('Starting ' + exe + ' child in ' + self.fdir)
+        self.proc = sp.Popen([exe, 'child'], cwd=self.fdir, stdin=sp.PIPE, stdout=sp.PIPE, universal_newlines=True,
+                             bufsize=1)
+
+    def stop(self):
+        """Stops the radmc3d child process.
+        """
+
+        if self.proc is None:
+            return
+
+        if self.proc.poll() is None:
+            try:
+                self.proc.stdin.write('quit\n')
+                self.proc.stdin.flush()
+            except (OSError, ValueError):
+                pass
+            try:
+                self.proc.wait(timeout=10.)
+            except sp.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        # Closing stdin flushes what is left in the buffer (e.g. the quit command), which fails if the process
+        # has already exited. This must not hide an exception raised within a with block.
+        for stream in [self.proc.stdin, self.proc.stdout]:
+            try:
+                stream.close()
+            except (OSError, ValueError):
+                pass
+        self.proc = None
+
+    def _sendCommand(self, com=''):
+        """Sends a command to the child process (one argument per line, terminated by 'enter').
+        """
+
+        if not self.isRunning():
+            msg = 'The radmc3d child process is not running. Start the session first.'
+            raise ValueError(msg)
+
+        print('executing command: ' + com)
+        self.proc.stdin.write('\n'.join(com.split()) + '\nenter\n')
+        self.proc.stdin.flush()
+
+    def makeImage(self, **kwargs):
+        """Calculates a rectangular image with the running radmc3d process.
+
+        Parameters
+        ----------
+
+        The keyword arguments of makeImage() except circ, binary and fname (the image is transferred
+        through the pipe in formatted ASCII).
+
+        Returns
+        -------
+        Returns a radmc3dImage instance
+        """
+
+        for key in ['circ', 'binary', 'fname']:
+            if kwargs.pop(key, False):
+                msg = key + ' is not supported by radmc3dSession.makeImage()'
+                raise ValueError(msg)
+
+        self._sendCommand(_getImageCommand(**kwargs))
+
+        rfile = self.proc.stdout
+        im = radmc3dImage()
+        im.filename = None
+        iformat = int(_readPipeLines(rfile, 1))
+        dum = _readPipeLines(rfile, 1).split()
+        im.nx = int(dum[0])
+        im.ny = int(dum[1])
+        im.nfreq = int(_readPipeLines(rfile, 1))
+        im.nwav = im.nfreq
+        dum = _readPipeLines(rfile, 1).split()
+        im.sizepix_x = float(dum[0])
+        im.sizepix_y = float(dum[1])
+        im.wav = textio.parseNumbers(_readPipeLines(rfile, im.nwav), nthreads=1, comments=None)
+        im.freq = nc.cc / im.wav * 1e4
+
+        # One pixel per line with x being the fastest varying index
+        if iformat == 3:
+            nval = 4
+        else:
+            nval = 1
+        data = textio.parseNumbers(_readPipeLines(rfile, im.nx * im.ny * im.nwav),
+                                   count=nval * im.nx * im.ny * im.nwav, comments=None)
+        if iformat == 1:
+            im.stokes = False
+            im.image = np.reshape(data, [im.nx, im.ny, im.nwav], order='F')
+        elif iformat == 3:
+            im.stokes = True
+            data = np.reshape(data, [4, im.nx, im.ny, im.nwav], order='F')
+            im.image = np.moveaxis(data, 0, 2)
+        else:
+            raise ValueError('Unknown image format ' + ("%d" % iformat) + ' received from radmc3d')
+
+        im.x = ((np.arange(im.nx, dtype=np.float64) + 0.5) - im.nx / 2) * im.sizepix_x
+        im.y = ((np.arange(im.ny, dtype=np.float64) + 0.5) - im.ny / 2) * im.sizepix_y
+
+        return im
+
+    def makeSpectrum(self, dpc=1., **kwargs):
+        """Calculates a spectrum with the running radmc3d process.
+
+        Parameters
+        ----------
+
+        dpc : float
+              Distance to source in pc (see radmc3dImage.readSpectrum())
+
+        The rest of the keyword arguments are those of makeSpectrum() except binary and fname.
+
+        Returns
+        -------
+        Returns a radmc3dImage instance with the same content as radmc3dImage.readSpectrum()
+        """
+
+        for key in ['binary', 'fname']:
+            if kwargs.pop(key, False):
+                msg = key + ' is not supported by radmc3dSession.makeSpectrum()'
+                raise ValueError(msg)
+
+        self._sendCommand(_getSpectrumCommand(**kwargs))
+
+        rfile = self.proc.stdout
+        im = radmc3dImage()
+        im.filename = None
+        iformat = int(_readPipeLines(rfile, 1))
+        if iformat != 1:
+            raise ValueError('Unknown spectrum format ' + ("%d" % iformat) + ' received from radmc3d')
+        im.nwav = int(_readPipeLines(rfile, 1))
+
+        # One wavelength and flux pair per line
+        data = textio.parseNumbers(_readPipeLines(rfile, im.nwav), count=2 * im.nwav, nthreads=1, comments=None)
+        data = np.reshape(data, [im.nwav, 2])
+        im.wav = data[:, 0]
+        im.image = np.reshape(data[:, 1], [1, 1, im.nwav])
+        im.nfreq = im.nwav
+        im.freq = nc.cc * 1e4 / im.wav
+        im.nx = 1
+        im.ny = 1
+        im.sizepix_x = 0.
+        im.sizepix_y = 0.
+        im.x = 0.
+        im.y = 0.
+        im.dpc = dpc
+        im.stokes = False
+        im.totflux = np.squeeze(im.image)
+        im.imageJyppix = im.image * nc.jy
+
+        return im
+
 
 def cmask(im=None, rad=0.0, au=False, arcsec=False, dpc=None):
     """Simulates a coronographic mask.
@@ -3688,6 +4577,38 @@ def makeSpectrum(npix=None, incl=None, wav=None, sizeau=None,
     Parameters
     ----------
     
+    """
+    com = 'radmc3d ' + _getSpectrumCommand(npix=npix, incl=incl, wav=wav, sizeau=sizeau, phi=phi, posang=posang,
+                                           pointau=pointau, fluxcons=fluxcons, nostar=nostar, noscat=noscat,
+                                           secondorder=secondorder, lambdarange=lambdarange, nlam=nlam,
+                                           loadlambda=loadlambda, binary=binary)
+
+    print('executing command: '+com)
+
+    #
+    # Now finally run radmc3d and calculate the image
+    #
+    # dum = sp.Popen([com], stdout=sp.PIPE, shell=True).wait()
+    dum = sp.Popen([com], shell=True).wait()
+
+    if os.path.isfile('spectrum.out') is False:
+        msg = 'Did not succeed in making spectrum. \n'
+        msg = msg + 'Failed command: '+com
+        raise ValueError(msg)
+
+    if fname != '':
+        os.system('mv spectrum.out '+fname)
+
+    print('Ran command: '+com)
+    print('Resulting file: '+fname)
+
+    return 0
+
+def _getSpectrumCommand(npix=None, incl=None, wav=None, sizeau=None, phi=None, posang=None, pointau=None,
+                        fluxcons=True, nostar=False, noscat=False, secondorder=True,
+                        lambdarange=None, nlam=None, loadlambda=False, binary=False):
+    """Returns the command line arguments of RADMC-3D to calculate a spectrum (without the name of the executable).
+    The parameters are the same as for makeSpectrum().
     """
     #
     # The basic keywords that should be set
@@ -3718,8 +4639,7 @@ def makeSpectrum(npix=None, incl=None, wav=None, sizeau=None,
         msg = 'Unknown sizeau.'
         raise ValueError(msg)
 
-    com = ''
-    com = com + 'radmc3d spectrum'
+    com = 'spectrum'
 
     com = com + ' npix ' + str(int(npix))
     com = com + ' incl ' + str(incl)
@@ -3766,26 +4686,8 @@ def makeSpectrum(npix=None, incl=None, wav=None, sizeau=None,
     if secondorder:
         com = com + ' secondorder'
 
-    print('executing command: '+com)
+    return com
 
-    #
-    # Now finally run radmc3d and calculate the image
-    #
-    # dum = sp.Popen([com], stdout=sp.PIPE, shell=True).wait()
-    dum = sp.Popen([com], shell=True).wait()
-
-    if os.path.isfile('spectrum.out') is False:
-        msg = 'Did not succeed in making spectrum. \n'
-        msg = msg + 'Failed command: '+com
-        raise ValueError(msg)
-
-    if fname != '':
-        os.system('mv spectrum.out '+fname)
-
-    print('Ran command: '+com)
-    print('Resulting file: '+fname)
-
-    return 0
 
 def writeCameraWavelength(camwav=None, fdir=None, fname='camera_wavelength_micron.inp'):
     """ writes camera_wavelength_micron.inp for this list of wavelengths
@@ -3826,8 +4728,8 @@ def readCameraWavelength(fname=''):
     """
     if fname =='':
         fname = 'camera_wavelength_micron.inp'
-    data = np.fromfile(fname, count=-1, sep=" ", dtype=np.float64)
-    ncamwav = np.int(data[0])
+    data = textio.readFile(fname)
+    ncamwav = int(data[0])
     camwav = data[1:]
     return camwav
 
@@ -3858,23 +4760,14 @@ def readTauSurf3D(fname='tausurface_3d.out'):
         nwav = int(rfile.readline())
 
         # Wavelength of the image
-        wav = np.zeros(nwav, dtype=np.float64)
-        for iwav in range(nwav):
-            wav[iwav] = float(rfile.readline())
-
-        # blank space
-        dum = rfile.readline()
+        wav = textio.readLines(rfile, nwav)
 
-        x = np.zeros([nx, ny, nwav], dtype=np.float64)
-        y = np.zeros([nx, ny, nwav], dtype=np.float64)
-        z = np.zeros([nx, ny, nwav], dtype=np.float64)
-        for iwav in range(nwav):
-            for iy in range(ny):
-                for ix in range(nx):
-                    dum = rfile.readline().split()
-                    x[ix, iy, iwav] = float(dum[0])
-                    y[ix, iy, iwav] = float(dum[1])
-                    z[ix, iy, iwav] = float(dum[2])
+        # One line with the x, y, z coordinates per pixel, x being the fastest varying pixel index
+        data = textio.readNumbers(rfile, count=3 * nx * ny * nwav)
+        data = np.reshape(data, [3, nx, ny, nwav], order='F')
+        x = data[0, :, :, :]
+        y = data[1, :, :, :]
+        z = data[2, :, :, :]
 
     return {'nx':nx, 'ny':ny, 'nwav':nwav, 'wav':wav, 
             'x':x, 'y':y,'z':z}
@@ -4054,18 +4947,14 @@ class radmc3dCircimage(baseImage):
             self.stokes = False
             self.npol = 1
 
-            with open(self.fname, 'r') as f:
+            with open(self.filename, 'r') as f:
 
                 self.nfreq = int(f.readline())
                 self.nwav = self.nfreq
 
                 s = f.readline()
-                self.freq = np.zeros(self.nfreq, dtype=np.float64)
-                self.wav = np.zeros(self.nfreq, dtype=np.float64)
-                for inu in range(self.nfreq):
-                    s = f.readline()
-                    self.freq[inu] = float(s)
-                    self.wav[inu] = nc.cc / self.freq[inu]
+                self.freq = textio.readLines(f, self.nfreq)
+                self.wav = nc.cc / self.freq
 
                 s = f.readline()
                 s = f.readline().split()
@@ -4074,37 +4963,22 @@ class radmc3dCircimage(baseImage):
                 self.nfreq = int(s[2])
 
                 s = f.readline()
-                self.r = np.zeros(self.nr, dtype=np.float64)
-                for ir in range(self.nr):
-                    s = f.readline()
-                    self.r[ir] = float(s)
+                self.r = textio.readLines(f, self.nr)
 
                 s = f.readline()
-                self.ri = np.zeros(self.nr + 1, dtype=np.float64)
-                for ir in range(self.nr + 1):
-                    s = f.readline()
-                    self.ri[ir] = float(s)
+                self.ri = textio.readLines(f, self.nr + 1)
 
                 s = f.readline()
-                self.phi = np.zeros(self.nphi, dtype=np.float64)
-                for ip in range(self.nphi):
-                    s = f.readline()
-                    self.phi[ip] = float(s)
+                self.phi = textio.readLines(f, self.nphi)
 
                 s = f.readline()
-                self.phii = np.zeros(self.nphi + 1, dtype=np.float64)
-                for ip in range(self.nphi + 1):
-                    s = f.readline()
-                    self.phii[ip] = float(s)
+                self.phii = textio.readLines(f, self.nphi + 1)
 
+                # One line per radius with the values of all azimuth angles
                 s = f.readline()
-                self.image = np.zeros((self.nr, self.nphi, self.npol, self.nfreq), dtype=np.float64)
-
-                for inu in range(self.nfreq):
-                    for ir in range(self.nr):
-                        s = f.readline().split()
-                        for iphi in range(self.nphi):
-                            self.image[ir, :, 0, inu] = float(s[iphi])
+                data = textio.readNumbers(f, count=self.nr * self.nphi * self.nfreq)
+                data = np.reshape(data, [self.nphi, self.nr, self.npol, self.nfreq], order='F')
+                self.image = np.swapaxes(data, 0, 1)
 
         else:
 
@@ -4125,51 +4999,27 @@ class radmc3dCircimage(baseImage):
                 self.nwav = self.nfreq
 
                 s = f.readline()
-                self.ri = np.zeros(self.nr + 2, dtype=np.float64)
-                for ir in range(self.nr + 2):
-                    s = f.readline()
-                    self.ri[ir] = float(s)
+                self.ri = textio.readLines(f, self.nr + 2)
 
                 s = f.readline()
-                self.r = np.zeros(self.nr + 1, dtype=np.float64)
-                for ir in range(self.nr + 1):
-                    s = f.readline()
-                    self.r[ir] = float(s)
+                self.r = textio.readLines(f, self.nr + 1)
 
                 s = f.readline()
-                self.phii = np.zeros(self.nphi + 1, dtype=np.float64)
-                for ip in range(self.nphi + 1):
-                    s = f.readline()
-                    self.phii[ip] = float(s)
+                self.phii = textio.readLines(f, self.nphi + 1)
 
                 s = f.readline()
-                self.phi = np.zeros(self.nphi, dtype=np.float64)
-                for ip in range(self.nphi):
-                    s = f.readline()
-                    self.phi[ip] = float(s)
+                self.phi = textio.readLines(f, self.nphi)
 
                 s = f.readline()
-                self.freq = np.zeros(self.nfreq, dtype=np.float64)
-                self.wav = np.zeros(self.nfreq, dtype=np.float64)
-                for inu in range(self.nfreq):
-                    s = f.readline()
-                    self.wav[inu] = float(s)
-                    self.freq[inu] = nc.cc * 1e4 / self.wav[inu]
+                self.wav = textio.readLines(f, self.nfreq)
+                self.freq = nc.cc * 1e4 / self.wav
 
+                # The pixel values are stored with the radius being the fastest varying index (the blank lines
+                # separating the frequencies are ignored by the parser)
                 s = f.readline()
-                self.image = np.zeros((self.nr + 1, self.nphi, self.npol, self.nfreq), dtype=np.float64)
-
-                for inu in range(self.nfreq):
-                    for iphi in range(self.nphi):
-                        for ir in range(self.nr + 1):
-                            s = f.readline().split()
-                            self.image[ir, iphi, 0, inu] = float(s[0])
-                            if self.npol > 1:
-                                self.image[ir, iphi, 1, inu] = float(s[1])
-                                self.image[ir, iphi, 2, inu] = float(s[2])
-                                self.image[ir, iphi, 3, inu] = float(s[3])
-
-                    dum = f.readline().split() # empty line
+                data = textio.readNumbers(f, count=self.npol * (self.nr + 1) * self.nphi * self.nfreq)
+                data = np.reshape(data, [self.npol, self.nr + 1, self.nphi, self.nfreq], order='F')
+                self.image = np.moveaxis(data, 0, 2)
 
     def getJyppix(self, dpc):
         """
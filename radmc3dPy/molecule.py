@@ -14,6 +14,7 @@ except ImportError:
 
 
 from . import natconst as nc
+from . import textio
 
 
 class radmc3dMolecule(object):
@@ -121,31 +122,22 @@ class radmc3dMolecule(object):
             dum = rfile.readline()
             self.nlev = int(rfile.readline())
             dum = rfile.readline()
-            self.energycminv = np.zeros(self.nlev, dtype=np.float64)
-            self.energy = np.zeros(self.nlev, dtype=np.float64)
-            self.wgt = np.zeros(self.nlev, dtype=np.float64)
-            self.jrot = np.zeros(self.nlev, dtype=np.float64)
-            for i in range(self.nlev):
-                dum = rfile.readline().split()
-                self.energycminv[i] = float(dum[1])
-                self.energy[i] = float(dum[1]) * nc.hh * nc.cc
-                self.wgt[i] = float(dum[2])
-                self.jrot[i] = float(dum[3])
+            # Level index, energy, statistical weight, J
+            dum = textio.readColumns(rfile, nline=self.nlev, ncol=4)
+            self.energycminv = dum[:, 1]
+            self.energy = dum[:, 1] * nc.hh * nc.cc
+            self.wgt = dum[:, 2]
+            self.jrot = dum[:, 3]
             dum = rfile.readline()
             self.nlin = int(rfile.readline())
             dum = rfile.readline()
-            self.iup = np.zeros(self.nlin, dtype=np.int)
-            self.ilow = np.zeros(self.nlin, dtype=np.int)
-            self.aud = np.zeros(self.nlin, dtype=np.float64)
-            self.freq = np.zeros(self.nlin, dtype=np.float64)
-            self.lam = np.zeros(self.nlin, dtype=np.float64)
-            for i in range(self.nlin):
-                dum = rfile.readline().split()
-                self.iup[i] = int(dum[1])  # Use as index: [iup-1]
-                self.ilow[i] = int(dum[2])  # Use as index: [ilow-1]
-                self.aud[i] = float(dum[3])
-                self.freq[i] = float(dum[4]) * 1e9
-                self.lam[i] = nc.cc / self.freq[i]
+            # Transition index, upper level, lower level, Einstein A, frequency in GHz
+            dum = textio.readColumns(rfile, nline=self.nlin, ncol=5)
+            self.iup = dum[:, 1].astype(np.int64)  # Use as index: [iup-1]
+            self.ilow = dum[:, 2].astype(np.int64)  # Use as index: [ilow-1]
+            self.aud = dum[:, 3]
+            self.freq = dum[:, 4] * 1e9
+            self.lam = nc.cc / self.freq
 
         return True
 
@@ -15,6 +15,7 @@ except ImportError:
     print(traceback.format_exc())
 
 from . import natconst as nc
+from . import textio
 
 class radmc3dOctree(object):
     """
@@ -42,7 +43,8 @@ class radmc3dOctree(object):
                         Base grid cell center grid in the third dimension
 
     x                 : ndarray
-                        Tree cell center array in the first dimension
+                        Tree cell center array in the first dimension (optionally calculated from the tree structure in
+                        the compact representation, see compact())
 
     y                 : ndarray
                         Tree cell center array in the second dimension
@@ -51,7 +53,8 @@ class radmc3dOctree(object):
                         Tree cell center array in the third dimension
 
     dx                : ndarray
-                        Tree cell halfwidth array in the first dimension
+                        Tree cell halfwidth array in the first dimension (calculated from the cell level in the compact
+                        representation, see compact())
 
     dy                : ndarray
                         Tree cell halfwidth array in the second dimension
@@ -72,9 +75,8 @@ class radmc3dOctree(object):
                         Array containing the index of the parent cell (currently unused, only needed if we go up
                         in the tree)
 
-    childID           : list
-                        List of children indices. Each list element is an ndarray with nChild elements containing the
-                        child indices
+    childID           : ndarray
+                        Children indices with [nCell, nChild] dimensions (-1 for leaves)
 
     act_dim           : list
                         A three element array to indicate which dimension is active, i.e. which dimensions are the
@@ -142,7 +144,7 @@ class radmc3dOctree(object):
         #
         # Leaf index array - mapping between a full array and an array containing only leaves
         #
-        self.leafID = np.zeros(0, dtype=np.int)
+        self.leafID = np.zeros(0, dtype=np.int64)
         #
         # Boolean array for the cell type (True - leaf, False - branch)
         #
@@ -150,17 +152,23 @@ class radmc3dOctree(object):
         #
         # Level array (base grid is level 0)
         #
-        self.level = np.zeros(0, dtype=np.int)
+        self.level = np.zeros(0, dtype=np.int64)
         #
         # Array containing the index of the parent cell (currently unused, only needed if we go up in the tree)
         #
-        self.parentID = np.zeros(0, dtype=np.int)
+        self.parentID = np.zeros(0, dtype=np.int64)
         #
-        # List of children indices
+        # Children indices with [nCell, nChild] dimensions (-1 for leaves)
         #
-        self.childID = []
+        self.childID = np.zeros([0, 0], dtype=np.int64)
         self.cID = np.zeros(0, dtype=int)
         #
+        # Storage of the tree arrays during tree building. The arrays are allocated with spare capacity, which is
+        # doubled whenever it runs out, and the tree attributes (x, y, z, dx, dy, dz, isLeaf, level, parentID,
+        # childID) are views of their first nCell elements
+        #
+        self._treeBuffers = None
+        #
         # Number of cells in the whole tree and for the base grid
         #
         self.nCell = 0
@@ -201,11 +209,208 @@ class radmc3dOctree(object):
 
         self.nwav = 0
         self.nfreq = 0
-        self.wav = np.zeros(0, dtype=np.int)
-        self.freq = np.zeros(0, dtype=np.int)
+        self.wav = np.zeros(0, dtype=np.int64)
+        self.freq = np.zeros(0, dtype=np.int64)
 
         self.counter = -1
 
+    #
+    # Cell centres and half widths. In the full representation they are stored arrays, in the compact
+    # representation (see compact()) the half widths and optionally the centres are calculated on each access.
+    #
+    @property
+    def x(self):
+        if self._x is None:
+            return self._getCellCentre(0)
+        return self._x
+
+    @x.setter
+    def x(self, val):
+        self._x = val
+
+    @property
+    def y(self):
+        if self._y is None:
+            return self._getCellCentre(1)
+        return self._y
+
+    @y.setter
+    def y(self, val):
+        self._y = val
+
+    @property
+    def z(self):
+        if self._z is None:
+            return self._getCellCentre(2)
+        return self._z
+
+    @z.setter
+    def z(self, val):
+        self._z = val
+
+    @property
+    def dx(self):
+        if self._dx is None:
+            return self._getCellHalfWidth(0)
+        return self._dx
+
+    @dx.setter
+    def dx(self, val):
+        self._dx = val
+
+    @property
+    def dy(self):
+        if self._dy is None:
+            return self._getCellHalfWidth(1)
+        return self._dy
+
+    @dy.setter
+    def dy(self, val):
+        self._dy = val
+
+    @property
+    def dz(self):
+        if self._dz is None:
+            return self._getCellHalfWidth(2)
+        return self._dz
+
+    @dz.setter
+    def dz(self, val):
+        self._dz = val
+
+    def _getChildOffsets(self):
+        """
+        Returns the offsets of the child cell centres from the centre of their parent in units of the parent's
+        half width (a tuple of three ndarrays with nChild elements)
+        """
+
+        if self.nChild == 8:
+            xc_offset = np.array([-0.5, 0.5, -0.5, 0.5, -0.5, 0.5, -0.5, 0.5], dtype=np.float64)
+            yc_offset = np.array([-0.5, -0.5, 0.5, 0.5, -0.5, -0.5, 0.5, 0.5], dtype=np.float64)
+            zc_offset = np.array([-0.5, -0.5, -0.5, -0.5, 0.5, 0.5, 0.5, 0.5], dtype=np.float64)
+        #
+        # If we are resolving only two dimensions
+        #
+        elif self.nChild == 4:
+            offset = [np.array([-0.5, 0.5, -0.5, 0.5], dtype=np.float64),
+                      np.array([-0.5, -0.5, 0.5, 0.5], dtype=np.float64)]
+            xc_offset, yc_offset, zc_offset = [np.zeros(4, dtype=np.float64) if self.act_dim[i] == 0
+                                               else offset.pop(0) for i in range(3)]
+        #
+        # If we are resolving only one dimension
+        #
+        elif self.nChild == 2:
+            xc_offset, yc_offset, zc_offset = [np.array([-0.5, 0.5], dtype=np.float64) * self.act_dim[i]
+                                               for i in range(3)]
+        else:
+            raise ValueError('Wrong number of child/leaf cells. The number of leaf cells should be 2,4,8 in '
+                             + '1,2,3 dimensions, respectively. Insted ' + ("%d" % self.nChild) + ' have been '
+                             + 'claimed.')
+
+        return xc_offset, yc_offset, zc_offset
+
+    def _getCellHalfWidth(self, idim=0, cellID=None):
+        """
+        Calculates the cell half widths from the base grid cell size and the cell level
+
+        Parameters
+        ----------
+        idim        : int
+                      Dimension (0 - x, 1 - y, 2 - z)
+
+        cellID      : ndarray, optional
+                      Tree indices of the cells. If not set the half widths of all cells are returned.
+        """
+
+        ci = [self.xi, self.yi, self.zi][idim]
+        level = self.level
+        if cellID is not None:
+            level = level[cellID]
+        # Each level halves the cell size in the active dimensions (exact in floating point)
+        return np.ldexp(np.zeros(level.shape, dtype=np.float64) + (ci[1] - ci[0]) * 0.5,
+                        -level.astype(np.int32) * int(self.act_dim[idim]))
+
+    def _getCellCentre(self, idim=0):
+        """
+        Calculates the cell centres in one dimension by descending the tree level by level from the base grid
+
+        Parameters
+        ----------
+        idim        : int
+                      Dimension (0 - x, 1 - y, 2 - z)
+        """
+
+        crd = np.zeros(self.nCell, dtype=np.float64)
+        if idim == 0:
+            crd[:self.nxRoot * self.nyRoot * self.nzRoot] = np.tile(self.xc, self.nyRoot * self.nzRoot)
+        elif idim == 1:
+            crd[:self.nxRoot * self.nyRoot * self.nzRoot] = np.tile(np.repeat(self.yc, self.nxRoot), self.nzRoot)
+        else:
+            crd[:self.nxRoot * self.nyRoot * self.nzRoot] = np.repeat(self.zc, self.nxRoot * self.nyRoot)
+
+        if self.nChild > 0:
+            offset = self._getChildOffsets()[idim]
+            cellID = np.arange(self.nxRoot * self.nyRoot * self.nzRoot, dtype=np.int64)
+            while cellID.shape[0] > 0:
+                cellID = cellID[~self.isLeaf[cellID]]
+                hw = self._getCellHalfWidth(idim, cellID)
+                children = self.childID[cellID]
+                crd[children] = crd[cellID][:, np.newaxis] + offset * hw[:, np.newaxis]
+                cellID = children.ravel()
+
+        return crd
+
+    def compact(self, dropCentres=False):
+        """
+        Converts the tree to a compact representation to reduce its memory footprint. The cell half widths are
+        no longer stored but calculated from the base grid cell size and the cell level, levels are stored as int8
+        and cell indices as int32. The attributes of the tree keep their meaning, but dx, dy, dz (and x, y, z if
+        dropCentres is True) are calculated on each access, so they should be assigned to local variables in loops.
+
+        Parameters
+        ----------
+        dropCentres : bool
+                      If True the cell centres are not stored either, but calculated from the tree structure
+
+        """
+
+        if self.nCell >= np.iinfo(np.int32).max:
+            raise ValueError('The tree has too many cells for int32 cell indices.')
+        if self.levelMax > np.iinfo(np.int8).max:
+            raise ValueError('The tree is too deep for int8 levels.')
+
+        self._releaseTreeBuffers()
+        self.level = self.level.astype(np.int8)
+        self.parentID = self.parentID.astype(np.int32)
+        self.leafID = self.leafID.astype(np.int32)
+        self.childID = self.childID.astype(np.int32)
+        self.cID = np.arange(self.nCell, dtype=np.int32)
+        self._dx = None
+        self._dy = None
+        self._dz = None
+        if dropCentres:
+            self._x = None
+            self._y = None
+            self._z = None
+
+        return
+
+    def expand(self):
+        """
+        Converts a compact tree (see compact()) back to the full representation with stored cell centres and half
+        widths and int64 levels and indices.
+        """
+
+        self.x, self.y, self.z = self.x, self.y, self.z
+        self.dx, self.dy, self.dz = self.dx, self.dy, self.dz
+        self.level = self.level.astype(np.int64)
+        self.parentID = self.parentID.astype(np.int64)
+        self.leafID = self.leafID.astype(np.int64)
+        self.childID = self.childID.astype(np.int64)
+        self.cID = np.arange(self.nCell, dtype=np.int64)
+
+        return
+
     def getCellVolume(self, fullTree=False):
         """
         Calculates the grid cell volume
@@ -221,12 +426,14 @@ class radmc3dOctree(object):
         -------
         An linear ndarray containing the cell volumes
         """
+        dx, dy, dz = self.dx, self.dy, self.dz
         if self.crd_sys == 'car':
-            vol = (2. * self.dx) * (2. * self.dy) * (2. * self.dz)
+            vol = (2. * dx) * (2. * dy) * (2. * dz)
         else:
-            vol = 1. / 3. * (self.x + self.dx)**3 - (self.x - self.dx)**3 \
-                                                      * (np.cos(self.y - self.dy) - np.cos(self.y + self.dy)) \
-                                                      * self.dz
+            x, y = self.x, self.y
+            vol = 1. / 3. * (x + dx)**3 - (x - dx)**3 \
+                                          * (np.cos(y - dy) - np.cos(y + dy)) \
+                                          * dz
 
         if not fullTree:
             ii = (self.leafID >= 0)
@@ -236,7 +443,7 @@ class radmc3dOctree(object):
 
         return vol
 
-    def _getContainerLeafIDRec(self, crd=(), cellID=-1):
+    def _getContainerLeafIDRec(self, crd=(), cellID=-1, cells=None):
         """
         Recursive function to find the tree index of a leaf that contains a given coordinate
 
@@ -247,14 +454,22 @@ class radmc3dOctree(object):
 
         cellID      : int
                       Cell index
+
+        cells       : tuple, optional
+                      Cell centre and half width arrays (x, y, z, dx, dy, dz), passed down the recursion so that they
+                      are calculated only once for compact trees
         """
 
-        xmin = self.x[cellID] - self.dx[cellID]
-        xmax = self.x[cellID] + self.dx[cellID]
-        ymin = self.y[cellID] - self.dy[cellID]
-        ymax = self.y[cellID] + self.dy[cellID]
-        zmin = self.z[cellID] - self.dz[cellID]
-        zmax = self.z[cellID] + self.dz[cellID]
+        if cells is None:
+            cells = (self.x, self.y, self.z, self.dx, self.dy, self.dz)
+        x, y, z, dx, dy, dz = cells
+
+        xmin = x[cellID] - dx[cellID]
+        xmax = x[cellID] + dx[cellID]
+        ymin = y[cellID] - dy[cellID]
+        ymax = y[cellID] + dy[cellID]
+        zmin = z[cellID] - dz[cellID]
+        zmax = z[cellID] + dz[cellID]
 
         if self.isLeaf[cellID]:
             if (((crd[0] >= xmin) & (crd[0] < xmax)) &
@@ -266,7 +481,7 @@ class radmc3dOctree(object):
         else:
             dum = None
             for i in range(self.nChild):
-                dum = self._getContainerLeafIDRec(crd, self.childID[cellID][i])
+                dum = self._getContainerLeafIDRec(crd, self.childID[cellID][i], cells)
                 if dum is not None:
                     break
             return dum
@@ -313,6 +528,18 @@ class radmc3dOctree(object):
 
         return leafID
 
+    def getLeafIndex(self):
+        """
+        Builds a spatial index of the leaves to locate many points at once (see radmc3dOctreeIndex). The index
+        should be built once and reused, it has to be rebuilt if the tree changes.
+
+        Returns
+        -------
+        A radmc3dOctreeIndex instance
+        """
+
+        return radmc3dOctreeIndex(grid=self)
+
     # --------------------------------------------------------------------------------------------------
     def makeWavelengthGrid(self, wbound=None, nw=None, ppar=None):
         """Creates the wavelength/frequency grid.
@@ -387,8 +614,8 @@ class radmc3dOctree(object):
         # Read the frequency grid
         #
         print('Reading ' + fname)
-        data = np.fromfile(fname, count=-1, sep=" ", dtype=np.float64)
-        self.nfreq = np.int(data[0])
+        data = textio.readFile(fname)
+        self.nfreq = int(data[0])
         self.nwav = self.nfreq
         self.wav = data[1:]
         self.freq = nc.cc / self.wav * 1e4
@@ -469,7 +696,65 @@ class radmc3dOctree(object):
         self.isLeaf[cellID] = True
         self.level[cellID] = level
         self.parentID[cellID] = parentID
-        self.childID.append(np.zeros(self.nChild, dtype=np.int))
+        self.childID[cellID] = -1
+
+        return
+
+    def _extendTree(self, ncell=0):
+        """
+        Extends the tree arrays by ncell elements. The new elements are uninitialised. The arrays are stored in
+        buffers with spare capacity, so the data only has to be copied when the capacity is doubled.
+
+        Parameters
+        ----------
+        ncell       : int
+                      Number of cells to be added to the tree
+        """
+
+        names = ['x', 'y', 'z', 'dx', 'dy', 'dz', 'isLeaf', 'level', 'parentID', 'childID']
+        nold = self.nCell
+        nnew = nold + ncell
+
+        buffers = self._treeBuffers
+        # The buffers are only valid if the tree attributes are still views of them
+        if buffers is not None:
+            for name in names:
+                if getattr(self, name).base is not buffers[name]:
+                    buffers = None
+                    break
+
+        if (buffers is None) or (buffers['x'].shape[0] < nnew):
+            if buffers is None:
+                capacity = nnew
+            else:
+                capacity = max(2 * buffers['x'].shape[0], nnew)
+            newBuffers = {}
+            for name in names:
+                arr = getattr(self, name)
+                if name == 'childID':
+                    buf = np.empty([capacity, self.nChild], dtype=np.int64)
+                else:
+                    buf = np.empty(capacity, dtype=arr.dtype)
+                buf[:nold] = arr[:nold]
+                newBuffers[name] = buf
+            buffers = newBuffers
+            self._treeBuffers = buffers
+
+        for name in names:
+            setattr(self, name, buffers[name][:nnew])
+        self.nCell = nnew
+
+        return
+
+    def _releaseTreeBuffers(self):
+        """
+        Replaces the tree attributes by arrays without spare capacity and frees the tree building buffers
+        """
+
+        if self._treeBuffers is not None:
+            for name in self._treeBuffers:
+                setattr(self, name, np.array(getattr(self, name)))
+            self._treeBuffers = None
 
         return
 
@@ -493,124 +778,60 @@ class radmc3dOctree(object):
         self.nBranch += ncell
         self.nLeaf += ncell * self.nChild
 
-        x = np.zeros(ncell * self.nChild, dtype=np.float64)
-        y = np.zeros(ncell * self.nChild, dtype=np.float64)
-        z = np.zeros(ncell * self.nChild, dtype=np.float64)
-        dx = np.zeros(ncell * self.nChild, dtype=np.float64)
-        dy = np.zeros(ncell * self.nChild, dtype=np.float64)
-        dz = np.zeros(ncell * self.nChild, dtype=np.float64)
-        isLeaf = np.zeros(ncell * self.nChild, dtype=bool)
-        level = np.zeros(ncell * self.nChild, dtype=np.int)
-        parentID = np.zeros(ncell * self.nChild, dtype=np.int)
-        ind = np.arange(ncell, dtype=np.int) * self.nChild
-        nx = self.x.shape[0]
+        rsIDs = np.asarray(rsIDs, dtype=np.int64)
+        nx = self.nCell
 
-        xc_offset = None
-        yc_offset = None
-        zc_offset = None
         #
-        # Generate the cell center offsets for a proper octree
+        # Cell center offsets of the children (all resolved cells are at the same level and have the same size)
         #
-        if self.nChild == 8:
-            xc_offset = np.array([-0.5, 0.5, -0.5, 0.5, -0.5, 0.5, -0.5, 0.5], dtype=np.float64) * self.dx[rsIDs][0]
-            yc_offset = np.array([-0.5, -0.5, 0.5, 0.5, -0.5, -0.5, 0.5, 0.5], dtype=np.float64) * self.dy[rsIDs][0]
-            zc_offset = np.array([-0.5, -0.5, -0.5, -0.5, 0.5, 0.5, 0.5, 0.5], dtype=np.float64) * self.dz[rsIDs][0]
-
-        #
-        # If we are resolving only two dimensions
-        #
-        elif self.nChild == 4:
-
-            if self.act_dim[0] == 0:
-                xc_offset = np.array([0., 0., 0., 0.], dtype=np.float64)
-                yc_offset = np.array([-0.5, 0.5, -0.5, 0.5], dtype=np.float64) * self.dy[rsIDs][0]
-                zc_offset = np.array([-0.5, -0.5, 0.5, 0.5], dtype=np.float64) * self.dz[rsIDs][0]
-            elif self.act_dim[1] == 0:
-                xc_offset = np.array([-0.5, 0.5, -0.5, 0.5], dtype=np.float64) * self.dx[rsIDs][0]
-                yc_offset = np.array([0., 0., 0., 0.], dtype=np.float64)
-                zc_offset = np.array([-0.5, -0.5, 0.5, 0.5], dtype=np.float64) * self.dz[rsIDs][0]
-            elif self.act_dim[2] == 0:
-                xc_offset = np.array([-0.5, 0.5, -0.5, 0.5], dtype=np.float64) * self.dx[rsIDs][0]
-                yc_offset = np.array([-0.5, -0.5, 0.5, 0.5], dtype=np.float64) * self.dy[rsIDs][0]
-                zc_offset = np.array([0., 0., 0., 0.], dtype=np.float64)
-
-        #
-        # Generate the cell center offsets if only two dimensions are resolved
-        #
-        elif self.nChild == 2:
-
-            if self.act_dim[0] == 1:
-                xc_offset = np.array([-0.5, 0.5], dtype=np.float64) * self.dx[rsIDs][0]
-                yc_offset = np.array([0., 0.], dtype=np.float64)
-                zc_offset = np.array([0., 0.], dtype=np.float64)
-
-            if self.act_dim[1] == 1:
-                xc_offset = np.array([0., 0.], dtype=np.float64)
-                yc_offset = np.array([-0.5, 0.5], dtype=np.float64) * self.dy[rsIDs][0]
-                zc_offset = np.array([0., 0.], dtype=np.float64)
-
-            if self.act_dim[2] == 1:
-                xc_offset = np.array([0., 0.], dtype=np.float64)
-                yc_offset = np.array([0., 0.], dtype=np.float64)
-                zc_offset = np.array([-0.5, 0.5], dtype=np.float64) * self.dz[rsIDs][0]
+        pdx = self.dx[rsIDs[0]]
+        pdy = self.dy[rsIDs[0]]
+        pdz = self.dz[rsIDs[0]]
+        xc_offset, yc_offset, zc_offset = self._getChildOffsets()
+        xc_offset = xc_offset * pdx
+        yc_offset = yc_offset * pdy
+        zc_offset = zc_offset * pdz
+
+        if self.act_dim[0] == 1:
+            dx = pdx * 0.5
+        else:
+            dx = pdx
+        if self.act_dim[1] == 1:
+            dy = pdy * 0.5
+        else:
+            dy = pdy
+        if self.act_dim[2] == 1:
+            dz = pdz * 0.5
+        else:
+            dz = pdz
+        level = self.level[rsIDs][0] + 1
 
         #
-        # Generate the cell center offsets if only one dimension is resolved
+        # Add the child cells to the tree (the children of the i-th resolved cell are stored contiguously)
         #
-        for i in range(self.nChild):
-            x[ind + i] = self.x[rsIDs] + xc_offset[i]
-            y[ind + i] = self.y[rsIDs] + yc_offset[i]
-            z[ind + i] = self.z[rsIDs] + zc_offset[i]
-            if self.act_dim[0] == 1:
-                dx[ind + i] = np.zeros(ncell, dtype=np.float64) + self.dx[rsIDs][0] * 0.5
-            else:
-                dx[ind + i] = np.zeros(ncell, dtype=np.float64) + self.dx[rsIDs][0]
-
-            if self.act_dim[1] == 1:
-                dy[ind + i] = np.zeros(ncell, dtype=np.float64) + self.dy[rsIDs][0] * 0.5
-            else:
-                dy[ind + i] = np.zeros(ncell, dtype=np.float64) + self.dy[rsIDs][0]
-
-            if self.act_dim[2] == 1:
-                dz[ind + i] = np.zeros(ncell, dtype=np.float64) + self.dz[rsIDs][0] * 0.5
-            else:
-                dz[ind + i] = np.zeros(ncell, dtype=np.float64) + self.dz[rsIDs][0]
-
-            isLeaf[ind + i] = np.ones(ncell, dtype=bool)
-            level[ind + i] = np.zeros(ncell, dtype=np.int) + self.level[rsIDs][0] + 1
-            parentID[ind + i] = rsIDs
-
-        childID = []
-        cid = np.arange(self.nChild, dtype=np.int)
-        for i in range(ncell * self.nChild):
-            childID.append(cid)
+        self._extendTree(ncell * self.nChild)
+        new = slice(nx, self.nCell)
+        self.x[new] = (self.x[rsIDs][:, np.newaxis] + xc_offset).ravel()
+        self.y[new] = (self.y[rsIDs][:, np.newaxis] + yc_offset).ravel()
+        self.z[new] = (self.z[rsIDs][:, np.newaxis] + zc_offset).ravel()
+        self.dx[new] = dx
+        self.dy[new] = dy
+        self.dz[new] = dz
+        self.isLeaf[new] = True
+        self.level[new] = level
+        self.parentID[new] = np.repeat(rsIDs, self.nChild)
+        self.childID[new] = -1
 
         #
-        # Add the child cells to the tree
+        # Now add the child indices to the parents
         #
-        self.x = np.append(self.x, x)
-        self.y = np.append(self.y, y)
-        self.z = np.append(self.z, z)
-        self.dx = np.append(self.dx, dx)
-        self.dy = np.append(self.dy, dy)
-        self.dz = np.append(self.dz, dz)
-        self.isLeaf = np.append(self.isLeaf, isLeaf)
-        self.level = np.append(self.level, level)
-        self.parentID = np.append(self.parentID, parentID)
-        self.childID.extend(childID)
+        self.childID[rsIDs] = nx + np.arange(ncell * self.nChild, dtype=np.int64).reshape(ncell, self.nChild)
+        self.isLeaf[rsIDs] = False
 
         #
-        # Now add the child indices to the parents
-        #
-        for i in range(ncell):
-            ind = rsIDs[i]
-            self.childID[ind] = cid + nx + i * self.nChild
-            self.isLeaf[ind] = False
-            #
         # Update the array length variables
         #
-        self.nCell = self.x.shape[0]
-        self.cID = np.arange(self.nCell, dtype=np.int)
+        self.cID = np.arange(self.nCell, dtype=np.int64)
 
         return
 
@@ -692,36 +913,31 @@ class radmc3dOctree(object):
 
         self.levelMax = 0
 
-        ind = 0
-        for iz in range(self.nzRoot):
-            for iy in range(self.nyRoot):
-                for ix in range(self.nxRoot):
-                    #
-                    # Add nodes to the tree
-                    #
-                    self.x = np.append(self.x, self.xc[ix])
-                    self.y = np.append(self.y, self.yc[iy])
-                    self.z = np.append(self.z, self.zc[iz])
-
-                    self.dx = np.append(self.dx, [cellsize_x * 0.5])
-                    self.dy = np.append(self.dy, [cellsize_y * 0.5])
-                    self.dz = np.append(self.dz, [cellsize_z * 0.5])
-
-                    self.isLeaf = np.append(self.isLeaf, True)
-                    self.level = np.append(self.level, 0)
-                    self.parentID = np.append(self.parentID, -1)
-                    self.childID.append(np.zeros(self.nChild, dtype=np.int))
+        if 1 in self.act_dim:
+            self.nChild = 2**(np.array(self.act_dim, dtype=int).sum())
 
-                    self.nLeaf += 1
-                    ind += 1
-        self.nCell = self.x.shape[0]
+        #
+        # Add the base grid cells to the tree (x being the fastest varying index)
+        #
+        nRoot = self.nxRoot * self.nyRoot * self.nzRoot
+        self.x = np.tile(self.xc, self.nyRoot * self.nzRoot)
+        self.y = np.tile(np.repeat(self.yc, self.nxRoot), self.nzRoot)
+        self.z = np.repeat(self.zc, self.nxRoot * self.nyRoot)
+        self.dx = np.zeros(nRoot, dtype=np.float64) + cellsize_x * 0.5
+        self.dy = np.zeros(nRoot, dtype=np.float64) + cellsize_y * 0.5
+        self.dz = np.zeros(nRoot, dtype=np.float64) + cellsize_z * 0.5
+        self.isLeaf = np.ones(nRoot, dtype=bool)
+        self.level = np.zeros(nRoot, dtype=np.int64)
+        self.parentID = np.zeros(nRoot, dtype=np.int64) - 1
+        self.childID = np.zeros([nRoot, self.nChild], dtype=np.int64) - 1
+        self._treeBuffers = None
+        self.nLeaf = nRoot
+        self.nBranch = 0
+        self.nCell = nRoot
 
         #
         # Now build the tree
         #
-        if 1 in self.act_dim:
-            self.nChild = 2**(np.array(self.act_dim, dtype=int).sum())
-
         if self.nChild > 0:
             print('Adaptive Mesh Refinement (AMR) is active')
         txt = 'Active dimensions : '
@@ -738,7 +954,7 @@ class radmc3dOctree(object):
             #
             # Select the cells at the current level
             #
-            cID = np.arange(self.x.shape[0], dtype=int)
+            cID = np.arange(self.nCell, dtype=int)
             ii = (self.level == ilev)
 
             if True in ii:
@@ -762,7 +978,7 @@ class radmc3dOctree(object):
             else:
                 print('No cells to resolve at this level')
 
-        self.childID = np.array(self.childID)
+        self._releaseTreeBuffers()
         #
         # Print out some statistics
         #
@@ -799,31 +1015,62 @@ class radmc3dOctree(object):
                       + 'or in the radmc3d python module directory')
                 print(traceback.format_exc())
 
-    def _selfCheckCounterRec(self, cellID=None):
+    def _getTreeLevels(self):
         """
-        Recursive function for consistency check of the tree
+        Returns the tree indices of the cells reachable from the base grid, level by level (a list of ndarrays,
+        the children of each branch are contiguous)
         """
 
-        if self.isLeaf[cellID]:
-            self.counter[0] += 1
-            if self.childID[cellID].max() > self.counter[2]:
-                self.counter[2] = self.childID[cellID].max()
-        else:
-            self.counter[1] += 1
-            for i in range(self.nChild):
-                self._selfCheckCounterRec(cellID=self.childID[cellID][i])
+        levels = []
+        cellID = np.arange(self.nxRoot * self.nyRoot * self.nzRoot, dtype=np.int64)
+        while cellID.shape[0] > 0:
+            levels.append(cellID)
+            cellID = self.childID[cellID[~self.isLeaf[cellID]]].ravel()
 
-        return
+        return levels
+
+    def _getDepthFirstOrder(self):
+        """
+        Returns the tree indices of the cells in depth-first order, i.e. the order of the cells in the node type
+        list of amr_grid.inp (each base grid cell followed by its children, each child followed by its own children).
+        The order is calculated level by level from the sizes of the subtrees, without recursion.
+        """
+
+        levels = self._getTreeLevels()
+
+        # Number of cells in the subtree of each cell, from the deepest level upwards
+        size = np.ones(self.nCell, dtype=np.int64)
+        for cellID in levels[::-1]:
+            cellID = cellID[~self.isLeaf[cellID]]
+            size[cellID] += size[self.childID[cellID]].sum(axis=1)
+
+        # Position of each cell in the depth-first order, from the base grid downwards
+        pos = np.zeros(self.nCell, dtype=np.int64)
+        pos[levels[0]] = np.cumsum(size[levels[0]]) - size[levels[0]]
+        for cellID in levels:
+            cellID = cellID[~self.isLeaf[cellID]]
+            children = self.childID[cellID]
+            sz = size[children]
+            pos[children] = pos[cellID][:, np.newaxis] + 1 + np.cumsum(sz, axis=1) - sz
+
+        ncell = size[levels[0]].sum()
+        order = np.zeros(ncell, dtype=np.int64)
+        order[pos[np.concatenate(levels)]] = np.concatenate(levels)
+
+        return order
 
     def selfCheck(self):
         """
         Performs a self-check of the tree allocation and report it to the screen
         """
 
-        self.counter = np.zeros([3], dtype=np.int)
-        nRoot = self.nxRoot * self.nyRoot * self.nzRoot
-        for i in range(nRoot):
-            self._selfCheckCounterRec(cellID=i)
+        self.counter = np.zeros([3], dtype=np.int64)
+        for cellID in self._getTreeLevels():
+            isLeaf = self.isLeaf[cellID]
+            self.counter[0] += isLeaf.sum()
+            self.counter[1] += (~isLeaf).sum()
+            if (~isLeaf).any():
+                self.counter[2] = max(self.counter[2], self.childID[cellID[~isLeaf]].max())
 
         print('Tree consistency check')
         print('Tree depth      : ' + ("%d" % self.levelMax))
@@ -833,7 +1080,7 @@ class radmc3dOctree(object):
         print('Leaf array      : ' + ("%d" % self.isLeaf.shape[0]))
         print('Level array     : ' + ("%d" % self.level.shape[0]))
         print('ParentID array  : ' + ("%d" % self.parentID.shape[0]))
-        print('ChildID list    : ' + ("%d" % len(self.childID)))
+        print('ChildID array   : ' + ("%d" % self.childID.shape[0]))
         print('Max childID     : ' + ("%d" % self.counter[2]))
         print('x array         : ' + ("%d" % self.x.shape[0]))
         print('y array         : ' + ("%d" % self.y.shape[0]))
@@ -844,30 +1091,17 @@ class radmc3dOctree(object):
 
         return
 
-    def _generateLeafIDRec(self, cellID=None):
-        """
-        Recursive function to generate the leaf indices
-        """
-
-        if self.isLeaf[cellID]:
-            self.cellIDCur += 1
-            self.leafID[cellID] = self.cellIDCur
-        else:
-            for i in range(self.nChild):
-                self._generateLeafIDRec(self.childID[cellID][i])
-
     def generateLeafID(self):
         """
         Function to generate the cell index mapping from arrays containing the full tree and those containing
-        only the leaves
+        only the leaves. The leaves are numbered in depth-first order.
         """
 
         print('Generating leaf indices')
-        self.leafID = np.zeros(self.nCell, dtype=np.int) - 1
-        self.cellIDCur = -1
-        nRoot = self.nxRoot * self.nyRoot * self.nzRoot
-        for i in range(nRoot):
-            self._generateLeafIDRec(i)
+        self.leafID = np.zeros(self.nCell, dtype=np.int64) - 1
+        order = self._getDepthFirstOrder()
+        order = order[self.isLeaf[order]]
+        self.leafID[order] = np.arange(order.shape[0], dtype=np.int64)
 
         print('Done')
 
@@ -994,31 +1228,14 @@ class radmc3dOctree(object):
             wfile.write('\n')
             wfile.write('\n')
 
-            nRoot = self.nxRoot * self.nyRoot * self.nzRoot
-            for i in range(nRoot):
-                self._writeOcTreeNodeTypeRec(cellID=i, wfile=wfile)
-
-        return
-
-    def _writeOcTreeNodeTypeRec(self, cellID=None, wfile=None):
-        """
-        Recursive function to write the node type to file
-
-        Parameters
-        ----------
-
-        cellID      : int
-                      Tree index of the cell to be written
-
-        wfile       : file
-                      File object to write to
-        """
-        if self.isLeaf[cellID]:
-            wfile.write("0\n")
-        else:
-            wfile.write("1\n")
-            for i in range(self.childID[cellID].shape[0]):
-                self._writeOcTreeNodeTypeRec(cellID=self.childID[cellID][i], wfile=wfile)
+            #
+            # Node types (0 - leaf, 1 - branch) in depth-first order, written as a single buffer
+            #
+            order = self._getDepthFirstOrder()
+            buf = np.zeros([order.shape[0], 2], dtype=np.uint8)
+            buf[:, 0] = np.where(self.isLeaf[order], ord('0'), ord('1'))
+            buf[:, 1] = ord('\n')
+            wfile.write(buf.tobytes().decode('ascii'))
 
         return
 
@@ -1082,22 +1299,6 @@ class radmc3dOctree(object):
             print("Nr of cells : ", nCell)
             dum = rfile.readline()
 
-            self.levelMax = 0
-            self.nLeaf = 0
-            self.nBranch = 0
-
-            self.x = np.zeros(nCell, dtype=np.float64)
-            self.y = np.zeros(nCell, dtype=np.float64)
-            self.z = np.zeros(nCell, dtype=np.float64)
-            self.dx = np.zeros(nCell, dtype=np.float64)
-            self.dy = np.zeros(nCell, dtype=np.float64)
-            self.dz = np.zeros(nCell, dtype=np.float64)
-
-            self.isLeaf = np.ones(nCell, dtype=bool)
-            self.level = np.zeros(nCell, dtype=np.int)
-            self.parentID = np.zeros(nCell, dtype=np.int)
-            self.childID = []
-
             #
             # First of all read the base grid
             #
@@ -1121,120 +1322,283 @@ class radmc3dOctree(object):
             self.yc = (self.yi[0:self.nyRoot] + self.yi[1:self.nyRoot + 1]) * 0.5
             self.zc = (self.zi[0:self.nzRoot] + self.zi[1:self.nzRoot + 1]) * 0.5
 
-            dx = self.xi[1] - self.xi[0]
-            dy = self.yi[1] - self.yi[0]
-            dz = self.zi[1] - self.zi[0]
+            #
+            # Now read which of the cells should be resolved
+            #
+            nodeType = textio.readNumbers(rfile, dtype=np.int8, count=nCell)
+
+        self._buildTreeFromNodeType(nodeType)
+        print("Tree depth : ", self.levelMax)
+
+        self.generateLeafID()
+
+        self.selfCheck()
+        return
+
+    def _buildTreeFromNodeType(self, nodeType=None):
+        """
+        Builds the tree from the node types of the cells in depth-first order (the format of amr_grid.inp).
+        The base grid cells get the tree indices 0...nRoot-1, all other cells are numbered in depth-first order.
+
+        Parameters
+        ----------
 
-            self.cellIDCur = 0
-            for iz in range(self.nzRoot):
-                for iy in range(self.nyRoot):
-                    for ix in range(self.nxRoot):
-                        self.putNode(crd=(self.xc[ix], self.yc[iy], self.zc[iz]), cellsize=(dx, dy, dz), level=0,
-                                     parentID=-1, cellID=self.cellIDCur)
-                        self.cellIDCur += 1
-                        self.nLeaf += 1
+        nodeType    : ndarray
+                      Node type (0 - leaf, 1 - branch) of each cell in depth-first order
+        """
 
-            nRoot = self.nxRoot * self.nyRoot * self.nzRoot
+        nRoot = self.nxRoot * self.nyRoot * self.nzRoot
+        nCell = nodeType.shape[0]
+        if np.any((nodeType != 0) & (nodeType != 1)):
+            raise ValueError('Invalid node type in the tree. The node type should be either 0 (leaf) or 1 (branch).')
 
-            for i in range(nRoot):
-                self._readGridNodeTypeOcTreeRec(cellID=i, rfile=rfile)
         #
-        # Now read which of the cells should be resolved
+        # Each node opens nChild slots if it is a branch and fills one, so the subtree starting at position q ends at
+        # the first position j >= q where the running number of open slots, s, drops to s[q-1] - 1. A valid list
+        # contains exactly nRoot complete subtrees.
         #
-        self.nCell = self.nLeaf + self.nBranch
-        self.generateLeafID()
+        isBranch = nodeType == 1
+        s = np.cumsum(isBranch * self.nChild - 1, dtype=np.int64)
+        if (s[-1] != -nRoot) | (s[:-1].min(initial=0) <= -nRoot):
+            raise ValueError('Inconsistent tree structure. The node types do not describe ' + ("%d" % nRoot)
+                             + ' complete subtrees.')
+
+        # The positions sorted by (s, position) allow finding the end of many subtrees with a single search
+        smin = s.min()
+        key = np.sort((s - smin) * nCell + np.arange(nCell, dtype=np.int64))
+
+        def subtreeEnd(val=None, pos=None):
+            ind = np.searchsorted(key, (val - smin) * nCell + pos)
+            return key[ind] - (val - smin) * nCell
+
+        rootPos = np.zeros(nRoot, dtype=np.int64)
+        rootPos[1:] = subtreeEnd(-np.arange(1, nRoot, dtype=np.int64), 0) + 1
+
+        branchPos = np.nonzero(isBranch)[0]
+        childPos = np.zeros([branchPos.shape[0], self.nChild], dtype=np.int64)
+        childPos[:, 0] = branchPos + 1
+        for i in range(1, self.nChild):
+            childPos[:, i] = subtreeEnd(s[childPos[:, i - 1] - 1] - 1, childPos[:, i - 1]) + 1
+
+        #
+        # Tree indices: the base grid first, then all other cells in the order of the file
+        #
+        cellID = np.zeros(nCell, dtype=np.int64)
+        isRoot = np.zeros(nCell, dtype=bool)
+        isRoot[rootPos] = True
+        cellID[rootPos] = np.arange(nRoot, dtype=np.int64)
+        cellID[~isRoot] = np.arange(nRoot, nCell, dtype=np.int64)
+
+        self.nCell = nCell
+        self.nBranch = branchPos.shape[0]
+        self.nLeaf = nCell - self.nBranch
+
+        self.isLeaf = np.ones(nCell, dtype=bool)
+        self.isLeaf[cellID[branchPos]] = False
+        self.parentID = np.zeros(nCell, dtype=np.int64) - 1
+        self.parentID[cellID[childPos]] = cellID[branchPos][:, np.newaxis]
+        self.childID = np.zeros([nCell, self.nChild], dtype=np.int64) - 1
+        self.childID[cellID[branchPos]] = cellID[childPos]
+        self._treeBuffers = None
+
+        self.level = np.zeros(nCell, dtype=np.int64)
+        for cellID in self._getTreeLevels():
+            cellID = cellID[~self.isLeaf[cellID]]
+            self.level[self.childID[cellID]] = self.level[cellID][:, np.newaxis] + 1
+        self.levelMax = self.level.max()
+
+        self.x = self._getCellCentre(0)
+        self.y = self._getCellCentre(1)
+        self.z = self._getCellCentre(2)
+        self.dx = self._getCellHalfWidth(0)
+        self.dy = self._getCellHalfWidth(1)
+        self.dz = self._getCellHalfWidth(2)
 
-        self.selfCheck()
         return
 
-    def _readGridNodeTypeOcTreeRec(self, cellID=None, rfile=None):
+
+class radmc3dOctreeIndex(object):
+    """
+    Spatial index of the leaves of an octree to find the container leaves of arrays of points at once
+
+    Each point is mapped to a Morton (Z-order) key consisting of the index of its base grid cell followed by the
+    interleaved bits of its position within the base grid cell at the resolution of the deepest level of the tree.
+    The keys of the points inside a leaf form a contiguous range starting at the key of the leaf, so the container
+    leaves are found with a single binary search in the sorted leaf keys.
+
+    Parameters
+    ----------
+
+    grid              : radmc3dOctree, optional
+                        The tree to be indexed (see makeIndex())
+
+    Attributes
+    ----------
+
+    xi                : ndarray
+                        Base grid cell interface grid in the first dimension
+
+    yi                : ndarray
+                        Base grid cell interface grid in the second dimension
+
+    zi                : ndarray
+                        Base grid cell interface grid in the third dimension
+
+    act_dim           : list
+                        Active dimensions of the tree
+
+    levelMax          : int
+                        Highest level in the tree
+
+    key               : ndarray
+                        Sorted Morton keys of the leaves
+
+    cellID            : ndarray
+                        Tree indices of the leaves in the order of key
+    """
+
+    def __init__(self, grid=None):
+
+        self.xi = np.zeros(0, dtype=np.float64)
+        self.yi = np.zeros(0, dtype=np.float64)
+        self.zi = np.zeros(0, dtype=np.float64)
+        self.act_dim = [1, 1, 1]
+        self.levelMax = 0
+        self.key = np.zeros(0, dtype=np.int64)
+        self.cellID = np.zeros(0, dtype=np.int64)
+
+        if grid is not None:
+            self.makeIndex(grid=grid)
+
+    def makeIndex(self, grid=None):
         """
-        Recursive function to write the node type to file
+        Builds the index for a tree
 
         Parameters
         ----------
 
-        cellID      : int
-                      Tree index of the cell to be read
+        grid        : radmc3dOctree
+                      The tree to be indexed
+        """
+
+        self.xi = np.array(grid.xi, dtype=np.float64)
+        self.yi = np.array(grid.yi, dtype=np.float64)
+        self.zi = np.array(grid.zi, dtype=np.float64)
+        self.act_dim = [int(grid.act_dim[i]) for i in range(3)]
+        self.levelMax = int(grid.levelMax)
 
-        rfile       : file
-                      File object to read from
+        nRoot = grid.nxRoot * grid.nyRoot * grid.nzRoot
+        nact = sum(self.act_dim)
+        if (int(nRoot - 1).bit_length() + self.levelMax * nact) > 63:
+            raise ValueError('The tree is too deep for 64 bit Morton keys.')
 
+        #
+        # Key of each cell at its own level, calculated level by level from the base grid. The bits of the child
+        # position in the active dimensions are appended to the key of the parent.
+        #
+        code = np.zeros(grid.nCell, dtype=np.int64)
+        code[:nRoot] = np.arange(nRoot, dtype=np.int64)
+        if nact > 0:
+            offset = grid._getChildOffsets()
+            childBits = np.zeros(grid.nChild, dtype=np.int64)
+            for idim in range(3):
+                if self.act_dim[idim] == 1:
+                    childBits = childBits * 2 + (offset[idim] > 0)
+
+            childID = grid.childID
+            for cellID in grid._getTreeLevels():
+                cellID = cellID[~grid.isLeaf[cellID]]
+                code[childID[cellID]] = code[cellID][:, np.newaxis] * grid.nChild + childBits
+
+        #
+        # Leaf keys at the resolution of the deepest level
+        #
+        cellID = np.nonzero(grid.isLeaf)[0]
+        key = np.left_shift(code[cellID], (self.levelMax - grid.level[cellID].astype(np.int64)) * nact)
+        isort = np.argsort(key)
+        self.key = key[isort]
+        self.cellID = cellID[isort]
+
+        return
+
+    def getMortonKey(self, x=None, y=None, z=None):
         """
-        dum = int(rfile.readline())
-        if dum == 1:
+        Calculates the Morton keys of points
 
-            self.nLeaf -= 1
-            self.nBranch += 1
-            self.nLeaf += self.nChild
-            if self.levelMax < self.level[cellID] + 1:
-                self.levelMax = self.level[cellID] + 1
-                print('Tree depth : ', self.levelMax)
+        Parameters
+        ----------
 
-            #
-            # Generate the cell center offsets for a proper octree
-            #
-            if self.nChild == 8:
-                xc_offset = np.array([-0.5, 0.5, -0.5, 0.5, -0.5, 0.5, -0.5, 0.5], dtype=np.float64) * self.dx[cellID]
-                yc_offset = np.array([-0.5, -0.5, 0.5, 0.5, -0.5, -0.5, 0.5, 0.5], dtype=np.float64) * self.dy[cellID]
-                zc_offset = np.array([-0.5, -0.5, -0.5, -0.5, 0.5, 0.5, 0.5, 0.5], dtype=np.float64) * self.dz[cellID]
-            #
-            # If we are resolving only two dimensions
-            #
-            elif self.nChild == 4:
-
-                if self.act_dim[0] == 0:
-                    xc_offset = np.array([0., 0., 0., 0.], dtype=np.float64)
-                    yc_offset = np.array([-0.5, 0.5, -0.5, 0.5], dtype=np.float64) * self.dy[cellID]
-                    zc_offset = np.array([-0.5, -0.5, 0.5, 0.5], dtype=np.float64) * self.dz[cellID]
-                elif self.act_dim[1] == 0:
-                    xc_offset = np.array([-0.5, 0.5, -0.5, 0.5], dtype=np.float64) * self.dx[cellID]
-                    yc_offset = np.array([0., 0., 0., 0.], dtype=np.float64)
-                    zc_offset = np.array([-0.5, -0.5, 0.5, 0.5], dtype=np.float64) * self.dz[cellID]
-                elif self.act_dim[2] == 0:
-                    xc_offset = np.array([-0.5, 0.5, -0.5, 0.5], dtype=np.float64) * self.dx[cellID]
-                    yc_offset = np.array([-0.5, -0.5, 0.5, 0.5], dtype=np.float64) * self.dy[cellID]
-                    zc_offset = np.array([0., 0., 0., 0.], dtype=np.float64)
+        x           : ndarray
+                      Coordinates of the points in the first dimension
 
-            #
-            # Generate the cell center offsets if only two dimensions are resolved
-            #
-            elif self.nChild == 2:
+        y           : ndarray
+                      Coordinates of the points in the second dimension
 
-                if self.act_dim[0] == 1:
-                    xc_offset = np.array([-0.5, 0.5], dtype=np.float64) * self.dx[cellID]
-                    yc_offset = np.array([0., 0.], dtype=np.float64)
-                    zc_offset = np.array([0., 0.], dtype=np.float64)
+        z           : ndarray
+                      Coordinates of the points in the third dimension
 
-                if self.act_dim[1] == 1:
-                    xc_offset = np.array([0., 0.], dtype=np.float64)
-                    yc_offset = np.array([-0.5, 0.5], dtype=np.float64) * self.dy[cellID]
-                    zc_offset = np.array([0., 0.], dtype=np.float64)
+        Returns
+        -------
+        A tuple of two 1D ndarrays, the Morton keys of the points and a boolean array which is True for points within
+        the base grid (the keys of the other points are meaningless)
+        """
 
-                if self.act_dim[2] == 1:
-                    xc_offset = np.array([0., 0.], dtype=np.float64)
-                    yc_offset = np.array([0., 0.], dtype=np.float64)
-                    zc_offset = np.array([-0.5, 0.5], dtype=np.float64) * self.dz[cellID]
+        crd = [np.asarray(v, dtype=np.float64).ravel() for v in np.broadcast_arrays(x, y, z)]
+        ci = [self.xi, self.yi, self.zi]
+
+        inside = np.ones(crd[0].shape[0], dtype=bool)
+        for idim in range(3):
+            inside &= (crd[idim] >= ci[idim][0]) & (crd[idim] <= ci[idim][-1])
+
+        rootID = np.zeros(crd[0].shape[0], dtype=np.int64)
+        stride = 1
+        sub = []
+        for idim in range(3):
+            c = np.where(inside, crd[idim], ci[idim][0])
+            nRoot = ci[idim].shape[0] - 1
+            ind = np.clip(np.searchsorted(ci[idim], c, side='right') - 1, 0, nRoot - 1)
+            rootID += ind * stride
+            stride *= nRoot
+            if self.act_dim[idim] == 1:
+                # Position within the base grid cell in units of the cell size at the deepest level
+                frac = (c - ci[idim][ind]) / (ci[idim][ind + 1] - ci[idim][ind])
+                sub.append(np.clip(np.floor(np.ldexp(frac, self.levelMax)), 0,
+                                   2**self.levelMax - 1).astype(np.int64))
+
+        key = rootID
+        for ibit in range(self.levelMax - 1, -1, -1):
+            for s in sub:
+                key = (key << 1) | ((s >> ibit) & 1)
+
+        return key, inside
+
+    def getContainerLeafID(self, x=None, y=None, z=None):
+        """
+        Finds the tree indices of the leaves containing the given points. Points on the outer boundary of the
+        base grid are assigned to the leaves at the boundary. Points on a cell interface may be assigned to either
+        neighbouring leaf within the rounding of the coordinates.
 
-            else:
-                raise ValueError('Wrong number of child/leaf cells. The number of leaf cells should be 2,4,8 in '
-                                 + '1,2,3 dimensions, respectively. Insted ' + ("%d" % self.nChild) + ' have been '
-                                 + 'claimed.')
+        Parameters
+        ----------
 
-            self.isLeaf[cellID] = False
-            self.childID[cellID] = np.zeros(self.nChild, dtype=np.int)
-            for i in range(self.nChild):
-                self.childID[cellID][i] = self.cellIDCur
-                dx = self.dx[cellID] * (2.0 - self.act_dim[0])
-                dy = self.dy[cellID] * (2.0 - self.act_dim[1])
-                dz = self.dz[cellID] * (2.0 - self.act_dim[2])
-
-                self.putNode(
-                    crd=(self.x[cellID] + xc_offset[i], self.y[cellID] + yc_offset[i], self.z[cellID] + zc_offset[i]),
-                    cellsize=(dx, dy, dz), level=self.level[cellID] + 1,
-                    parentID=cellID, cellID=self.cellIDCur)
-                self.cellIDCur += 1
-                self._readGridNodeTypeOcTreeRec(cellID=self.childID[cellID][i], rfile=rfile)
+        x           : ndarray
+                      Coordinates of the points in the first dimension
 
-        return
+        y           : ndarray
+                      Coordinates of the points in the second dimension
+
+        z           : ndarray
+                      Coordinates of the points in the third dimension
+
+        Returns
+        -------
+        An ndarray with the broadcast shape of x, y, z containing the tree indices of the container leaves (-1 for
+        points outside of the base grid)
+        """
+
+        shape = np.broadcast(x, y, z).shape
+        key, inside = self.getMortonKey(x, y, z)
+        ind = np.searchsorted(self.key, key, side='right') - 1
+        leafID = np.where(inside, self.cellID[np.clip(ind, 0, None)], -1)
 
+        return leafID.reshape(shape)
@@ -15,6 +15,7 @@ except ImportError:
     print(traceback.format_exc())
 
 from . import natconst as nc
+from . import textio
 
 import os
 import pdb
@@ -522,8 +523,8 @@ class radmc3dGrid(object):
             # Read the frequency grid
             #
             print('Reading ' + fname)
-            data = np.fromfile(fname, count=-1, sep=" ", dtype=np.float64)
-            self.nfreq = np.int(data[0])
+            data = textio.readFile(fname)
+            self.nfreq = int(data[0])
             self.nwav = self.nfreq
             self.wav = data[1:]
             self.freq = nc.cc / self.wav * 1e4
@@ -535,8 +536,8 @@ class radmc3dGrid(object):
                 fname = 'frequency.inp'
 
             print('Reading '+fname)
-            data = np.fromfile(fname, count=-1, sep=" ", dtype=np.float64)
-            self.nfreq = np.int(data[0])
+            data = textio.readFile(fname)
+            self.nfreq = int(data[0])
             self.nwav = self.nwav
             self.freq = data[1:]
             self.wav = nc.cc / self.freq * 1e4
@@ -571,8 +572,8 @@ class radmc3dGrid(object):
                 #
 
             print('Reading '+fname)
-            data = np.fromfile(fname, count=-1, sep=" ", dtype=np.float64)
-            hdr = np.array(data[:10], dtype=np.int)
+            data = textio.readFile(fname)
+            hdr = np.array(data[:10], dtype=np.int64)
             data = data[10:]
 
             # Check the file format
@@ -625,8 +626,8 @@ class radmc3dGrid(object):
             #
             # Read the radial grid
             #
-            data = np.fromfile('radius.inp', count=-1, sep=" ", dtype=np.float64)
-            self.nx = np.int(data[0])
+            data = textio.readFile('radius.inp')
+            self.nx = int(data[0])
             self.nxi = self.nx + 1
             self.x = data[1:]
             self.xi = np.zeros(self.nxi, dtype=float)
@@ -638,8 +639,8 @@ class radmc3dGrid(object):
             # Read the poloidal angular grid
             #
 
-            data = np.fromfile('theta.inp', count=-1, sep=" ", dtype=np.float64)
-            self.ny = np.int(data[0]) * 2
+            data = textio.readFile('theta.inp')
+            self.ny = int(data[0]) * 2
             self.nyi = self.ny + 1
             self.y = np.zeros(self.ny, dtype=float)
             self.y[:self.ny//2] = data[2:]
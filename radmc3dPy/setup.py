@@ -63,6 +63,10 @@ class radmc3dModel(object):
                       overwritten irrespectively of the parameter values the data members of the radmc3dModel instance
                       would contain.
 
+    precision       : int, optional
+                      Floating point precision of the physical variables in bytes (4 - single, 8 - double). The
+                      generated variables are converted to this precision and binary input files are written with it.
+
     Keyword Arguments  :
                       Any varible name in problem_params.inp can be used as a keyword argument.
                       At first all variables are read from problem_params.in to a dictionary called ppar. Then
@@ -97,11 +101,15 @@ class radmc3dModel(object):
     par             : radmc3dPar
                      Container for the parameters of the model (i.e. the content of the problem_params.inp file)
 
+    precision       : int
+                     Floating point precision of the physical variables in bytes (4 - single, 8 - double)
+
     radsources      : radmc3dRadsources
                      Container for the radiation sources in the model
     """
 
-    def __init__(self, model=None, binary=None, old=False, dfunc=None, dfpar=None, parfile_update=True, **kwargs):
+    def __init__(self, model=None, binary=None, old=False, dfunc=None, dfpar=None, parfile_update=True, precision=8,
+                 **kwargs):
 
 
         self.par = None
@@ -180,6 +188,7 @@ class radmc3dModel(object):
         self.opac = None
         self.dfunc = dfunc
         self.dfpar = dfpar
+        self.precision = precision
 
     def readParams(self, fdir=None):
 
@@ -254,9 +263,10 @@ class radmc3dModel(object):
             if dir(mdl).__contains__('getDustDensity'):
                 if callable(getattr(mdl, 'getDustDensity')):
                     if self.data is None:
-                        self.data = analyze.radmc3dData(self.grid)
+                        self.data = analyze.radmc3dData(self.grid, precision=self.precision)
 
                     self.data.rhodust = mdl.getDustDensity(grid=self.grid, ppar=self.par.ppar)
+                    self.data.setPrecision(self.precision)
                 else:
                     raise RuntimeError('Dust density cannot be calculated in model ' + self.model)
             else:
@@ -275,8 +285,9 @@ class radmc3dModel(object):
             if dir(mdl).__contains__('getDustTemperature'):
                 if callable(getattr(mdl, 'getDustTemperature')):
                     if self.data is None:
-                        self.data = analyze.radmc3dData(self.grid)
+                        self.data = analyze.radmc3dData(self.grid, precision=self.precision)
                     self.data.dusttemp = mdl.getDustTemperature(grid=self.grid, ppar=self.par.ppar)
+                    self.data.setPrecision(self.precision)
                 else:
                     raise RuntimeError('Dust temperature cannot be calculated in model ' + self.model + ' but it was '
                                        + ' requested to be written')
@@ -309,6 +320,7 @@ class radmc3dModel(object):
                                                           ispec=self.par.ppar['gasspec_colpart_name'][icp])
                             self.data.ndens_mol = self.data.rhogas / (2.4 * nc.mp) * gasabun
 
+                    self.data.setPrecision(self.precision)
             else:
                 raise RuntimeError(' ' + self.model + '.py does not contain a getGasAbundance() function, therefore, '
                                    + ' numberdens_***.inp cannot be written')
@@ -339,6 +351,7 @@ class radmc3dModel(object):
             if dir(mdl).__contains__('getVelocity'):
                 if callable(getattr(mdl, 'getVelocity')):
                     self.data.gasvel = mdl.getVelocity(grid=self.grid, ppar=self.par.ppar)
+                    self.data.setPrecision(self.precision)
             else:
                 raise RuntimeError(' ' + self.model + '.py does not contain a getVelocity() function, therefore, '
                                    + ' gas_velocity.inp cannot be written')
@@ -357,6 +370,7 @@ class radmc3dModel(object):
             if dir(mdl).__contains__('getGasTemperature'):
                 if callable(getattr(mdl, 'getGasTemperature')):
                     self.data.gastemp = mdl.getGasTemperature(grid=self.grid, ppar=self.par.ppar)
+                    self.data.setPrecision(self.precision)
             else:
                 raise RuntimeError(' ' + self.model + '.py does not contain a getGasTemperature() function, therefore,'
                                    + ' gas_temperature.inp cannot be written')
@@ -383,6 +397,7 @@ class radmc3dModel(object):
                 else:
                     self.data.vturb = np.zeros([self.grid.nx, self.grid.ny, self.grid.nz], dtype=np.float64)
                     self.data.vturb[:, :, :] = 0.
+            self.data.setPrecision(self.precision)
 
             if writeToFile:
                 if self.par.ppar['grid_style'] == 1:
@@ -397,6 +412,7 @@ class radmc3dModel(object):
             if dir(mdl).__contains__('getDustAlignment'):
                 if callable(getattr(mdl, 'getDustAlignment')):
                     self.data.alvec = mdl.getDustAlignment(grid=self.grid, ppar=self.par.ppar)
+                    self.data.setPrecision(self.precision)
             else:
                 raise RuntimeError(' ' + self.model + '.py does not contain a getDustAlignment() function, therefore, '
                                    + ' grainalign_dir.inp cannot be written')
@@ -415,6 +431,7 @@ class radmc3dModel(object):
             if dir(mdl).__contains__('getViscousHeating'):
                 if callable(getattr(mdl, 'getViscousHeating')):
                     self.data.qvis = mdl.getViscousHeating(grid=self.grid, ppar=self.par.ppar)
+                    self.data.setPrecision(self.precision)
             else:
                 raise RuntimeError(' ' + self.model + '.py does not contain a getViscousHeating() function, therefore, '
                                    + ' heatsource.inp cannot be written')
@@ -740,7 +757,8 @@ class radmc3dModel(object):
 
 
 
-def problemSetupDust(model=None, binary=True, writeDustTemp=False, old=False, dfunc=None, dfpar=None, **kwargs):
+def problemSetupDust(model=None, binary=True, writeDustTemp=False, old=False, dfunc=None, dfpar=None, precision=8,
+                     **kwargs):
     """
     Function to set up a dust model for RADMC-3D 
 
@@ -780,6 +798,10 @@ def problemSetupDust(model=None, binary=True, writeDustTemp=False, old=False, df
                       gathered in **kwargs, however all keyword arguments in **kwargs will be written to 
                       problem_params.inp
 
+    precision       : int, optional
+                      Floating point precision of the physical variables in bytes (4 - single, 8 - double). The
+                      variables are kept in this precision and binary input files are written with it.
+
     **kwargs        : Any varible name in problem_params.inp can be used as a keyword argument.
                       At first all variables are read from problem_params.in to a dictionary called ppar. Then 
                       if there is any keyword argument set in the call of problem_setup_dust the ppar dictionary 
@@ -970,10 +992,11 @@ def problemSetupDust(model=None, binary=True, writeDustTemp=False, old=False, df
     # --------------------------------------------------------------------------------------------
     # Create the dust density distribution
     # --------------------------------------------------------------------------------------------
-    data = analyze.radmc3dData(grid)
+    data = analyze.radmc3dData(grid, precision=precision)
     if dir(mdl).__contains__('getDustDensity'):
         if callable(getattr(mdl, 'getDustDensity')):
             data.rhodust = mdl.getDustDensity(grid=grid, ppar=ppar)
+            data.setPrecision(precision)
         else:
             raise RuntimeError('Dust density cannot be calculated in model ' + model)
     else:
@@ -986,6 +1009,7 @@ def problemSetupDust(model=None, binary=True, writeDustTemp=False, old=False, df
         if dir(mdl).__contains__('getDustTemperature'):
             if callable(getattr(mdl, 'getDustTemperature')):
                 data.dusttemp = mdl.getDustTemperature(grid=grid, ppar=ppar)
+                data.setPrecision(precision)
             else:
                 raise RuntimeError('Dust temperature cannot be calculated in model ' + model + ' but it was '
                                    + ' requested to be written')
@@ -1060,7 +1084,8 @@ def problemSetupDust(model=None, binary=True, writeDustTemp=False, old=False, df
     # print 'Radial optical depth at '+("%.2f"%pwav)+'um : ', data.taux.max()
 
 
-def problemSetupGas(model=None, fullsetup=False, binary=True, writeGasTemp=False, dfunc=None, dfpar=None, **kwargs):
+def problemSetupGas(model=None, fullsetup=False, binary=True, writeGasTemp=False, dfunc=None, dfpar=None, precision=8,
+                    **kwargs):
     """
     Function to set up a gas model for RADMC-3D 
 
@@ -1105,6 +1130,10 @@ def problemSetupGas(model=None, fullsetup=False, binary=True, writeGasTemp=False
                       gathered in **kwargs, however all keyword arguments in **kwargs will be written to 
                       problem_params.inp
 
+    precision       : int, optional
+                      Floating point precision of the physical variables in bytes (4 - single, 8 - double). The
+                      variables are kept in this precision and binary input files are written with it.
+
     **kwargs        : Any varible name in problem_params.inp can be used as a keyword argument.
                       At first all variables are read from problem_params.in to a dictionary called ppar. Then 
                       if there is any keyword argument set in the call of problem_setup_gas the ppar dictionary 
@@ -1318,7 +1347,7 @@ def problemSetupGas(model=None, fullsetup=False, binary=True, writeGasTemp=False
     # Create the gas density distribution
     # --------------------------------------------------------------------------------------------
     # Create the data structure
-    data = analyze.radmc3dData(grid)
+    data = analyze.radmc3dData(grid, precision=precision)
     # Calculate the gas density and velocity
     # NOTE: the density function in the model sub-modules should provide the gas volume density
     #       in g/cm^3 but RADMC-3D needs the number density in 1/cm^3 so we should convert the
@@ -1328,6 +1357,7 @@ def problemSetupGas(model=None, fullsetup=False, binary=True, writeGasTemp=False
     if dir(mdl).__contains__('getGasDensity'):
         if callable(getattr(mdl, 'getGasDensity')):
             data.rhogas = mdl.getGasDensity(grid=grid, ppar=ppar)
+            data.setPrecision(precision)
     else:
         raise RuntimeError(' ' + model + '.py does not contain a getGasDensity() function, therefore, '
                            + ' numberdens_***.inp cannot be written')
@@ -1339,7 +1369,7 @@ def problemSetupGas(model=None, fullsetup=False, binary=True, writeGasTemp=False
         if callable(getattr(mdl, 'getGasAbundance')):
             for imol in range(len(ppar['gasspec_mol_name'])):
                 gasabun = mdl.getGasAbundance(grid=grid, ppar=ppar, ispec=ppar['gasspec_mol_name'][imol])
-                data.ndens_mol = data.rhogas / (2.4 * nc.mp) * gasabun
+                data.ndens_mol = (data.rhogas / (2.4 * nc.mp) * gasabun).astype(data.rhogas.dtype)
 
                 # Write the gas density
                 if ppar['grid_style'] == 1:
@@ -1350,7 +1380,7 @@ def problemSetupGas(model=None, fullsetup=False, binary=True, writeGasTemp=False
             if abs(ppar['lines_mode']) > 2:
                 for icp in range(len(ppar['gasspec_colpart_name'])):
                     gasabun = mdl.getGasAbundance(grid=grid, ppar=ppar, ispec=ppar['gasspec_colpart_name'][icp])
-                    data.ndens_mol = data.rhogas / (2.4 * nc.mp) * gasabun
+                    data.ndens_mol = (data.rhogas / (2.4 * nc.mp) * gasabun).astype(data.rhogas.dtype)
                     # Write the gas density
                     data.writeGasDens(ispec=ppar['gasspec_colpart_name'][icp], binary=binary)
 
@@ -1363,6 +1393,7 @@ def problemSetupGas(model=None, fullsetup=False, binary=True, writeGasTemp=False
     if dir(mdl).__contains__('getVelocity'):
         if callable(getattr(mdl, 'getVelocity')):
             data.gasvel = mdl.getVelocity(grid=grid, ppar=ppar)
+            data.setPrecision(precision)
             # Write the gas velocity
             if ppar['grid_style'] == 1:
                 data.writeGasVel(binary=binary, octree=True)
@@ -1379,6 +1410,7 @@ def problemSetupGas(model=None, fullsetup=False, binary=True, writeGasTemp=False
         if dir(mdl).__contains__('getGasTemperature'):
             if callable(getattr(mdl, 'getGasTemperature')):
                 data.gastemp = mdl.getGasTemperature(grid=grid, ppar=ppar)
+                data.setPrecision(precision)
                 # Write the gas temperature
                 if ppar['grid_style'] == 1:
                     data.writeGasTemp(binary=binary, octree=True)
@@ -1394,6 +1426,7 @@ def problemSetupGas(model=None, fullsetup=False, binary=True, writeGasTemp=False
     if dir(mdl).__contains__('getVTurb'):
         if callable(getattr(mdl, 'getVTurb')):
             data.vturb = mdl.getVTurb(grid=grid, ppar=ppar)
+            data.setPrecision(precision)
             # Write the turbulent velocity field
             if ppar['grid_style'] == 1:
                 data.writeVTurb(binary=binary, octree=True)
@@ -1402,7 +1435,7 @@ def problemSetupGas(model=None, fullsetup=False, binary=True, writeGasTemp=False
     else:
         print(' ' + model + '.py does not contain a getVTurb() function, therefore, zero microturbulent velocity'
               + ' will be assumed everywhere in the model.')
-        data.vturb = np.zeros([grid.nx, grid.ny, grid.nz], dtype=np.float64)
+        data.vturb = np.zeros([grid.nx, grid.ny, grid.nz], dtype=data.rhogas.dtype)
         data.vturb[:, :, :] = 0.
         data.writeVTurb(binary=binary)
     # --------------------------------------------------------------------------------------------
@@ -14,6 +14,7 @@ except ImportError:
     print(traceback.format_exc())
 
 from . import natconst as nc
+from . import textio
 
 
 def getAtmModel(teff=0., logg=None, mstar=None, lstar=None, rstar=None, iwav=None, model='kurucz',
@@ -396,17 +397,12 @@ def readKuruczGrid(fname=''):
         #
         # Read the wavelength grid
         #
-        wav = []
-        n = 10
-        for i in range(153):
-            dum = rfile.readline().split()
-            for j in range(len(dum)):
-                wav.append(float(dum[j]))
+        wav = textio.readLines(rfile, 153)
 
         #
         # Convert the wavelength in Angstrom to micron
         #
-        wav = np.array(wav) * 1e-3
+        wav = wav * 1e-3
         #
         # Now read the grid of spectra
         #
@@ -427,29 +423,13 @@ def readKuruczGrid(fname=''):
             logg_list.append(float(sdum[3]))
 
             #
-            # Read the stellar spectrum
+            # Read the stellar spectrum (8 fields of 10 characters per line, 5 fields in the last line)
             #
-            arr = []
-            for i in range(152):
-                dum = rfile.readline()
-                for j in range(8):
-                    arr.append(float(dum[j * n:(j + 1) * n]))
-            dum = rfile.readline()
-            for j in range(5):
-                arr.append(float(dum[j * n:(j + 1) * n]))
-            inu_list.append(np.array(arr))
+            inu_list.append(textio.readFixedWidth(rfile, nline=153, width=10, count=nwav))
             #
             # Read the continuum spectrum
             #
-            arr = []
-            for i in range(152):
-                dum = rfile.readline()
-                for j in range(8):
-                    arr.append(float(dum[j * n:(j + 1) * n]))
-            dum = rfile.readline()
-            for j in range(5):
-                arr.append(float(dum[j * n:(j + 1) * n]))
-            inucont_list.append(np.array(arr))
+            inucont_list.append(textio.readFixedWidth(rfile, nline=153, width=10, count=nwav))
 
             #
             # Read the next section header
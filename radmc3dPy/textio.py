@@ -0,0 +1,382 @@
+"""This module contains functions for the fast parsing of formatted ASCII files of RADMC-3D
+
+The formatted ASCII files of RADMC-3D (e.g. dust_temperature.dat, mean_intensity.out, image.out,
+dustkappa_*.inp) consist of a short header followed by a long list of whitespace separated numbers.
+Instead of converting these numbers one by one (or line by line) the functions in this module read
+the whole data block into a buffer with a single read and convert it in one vectorized step. Large
+buffers are split at whitespace boundaries and the chunks are converted in parallel threads (the
+conversion itself runs without holding the GIL).
+
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import traceback
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print(' Numpy cannot be imported ')
+    print(' To use the python module of RADMC-3D you need to install Numpy')
+    print(traceback.format_exc())
+
+from concurrent.futures import ThreadPoolExecutor
+
+# Buffers larger than this (in bytes) are parsed in parallel chunks if the number of threads is not set explicitly
+parallelThreshold = 100 * 1024 * 1024
+# Number of characters read at once by the streaming parser (iterNumbers)
+readBlockSize = 64 * 1024 * 1024
+
+
+def _stripComments(buf, comments='#'):
+    """Removes the comment lines at the beginning of a buffer.
+
+    Parameters
+    ----------
+
+    buf      : str
+               Text buffer
+
+    comments : str
+               Character(s) indicating the start of a comment line
+
+    Returns
+    -------
+
+    Returns the buffer without the leading comment lines
+    """
+
+    if comments is None:
+        return buf
+
+    start = 0
+    while True:
+        # Skip blank space in front of the next line
+        while (start < len(buf)) and buf[start].isspace():
+            start += 1
+        if buf.startswith(comments, start):
+            start = buf.find('\n', start)
+            if start < 0:
+                return ''
+        else:
+            break
+
+    if start == 0:
+        return buf
+    return buf[start:]
+
+
+def _getChunkBounds(buf, nchunk=1):
+    """Splits a buffer into (nearly) equal size chunks at whitespace boundaries.
+
+    Parameters
+    ----------
+
+    buf    : str
+             Text buffer
+
+    nchunk : int
+             Number of chunks
+
+    Returns
+    -------
+
+    Returns a list of start/stop index tuples
+    """
+
+    nbuf = len(buf)
+    bounds = []
+    start = 0
+    for ichunk in range(1, nchunk):
+        stop = max(start, (nbuf * ichunk) // nchunk)
+        while (stop < nbuf) and not buf[stop].isspace():
+            stop += 1
+        if stop > start:
+            bounds.append((start, stop))
+            start = stop
+    bounds.append((start, nbuf))
+
+    return bounds
+
+
+def parseNumbers(buf='', dtype=np.float64, count=-1, nthreads=None, comments='#'):
+    """Converts a text buffer of whitespace separated numbers to a 1D array.
+
+    Parameters
+    ----------
+
+    buf      : str
+               Text buffer containing whitespace separated numbers
+
+    dtype    : numpy.dtype
+               Data type of the returned array
+
+    count    : int
+               Number of values expected in the buffer. If -1 the number of values is not checked.
+
+    nthreads : int, optional
+               Number of threads used for the conversion. If None, buffers larger than textio.parallelThreshold
+               are converted using all available CPUs, smaller buffers are converted in a single thread.
+
+    comments : str, optional
+               Lines at the beginning of the buffer starting with this character are skipped.
+               Set it to None to disable comment handling.
+
+    Returns
+    -------
+
+    Returns a 1D ndarray
+    """
+
+    buf = _stripComments(buf, comments=comments)
+
+    if nthreads is None:
+        if len(buf) > parallelThreshold:
+            nthreads = os.cpu_count()
+        else:
+            nthreads = 1
+
+    if nthreads > 1:
+        bounds = _getChunkBounds(buf, nchunk=nthreads)
+        with ThreadPoolExecutor(max_workers=nthreads) as executor:
+            chunks = list(executor.map(lambda b: np.fromstring(buf[b[0]:b[1]], dtype=dtype, sep=' '), bounds))
+        data = np.concatenate(chunks)
+    else:
+        data = np.fromstring(buf, dtype=dtype, sep=' ')
+
+    if (count >= 0) & (data.shape[0] != count):
+        msg = 'Internal inconsistency in data file, the number of values (' + ("%d" % data.shape[0]) \
+              + ') is different from the expected ' + ("%d" % count)
+        raise ValueError(msg)
+
+    return data
+
+
+def readNumbers(rfile=None, dtype=np.float64, count=-1, nthreads=None, comments='#'):
+    """Reads all remaining numbers from an open formatted ASCII file.
+
+    The rest of the file (from the current position) is read into a buffer with a single read and then
+    converted by parseNumbers().
+
+    Parameters
+    ----------
+
+    rfile    : file
+               File object opened for reading (text or binary mode)
+
+    dtype    : numpy.dtype
+               Data type of the returned array
+
+    count    : int
+               Number of values expected in the rest of the file. If -1 the number of values is not checked.
+
+    nthreads : int, optional
+               Number of threads used for the conversion (see parseNumbers())
+
+    comments : str, optional
+               Lines starting with this character before the first number are skipped
+
+    Returns
+    -------
+
+    Returns a 1D ndarray
+    """
+
+    buf = rfile.read()
+    if isinstance(buf, bytes):
+        buf = buf.decode()
+
+    return parseNumbers(buf, dtype=dtype, count=count, nthreads=nthreads, comments=comments)
+
+
+def iterNumbers(rfile=None, count=1, dtype=np.float64, blocksize=None, nthreads=None):
+    """Reads the remaining numbers of an open formatted ASCII file in chunks of a given number of values.
+
+    The file is read block by block and each block is converted by parseNumbers(), so only about one block
+    of text and one chunk of values are kept in memory at a time.
+
+    Parameters
+    ----------
+
+    rfile     : file
+                File object opened for reading (text or binary mode)
+
+    count     : int
+                Number of values in a chunk
+
+    dtype     : numpy.dtype
+                Data type of the returned arrays
+
+    blocksize : int, optional
+                Number of characters read from the file at once. If None textio.readBlockSize is used.
+
+    nthreads  : int, optional
+                Number of threads used for the conversion of a block (see parseNumbers())
+
+    Returns
+    -------
+
+    Returns a generator yielding 1D ndarrays of count values (the last one may contain less values)
+    """
+
+    if blocksize is None:
+        blocksize = readBlockSize
+
+    pending = []
+    npending = 0
+    tail = ''
+    eof = False
+    while not eof:
+        buf = rfile.read(blocksize)
+        if isinstance(buf, bytes):
+            buf = buf.decode()
+
+        if buf == '':
+            eof = True
+            text = tail
+            tail = ''
+        else:
+            # The block may end in the middle of a number, which is kept for the next block
+            text = tail + buf
+            i = len(text)
+            while (i > 0) and not text[i - 1].isspace():
+                i -= 1
+            tail = text[i:]
+            text = text[:i]
+
+        if text.strip() != '':
+            vals = parseNumbers(text, dtype=dtype, nthreads=nthreads, comments=None)
+            pending.append(vals)
+            npending += vals.shape[0]
+
+        if npending >= count:
+            vals = np.concatenate(pending)
+            nfull = (npending // count) * count
+            for i in range(0, nfull, count):
+                yield vals[i:i + count]
+            pending = [vals[nfull:]]
+            npending = npending - nfull
+
+    if npending > 0:
+        yield np.concatenate(pending)
+
+
+def readFile(fname='', dtype=np.float64, nthreads=None, comments='#'):
+    """Reads all numbers from a formatted ASCII file.
+
+    Parameters
+    ----------
+
+    fname    : str
+               Name of the file
+
+    dtype    : numpy.dtype
+               Data type of the returned array
+
+    nthreads : int, optional
+               Number of threads used for the conversion (see parseNumbers())
+
+    comments : str, optional
+               Lines at the beginning of the file starting with this character are skipped
+
+    Returns
+    -------
+
+    Returns a 1D ndarray with all numbers in the file (including the header)
+    """
+
+    with open(fname, 'r') as rfile:
+        data = readNumbers(rfile, dtype=dtype, nthreads=nthreads, comments=comments)
+
+    return data
+
+
+def readLines(rfile=None, nline=0):
+    """Reads a given number of lines and converts them to a 1D array.
+
+    Useful for header blocks with one or several numbers per line (e.g. the wavelength list in image.out).
+
+    Parameters
+    ----------
+
+    rfile : file
+            File object opened for reading in text mode
+
+    nline : int
+            Number of lines to be read
+
+    Returns
+    -------
+
+    Returns a 1D ndarray with all the numbers in the lines
+    """
+
+    buf = ''.join([rfile.readline() for i in range(nline)])
+
+    return parseNumbers(buf, nthreads=1, comments=None)
+
+
+def readColumns(rfile=None, nline=0, ncol=1):
+    """Reads the first ncol columns of a given number of lines into a 2D array.
+
+    Columns after the first ncol (e.g. comments or labels) are ignored.
+
+    Parameters
+    ----------
+
+    rfile : file
+            File object opened for reading in text mode
+
+    nline : int
+            Number of lines to be read
+
+    ncol  : int
+            Number of columns to be converted
+
+    Returns
+    -------
+
+    Returns an ndarray with [nline, ncol] dimensions
+    """
+
+    cols = [rfile.readline().split()[:ncol] for i in range(nline)]
+
+    return np.array(cols, dtype=np.float64).reshape([nline, ncol])
+
+
+def readFixedWidth(rfile=None, nline=0, width=10, count=-1):
+    """Reads numbers written in fixed width fields, which are not necessarily separated by whitespace.
+
+    Parameters
+    ----------
+
+    rfile : file
+            File object opened for reading in text mode
+
+    nline : int
+            Number of lines to be read
+
+    width : int
+            Width of a single field in characters
+
+    count : int
+            Number of values to be returned. If -1 all fields in the lines are returned.
+
+    Returns
+    -------
+
+    Returns a 1D ndarray
+    """
+
+    lines = []
+    for i in range(nline):
+        line = rfile.readline().rstrip()
+        nfield = (len(line) + width - 1) // width
+        lines.append(line.ljust(nfield * width))
+
+    data = np.frombuffer(''.join(lines).encode(), dtype='S%d' % width).astype(np.float64)
+    if count >= 0:
+        data = data[:count]
+
+    return data
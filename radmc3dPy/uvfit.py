@@ -0,0 +1,335 @@
+"""This module contains classes/functions to compare RADMC-3D images to measured interferometric visibilities
+
+The measured visibilities are read from a plain uv-table, a formatted ASCII file with the columns
+u, v, Re, Im, weight, frequency (lines starting with '#' at the beginning of the file are skipped).
+The model visibilities are sampled from the image with the gridded FFT method of
+radmc3dImage.sampleVisibilities(). The Fourier transforms of the image channels are cached, so repeated
+comparisons with different distances, phase-centre offsets or flux scalings do not recompute them.
+
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import traceback
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print(' Numpy cannot be imported ')
+    print(' To use the python module of RADMC-3D you need to install Numpy')
+    print(traceback.format_exc())
+
+from . import natconst as nc
+from . import textio
+from . image import _getKBParams, _getUVGrid, _interpolateUVGrid
+
+
+class radmc3dUVData(object):
+    """
+    Measured interferometric visibilities
+
+    Attributes
+    ----------
+
+    u       : ndarray
+              Spatial frequency along the x axis of the image in units of the wavelength
+
+    v       : ndarray
+              Spatial frequency along the y axis of the image in units of the wavelength
+
+    vis     : ndarray
+              Complex visibilities [Jy]
+
+    weight  : ndarray
+              Weights of the visibilities (1/sigma^2 of the real and imaginary parts)
+
+    freq    : ndarray
+              Frequency of the visibilities [Hz]
+
+    nvis    : int
+              Number of visibilities
+    """
+
+    def __init__(self):
+        self.u = np.zeros(0, dtype=np.float64)
+        self.v = np.zeros(0, dtype=np.float64)
+        self.vis = np.zeros(0, dtype=np.complex128)
+        self.weight = np.zeros(0, dtype=np.float64)
+        self.freq = np.zeros(0, dtype=np.float64)
+        self.nvis = 0
+
+    def readUVTable(self, fname='', uvunit='m', chunksize=1000000, nthreads=None):
+        """Reads a uv-table.
+
+        Parameters
+        ----------
+
+        fname     : str
+                    Name of the file containing the columns u, v, Re, Im, weight, frequency [Hz]
+
+        uvunit    : {'m', 'lambda'}
+                    Unit of the u and v columns. Baselines in meter are converted to units of the wavelength.
+
+        chunksize : int
+                    Number of rows converted at once
+
+        nthreads  : int, optional
+                    Number of threads used for the conversion of the text (see textio.parseNumbers())
+        """
+
+        if uvunit not in ['m', 'lambda']:
+            raise ValueError('Unknown uvunit ' + str(uvunit) + '. Supported units are m and lambda.')
+
+        print('Reading ' + fname)
+        u, v, vis, weight, freq = [], [], [], [], []
+        with open(fname, 'r') as rfile:
+            # Skip the comment lines at the beginning of the file
+            pos = rfile.tell()
+            line = rfile.readline()
+            while line.strip().startswith('#') or (line.strip() == '' and line != ''):
+                pos = rfile.tell()
+                line = rfile.readline()
+            rfile.seek(pos)
+
+            for data in textio.iterNumbers(rfile, count=6 * chunksize, nthreads=nthreads):
+                if data.shape[0] % 6 != 0:
+                    raise ValueError('The number of values in ' + fname + ' is not a multiple of 6. A uv-table '
+                                     + 'should have the columns u, v, Re, Im, weight, frequency.')
+                data = data.reshape(-1, 6)
+                if uvunit == 'm':
+                    u.append(data[:, 0] * data[:, 5] / nc.cc * 1e2)
+                    v.append(data[:, 1] * data[:, 5] / nc.cc * 1e2)
+                else:
+                    u.append(data[:, 0])
+                    v.append(data[:, 1])
+                vis.append(data[:, 2] + 1j * data[:, 3])
+                weight.append(data[:, 4])
+                freq.append(data[:, 5])
+
+        if len(u) > 0:
+            self.u = np.concatenate(u)
+            self.v = np.concatenate(v)
+            self.vis = np.concatenate(vis)
+            self.weight = np.concatenate(weight)
+            self.freq = np.concatenate(freq)
+        self.nvis = self.u.shape[0]
+
+    def getChannels(self, freq=None, rtol=1e-5):
+        """Assigns the visibilities to the frequency channels of an image.
+
+        Parameters
+        ----------
+
+        freq : ndarray
+               Frequencies of the image channels [Hz]
+
+        rtol : float
+               Maximum relative difference between the frequency of a visibility and that of its channel
+
+        Returns
+        -------
+        An ndarray with the index of the channel of each visibility
+        """
+
+        freq = np.atleast_1d(np.asarray(freq, dtype=np.float64))
+        if freq.shape[0] == 1:
+            ichan = np.zeros(self.nvis, dtype=np.int64)
+        else:
+            isort = np.argsort(freq)
+            fsort = freq[isort]
+            ind = np.clip(np.searchsorted(fsort, self.freq), 1, freq.shape[0] - 1)
+            # Choose the closer of the two neighbouring channels
+            closer = np.abs(self.freq - fsort[ind - 1]) <= np.abs(self.freq - fsort[ind])
+            ichan = isort[np.where(closer, ind - 1, ind)]
+
+        if np.any(np.abs(self.freq - freq[ichan]) > rtol * freq[ichan]):
+            raise ValueError('Some visibilities have frequencies that do not match any channel of the image '
+                             + '(relative tolerance ' + ("%e" % rtol) + ').')
+
+        return ichan
+
+
+class radmc3dVisModel(object):
+    """
+    Model visibilities of a RADMC-3D image with cached Fourier transforms
+
+    The Fourier transform of an image channel (see radmc3dImage.sampleVisibilities()) does not depend on the
+    distance of the source, the phase-centre offset or the flux scaling, so it is calculated once per channel
+    and kept in memory. The image should not be modified after the model has been created, otherwise
+    clearCache() has to be called.
+
+    Parameters
+    ----------
+
+    image        : radmc3dImage
+                   The model image (for Stokes images the Stokes I image is used)
+
+    eps          : float
+                   Requested relative accuracy of the sampled visibilities
+
+    oversampling : float
+                   Ratio of the size of the zero-padded image to that of the original image
+    """
+
+    def __init__(self, image=None, eps=1e-6, oversampling=2.):
+        self.image = image
+        self.eps = eps
+        self.oversampling = oversampling
+        self.support, self.beta = _getKBParams(eps=eps, oversampling=oversampling)
+        self.uvgrid = {}
+
+    def clearCache(self):
+        """Removes the cached Fourier transforms.
+        """
+        self.uvgrid = {}
+
+    def getUVGrid(self, iwav=0):
+        """Returns the Fourier transform of an image channel, calculating it on the first call.
+
+        Parameters
+        ----------
+
+        iwav : int
+               Index of the channel
+        """
+
+        if iwav not in self.uvgrid:
+            if self.image.stokes:
+                img = self.image.image[:, :, 0, iwav]
+            else:
+                img = self.image.image[:, :, iwav]
+            self.uvgrid[iwav] = _getUVGrid(img, support=self.support, beta=self.beta,
+                                           oversampling=self.oversampling)
+
+        return self.uvgrid[iwav]
+
+    def getVisibility(self, u=None, v=None, iwav=0, dpc=None, offset=None, scale=1., jy=True, chunksize=10000):
+        """Samples the model visibilities of one channel.
+
+        Parameters
+        ----------
+
+        u         : ndarray
+                    Spatial frequencies along the x axis of the image in units of the wavelength
+
+        v         : ndarray
+                    Spatial frequencies along the y axis of the image in units of the wavelength
+
+        iwav      : int
+                    Index of the channel
+
+        dpc       : float
+                    Distance of the source in parsec
+
+        offset    : tuple, optional
+                    Offset (dx, dy) of the source relative to the phase centre in arcsec
+
+        scale     : float
+                    Flux scaling factor
+
+        jy        : bool
+                    If True the visibilities are returned in Jy, otherwise in erg/s/cm^2/Hz
+
+        chunksize : int
+                    Number of (u,v) points interpolated at once
+
+        Returns
+        -------
+        The complex visibilities at (u,v)
+        """
+
+        l = self.image.x / nc.au / dpc / 3600. / 180. * np.pi
+        m = self.image.y / nc.au / dpc / 3600. / 180. * np.pi
+
+        vis = _interpolateUVGrid(self.getUVGrid(iwav), l, m, u, v, support=self.support, beta=self.beta,
+                                 chunksize=chunksize)
+        if offset is not None:
+            dl = offset[0] / 3600. / 180. * np.pi
+            dm = offset[1] / 3600. / 180. * np.pi
+            vis *= np.exp(-2j * np.pi * (u * dl + v * dm))
+        if jy:
+            scale = scale * 1e23
+
+        return vis * scale
+
+
+def readUVTable(fname='', uvunit='m', chunksize=1000000, nthreads=None):
+    """Reads a uv-table.
+
+    Parameters
+    ----------
+
+    fname     : str
+                Name of the file containing the columns u, v, Re, Im, weight, frequency [Hz]
+
+    uvunit    : {'m', 'lambda'}
+                Unit of the u and v columns
+
+    chunksize : int
+                Number of rows converted at once
+
+    nthreads  : int, optional
+                Number of threads used for the conversion of the text
+
+    Returns
+    -------
+    Returns a radmc3dUVData object
+    """
+
+    dum = radmc3dUVData()
+    dum.readUVTable(fname=fname, uvunit=uvunit, chunksize=chunksize, nthreads=nthreads)
+
+    return dum
+
+
+def getChi2(model=None, uvdata=None, dpc=None, offset=None, scale=1., rtol=1e-5):
+    """Calculates the chi^2 and the log-likelihood of measured visibilities for a model image.
+
+    Parameters
+    ----------
+
+    model  : radmc3dVisModel or radmc3dImage
+             Model visibilities. Pass a radmc3dVisModel to keep the Fourier transforms of the image between calls.
+
+    uvdata : radmc3dUVData
+             Measured visibilities (in Jy)
+
+    dpc    : float
+             Distance of the source in parsec
+
+    offset : tuple, optional
+             Offset (dx, dy) of the source relative to the phase centre in arcsec
+
+    scale  : float
+             Flux scaling factor of the model
+
+    rtol   : float
+             Maximum relative difference between the frequency of a visibility and that of its image channel
+
+    Returns
+    -------
+    Returns a dictionary with the following keys:
+
+        * chi2    : chi^2 = sum(weight * |vis - model|^2)
+        * loglike : Gaussian log-likelihood
+        * nvis    : number of visibilities
+        * vis     : model visibilities [Jy]
+    """
+
+    if not isinstance(model, radmc3dVisModel):
+        model = radmc3dVisModel(image=model)
+
+    ichan = uvdata.getChannels(freq=model.image.freq, rtol=rtol)
+
+    vismod = np.zeros(uvdata.nvis, dtype=np.complex128)
+    for iwav in np.unique(ichan):
+        ii = (ichan == iwav)
+        vismod[ii] = model.getVisibility(u=uvdata.u[ii], v=uvdata.v[ii], iwav=iwav, dpc=dpc, offset=offset,
+                                         scale=scale)
+
+    chi2 = (uvdata.weight * np.abs(uvdata.vis - vismod)**2).sum()
+    # The real and imaginary parts are independent Gaussian variables with variance 1/weight
+    ii = uvdata.weight > 0.
+    loglike = -0.5 * chi2 + np.log(uvdata.weight[ii] / (2. * np.pi)).sum()
+
+    return {'chi2': chi2, 'loglike': loglike, 'nvis': uvdata.nvis, 'vis': vismod}
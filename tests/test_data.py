@@ -0,0 +1,108 @@
+"""Tests of radmc3dData (reading the mean intensity in frequency chunks, floating point precision, vtk grid)
+"""
+import numpy as np
+import pytest
+
+from radmc3dPy import data
+from radmc3dPy import octree
+from radmc3dPy.reggrid import radmc3dGrid
+
+NX, NY, NZ, NFREQ = 4, 3, 2, 7
+
+
+def makeData():
+    grid = radmc3dGrid()
+    grid.nx, grid.ny, grid.nz = NX, NY, NZ
+
+    return data.radmc3dData(grid=grid)
+
+
+@pytest.fixture(scope='module')
+def radfield():
+    freq = np.geomspace(1e11, 1e15, NFREQ)
+    field = np.random.default_rng(1).random((NX, NY, NZ, NFREQ)) * 1e-10
+
+    return freq, field
+
+
+def writeRadiationField(fdir, freq, field, binary):
+    vals = field.ravel(order='F')
+    if binary:
+        fname = fdir / 'mean_intensity.bout'
+        with open(fname, 'wb') as wfile:
+            np.array([1, 8, NX * NY * NZ, NFREQ], dtype=np.int64).tofile(wfile)
+            freq.tofile(wfile)
+            vals.tofile(wfile)
+    else:
+        fname = fdir / 'mean_intensity.out'
+        with open(fname, 'w') as wfile:
+            wfile.write('1\n%d\n%d\n' % (NX * NY * NZ, NFREQ))
+            wfile.write(' '.join('%.15e' % f for f in freq) + '\n')
+            np.savetxt(wfile, vals, fmt='%.15e')
+
+
+@pytest.mark.parametrize('binary', [False, True])
+@pytest.mark.parametrize('chunksize', [1, 3, 7, 10])
+def test_integrate_chunks(tmp_path, radfield, binary, chunksize):
+    freq, field = radfield
+    writeRadiationField(tmp_path, freq, field, binary)
+    expected = data.integrateOverFrequency(field, nuCell=freq)
+
+    # The frequency grid is read by the call itself, so it can be passed in the same statement
+    d = makeData()
+    res = data.integrateOverFrequency(d.iterRadiationField(fdir=str(tmp_path), binary=binary, chunksize=chunksize),
+                                      nuCell=d.grid.radfreq)
+
+    np.testing.assert_allclose(d.grid.radfreq, freq, rtol=1e-14)
+    np.testing.assert_allclose(res, expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_chunks(tmp_path, radfield, binary):
+    freq, field = radfield
+    writeRadiationField(tmp_path, freq, field, binary)
+
+    d = makeData()
+    chunks = list(d.iterRadiationField(fdir=str(tmp_path), binary=binary, chunksize=3))
+    assert [sl for sl, _ in chunks] == [slice(0, 3), slice(3, 6), slice(6, 7)]
+    np.testing.assert_allclose(np.concatenate([val for _, val in chunks], axis=3), field, rtol=1e-14)
+
+    d.readRadiationField(fdir=str(tmp_path), binary=binary)
+    np.testing.assert_array_equal(np.concatenate([val for _, val in chunks], axis=3), d.radfield)
+
+
+def test_set_precision():
+    d = makeData()
+    d.rhogas = np.ones([NX, NY, NZ])
+    # ndens_mol is set directly by radmc3dModel before the precision is applied
+    d.ndens_mol = d.rhogas * 1e-4
+    d.setPrecision(4)
+
+    assert d.rhogas.dtype == np.float32
+    assert d.ndens_mol.dtype == np.float32
+
+
+def test_vtk_octree_points():
+    ppar = {'crd_sys': 'car', 'nx': [4], 'ny': [4], 'nz': [2], 'xbound': [-10., 10.], 'ybound': [-10., 12.],
+            'zbound': [-10., 10.], 'levelMaxLimit': 3}
+    grid = octree.radmc3dOctree()
+    grid.makeSpatialGrid(ppar=ppar, model='ppdisk',
+                         dfunc=lambda x, y, z, dx, dy, dz, **kwargs: np.sqrt(x**2 + y**2 + z**2) < 6. * dx + 1.)
+    grid.model = None
+    assert grid.levelMax > 1
+
+    d = data.radmc3dData(grid=grid)
+    points, dims, cells = d._getVTKGrid()
+    assert dims is None
+    assert cells.shape == (grid.nLeaf, 8)
+
+    # Each corner is written once and every leaf still gets its own corners (hexahedron order 0-7)
+    assert points.shape[0] == np.unique(points, axis=0).shape[0]
+    assert points.shape[0] < 4 * grid.nLeaf
+    order = d._getVTKLeafOrder()
+    sgn = np.array([[-1, -1, -1], [1, -1, -1], [1, 1, -1], [-1, 1, -1],
+                    [-1, -1, 1], [1, -1, 1], [1, 1, 1], [-1, 1, 1]])
+    centre = np.column_stack((grid.x, grid.y, grid.z))[order]
+    width = np.column_stack((grid.dx, grid.dy, grid.dz))[order]
+    for icorner in range(8):
+        np.testing.assert_array_equal(points[cells[:, icorner]], centre + sgn[icorner] * width)
@@ -0,0 +1,111 @@
+"""Tests of the parallel multi-view image driver (image.makeImages) with a stub radmc3d executable
+"""
+import os
+import sys
+import stat
+
+import numpy as np
+import pytest
+
+from radmc3dPy import image
+
+# Stand-in for radmc3d: writes an image whose pixels all equal the inclination. Lower inclinations take longer,
+# so parallel views finish in reverse order. A negative inclination makes the run fail with a message in the log.
+STUB = """#!{python}
+import os, sys, time
+import numpy as np
+a = sys.argv[1:]
+assert os.path.isfile('radmc3d.inp'), 'missing input'
+incl = float(a[a.index('incl') + 1])
+npix = int(a[a.index('npix') + 1])
+if incl < 0:
+    print('ERROR: bad incl')
+    sys.exit(1)
+time.sleep(0.1 + 0.01 * (90. - incl) / 10.)
+nwav = 2
+img = np.full((nwav, npix, npix), incl)
+if 'imageunform' in a:
+    with open('image.bout', 'wb') as f:
+        np.array([1, npix, npix, nwav], dtype=np.int64).tofile(f)
+        np.array([1e12, 1e12, 1., 2.]).tofile(f)
+        img.tofile(f)
+else:
+    with open('image.out', 'w') as f:
+        f.write('1\\n%d %d\\n%d\\n1e12 1e12\\n1.0\\n2.0\\n\\n' % (npix, npix, nwav))
+        for iw in range(nwav):
+            np.savetxt(f, img[iw].ravel())
+            f.write('\\n')
+"""
+
+
+@pytest.fixture
+def model(tmp_path, monkeypatch):
+    bindir = tmp_path / 'bin'
+    bindir.mkdir()
+    exe = bindir / 'radmc3d'
+    exe.write_text(STUB.format(python=sys.executable))
+    exe.chmod(exe.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv('PATH', str(bindir) + os.pathsep + os.environ.get('PATH', ''))
+
+    fdir = tmp_path / 'model'
+    fdir.mkdir()
+    (fdir / 'radmc3d.inp').write_text('nphot = 1\n')
+    scratch = tmp_path / 'scratch'
+    scratch.mkdir()
+
+    return str(fdir), str(scratch)
+
+
+def getViews(incl, **kwargs):
+    return [dict(npix=4, incl=i, wav=1., sizeau=100., **kwargs) for i in incl]
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_views_in_order(model, binary):
+    fdir, scratch = model
+    incl = [10., 30., 50., 70., 90.]
+    images = image.makeImages(views=getViews(incl), fdir=fdir, nproc=3, binary=binary, scratchdir=scratch)
+
+    assert len(images) == len(incl)
+    for im, i in zip(images, incl):
+        assert im.image.shape == (4, 4, 2)
+        assert np.all(im.image == i)
+
+
+def test_fname_copied(model):
+    fdir, scratch = model
+    views = getViews([20., 40.])
+    views[1]['fname'] = 'image_40.out'
+    images = image.makeImages(views=views, fdir=fdir, nproc=2, scratchdir=scratch)
+
+    assert os.path.isfile(os.path.join(fdir, 'image_40.out'))
+    assert images[1].filename == os.path.join(fdir, 'image_40.out')
+    assert np.all(image.readImage(fname=os.path.join(fdir, 'image_40.out')).image == 40.)
+    assert not os.path.isfile(os.path.join(fdir, 'image.out'))
+
+
+def test_failure_raises_with_log(model):
+    fdir, scratch = model
+    with pytest.raises(ValueError, match='ERROR: bad incl'):
+        image.makeImages(views=getViews([10., -1., 30.]), fdir=fdir, nproc=2, scratchdir=scratch)
+
+
+def test_scratch_removed(model):
+    fdir, scratch = model
+    image.makeImages(views=getViews([10., 20.]), fdir=fdir, nproc=2, scratchdir=scratch)
+    assert os.listdir(scratch) == []
+
+    with pytest.raises(ValueError):
+        image.makeImages(views=getViews([-1.]), fdir=fdir, nproc=1, scratchdir=scratch)
+    assert os.listdir(scratch) == []
+
+
+def test_scratch_kept(model):
+    fdir, scratch = model
+    image.makeImages(views=getViews([10., 20.]), fdir=fdir, nproc=2, scratchdir=scratch, keep=True)
+
+    sdirs = os.listdir(scratch)
+    assert len(sdirs) == 2
+    for sdir in sdirs:
+        assert os.path.isfile(os.path.join(scratch, sdir, 'image.out'))
+        assert os.path.isfile(os.path.join(scratch, sdir, 'radmc3d.log'))
@@ -0,0 +1,154 @@
+"""Tests of the persistent radmc3d child-mode session (image.radmc3dSession) with a stand-in child script
+"""
+import os
+import sys
+import stat
+import time
+
+import numpy as np
+import pytest
+
+from radmc3dPy import image
+
+# Stand-in for 'radmc3d child': reads commands from stdin (one argument per line, terminated by 'enter') and writes
+# images and spectra to stdout in the format of image.out / spectrum.out. Pixel values are incl + iwav + ipix with
+# x being the fastest varying pixel index. Each start and each quit is logged to session.log.
+STUB = """#!{python}
+import sys
+assert sys.argv[1:] == ['child']
+log = open('session.log', 'a')
+log.write('start\\n')
+log.flush()
+args = []
+for line in sys.stdin:
+    tok = line.strip()
+    if tok == 'quit':
+        log.write('quit\\n')
+        break
+    if tok != 'enter':
+        args.append(tok)
+        continue
+    if args[0] == 'spectrum':
+        print(1)
+        print(3)
+        print()
+        for w in (1., 2., 3.):
+            print(w, w * 10.)
+    else:
+        npix = int(args[args.index('npix') + 1])
+        incl = float(args[args.index('incl') + 1])
+        stokes = 'stokes' in args
+        print(3 if stokes else 1)
+        print(npix, npix)
+        print(2)
+        print(1e12, 1e12)
+        print(10.)
+        print(20.)
+        for iw in range(2):
+            print()
+            for i in range(npix * npix):
+                print(*([incl + iw + i] * (4 if stokes else 1)))
+    sys.stdout.flush()
+    args = []
+log.close()
+"""
+
+
+@pytest.fixture
+def fdir(tmp_path):
+    exe = tmp_path / 'radmc3d'
+    exe.write_text(STUB.format(python=sys.executable))
+    exe.chmod(exe.stat().st_mode | stat.S_IEXEC)
+
+    return str(tmp_path)
+
+
+def getLog(fdir):
+    with open(os.path.join(fdir, 'session.log'), 'r') as rfile:
+        return rfile.read().split()
+
+
+def getExpected(incl, npix, nwav=2):
+    ipix = np.arange(npix * npix).reshape([npix, npix], order='F')
+    return np.stack([incl + iw + ipix for iw in range(nwav)], axis=2)
+
+
+def test_image_sweep(fdir):
+    with image.radmc3dSession(fdir=fdir) as sess:
+        images = [sess.makeImage(npix=5, incl=incl, wav=10., sizeau=100.) for incl in range(50)]
+
+    assert getLog(fdir) == ['start', 'quit']
+    for incl, im in enumerate(images):
+        assert (im.nx, im.ny, im.nwav) == (5, 5, 2)
+        assert not im.stokes
+        np.testing.assert_array_equal(im.wav, [10., 20.])
+        np.testing.assert_array_equal(im.image, getExpected(incl, 5))
+        assert im.sizepix_x == 1e12
+
+
+def test_stokes_image(fdir):
+    with image.radmc3dSession(fdir=fdir) as sess:
+        im = sess.makeImage(npix=3, incl=30., wav=10., sizeau=100., stokes=True)
+
+    assert im.stokes
+    assert im.image.shape == (3, 3, 4, 2)
+    for istokes in range(4):
+        np.testing.assert_array_equal(im.image[:, :, istokes, :], getExpected(30., 3))
+
+
+def test_spectrum(fdir):
+    with image.radmc3dSession(fdir=fdir) as sess:
+        spec = sess.makeSpectrum(dpc=140., npix=10, incl=45., loadlambda=True, sizeau=100.)
+        # The process keeps running after a spectrum
+        im = sess.makeImage(npix=2, incl=10., wav=10., sizeau=100.)
+
+    np.testing.assert_array_equal(spec.wav, [1., 2., 3.])
+    np.testing.assert_array_equal(spec.image[0, 0, :], [10., 20., 30.])
+    assert spec.dpc == 140.
+    np.testing.assert_array_equal(im.image, getExpected(10., 2))
+
+
+def test_stop(fdir):
+    sess = image.radmc3dSession(fdir=fdir)
+    assert sess.isRunning()
+    proc = sess.proc
+    sess.stop()
+
+    assert not sess.isRunning()
+    assert sess.proc is None
+    assert proc.returncode == 0
+    assert getLog(fdir) == ['start', 'quit']
+    with pytest.raises(ValueError):
+        sess.makeImage(npix=2, incl=10., wav=10., sizeau=100.)
+
+    # Stopping twice is harmless and the session can be restarted
+    sess.stop()
+    with sess:
+        assert sess.isRunning()
+    assert getLog(fdir) == ['start', 'quit', 'start', 'quit']
+
+
+def test_context_manager_stops_on_error(fdir):
+    with pytest.raises(RuntimeError):
+        with image.radmc3dSession(fdir=fdir) as sess:
+            proc = sess.proc
+            raise RuntimeError('error in user code')
+
+    assert sess.proc is None
+    assert proc.returncode == 0
+    assert getLog(fdir) == ['start', 'quit']
+
+
+def test_stop_after_child_closed_stdin(tmp_path):
+    # A child that stops reading its input while still running, so the quit command cannot be delivered
+    exe = tmp_path / 'radmc3d'
+    exe.write_text('#!{python}\nimport os, time\nos.close(0)\ntime.sleep(0.5)\n'.format(python=sys.executable))
+    exe.chmod(exe.stat().st_mode | stat.S_IEXEC)
+
+    # The exception of the with block is not hidden by the failing flush of the quit command
+    with pytest.raises(RuntimeError):
+        with image.radmc3dSession(fdir=str(tmp_path)) as sess:
+            time.sleep(0.2)
+            raise RuntimeError('error in user code')
+
+    assert sess.proc is None
@@ -0,0 +1,70 @@
+"""Tests of the compact octree representation (radmc3dOctree.compact / expand)
+"""
+import numpy as np
+import pytest
+
+from radmc3dPy import octree
+
+FIELDS = ['x', 'y', 'z', 'dx', 'dy', 'dz', 'level', 'parentID', 'childID', 'leafID', 'isLeaf']
+
+
+def dfunc(x, y, z, dx, dy, dz, model=None, ppar=None, **kwargs):
+    # Refine towards the centre
+    return np.sqrt(x**2 + 0.5 * y**2 + z**2) < 3. * np.sqrt(dx**2 + dy**2 + dz**2) + 1.
+
+
+def makeTree():
+    ppar = {'crd_sys': 'car', 'nx': [6], 'ny': [6], 'nz': [4], 'xbound': [-10., 10.], 'ybound': [-10., 12.],
+            'zbound': [-10., 10.], 'levelMaxLimit': 3}
+    grid = octree.radmc3dOctree()
+    grid.makeSpatialGrid(ppar=ppar, dfunc=dfunc, model='ppdisk')
+    # The model module is not needed after the tree has been built
+    grid.model = None
+
+    return grid
+
+
+def getMemory(grid):
+    """Summed size of the array attributes of a tree in bytes
+    """
+    return sum(val.nbytes for val in grid.__dict__.values() if isinstance(val, np.ndarray))
+
+
+@pytest.fixture(scope='module')
+def tree():
+    grid = makeTree()
+    full = {key: np.array(getattr(grid, key)) for key in FIELDS}
+
+    return grid, full
+
+
+def test_compact_memory(tree):
+    grid, full = tree
+    assert grid.levelMax > 0
+
+    mem = [getMemory(grid)]
+    compact = makeTree()
+    compact.compact()
+    mem.append(getMemory(compact))
+    nocentres = makeTree()
+    nocentres.compact(dropCentres=True)
+    mem.append(getMemory(nocentres))
+
+    assert mem[0] > mem[1] > mem[2]
+
+
+@pytest.mark.parametrize('dropCentres', [False, True])
+def test_compact_expand(tree, dropCentres):
+    grid, full = tree
+    compact = makeTree()
+    compact.compact(dropCentres=dropCentres)
+
+    for key in FIELDS:
+        np.testing.assert_array_equal(getattr(compact, key), full[key], err_msg=key)
+    np.testing.assert_array_equal(compact.getCellVolume(), grid.getCellVolume())
+
+    compact.expand()
+    for key in FIELDS:
+        np.testing.assert_array_equal(getattr(compact, key), full[key], err_msg=key)
+        assert getattr(compact, key).dtype == full[key].dtype, key
+    assert getMemory(compact) == getMemory(grid)
@@ -0,0 +1,98 @@
+"""Tests of the visibility sampling of images (radmc3dImage.sampleVisibilities / getVisibility)
+"""
+import numpy as np
+import pytest
+
+from radmc3dPy import image
+from radmc3dPy import natconst as nc
+
+DPC = 100.
+NX, NY = 48, 40
+
+
+def makeImage(shift=(0, 0)):
+    """Two channel image of an elongated Gaussian and a point-like source, optionally shifted by an integer
+    number of pixels
+    """
+    img = image.radmc3dImage()
+    img.nx, img.ny = NX, NY
+    img.sizepix_x = img.sizepix_y = nc.au
+    img.x = (np.arange(NX) - 0.5 * (NX - 1)) * img.sizepix_x
+    img.y = (np.arange(NY) - 0.5 * (NY - 1)) * img.sizepix_y
+    img.nwav = img.nfreq = 2
+    img.wav = np.array([1000., 1300.])
+    img.freq = nc.cc * 1e4 / img.wav
+
+    xx, yy = np.meshgrid(img.x / nc.au - shift[0], img.y / nc.au - shift[1], indexing='ij')
+    img.image = np.zeros([NX, NY, 2])
+    for iwav in range(2):
+        img.image[:, :, iwav] = np.exp(-0.5 * ((xx / (2. + 0.5 * iwav))**2 + (yy / 1.5)**2))
+        img.image[NX // 2 + 4 + shift[0], NY // 2 - 3 + shift[1], iwav] += 0.5
+
+    return img
+
+
+def getBaselines(img, npt=300):
+    """Random baselines within the Nyquist limit of the image pixels
+    """
+    rng = np.random.default_rng(5)
+    umax = 0.5 / (img.sizepix_x / nc.au / DPC / 3600. / 180. * np.pi)
+    bl = rng.random(npt) * umax * img.wav.min() * 1e-6
+    pa = rng.random(npt) * 360.
+
+    return bl, pa
+
+
+def getError(vis, ref):
+    return np.abs(vis - ref).max(0) / np.abs(ref).max(0)
+
+
+@pytest.mark.parametrize('eps', [1e-6, 1e-12])
+@pytest.mark.parametrize('offset', [None, (0.03, -0.05)])
+def test_fft_dft(eps, offset):
+    img = makeImage()
+    bl, pa = getBaselines(img)
+    ref = img.getVisibility(bl=bl, pa=pa, dpc=DPC)
+
+    fft = img.sampleVisibilities(u=ref['u'], v=ref['v'], dpc=DPC, method='fft', eps=eps, offset=offset)
+    dft = img.sampleVisibilities(u=ref['u'], v=ref['v'], dpc=DPC, method='dft', offset=offset)
+
+    assert fft['vis'].shape == (bl.shape[0], img.nwav)
+    assert np.all(getError(fft['vis'], dft['vis']) < eps)
+
+    if offset is None:
+        # getVisibility returns single precision visibilities
+        assert np.all(getError(dft['vis'], ref['vis']) < 1e-6)
+        assert np.all(getError(fft['vis'], ref['vis']) < eps + 1e-6)
+
+
+@pytest.mark.parametrize('method', ['fft', 'dft'])
+def test_offset(method):
+    # An offset of an integer number of pixels is the same as shifting the image
+    shift = (3, -2)
+    img = makeImage()
+    shifted = makeImage(shift=shift)
+    bl, pa = getBaselines(img)
+    ref = shifted.getVisibility(bl=bl, pa=pa, dpc=DPC)
+
+    offset = (shift[0] / DPC, shift[1] / DPC)
+    vis = img.sampleVisibilities(u=ref['u'], v=ref['v'], dpc=DPC, method=method, eps=1e-12, offset=offset)
+    exact = shifted.sampleVisibilities(u=ref['u'], v=ref['v'], dpc=DPC, method='dft')
+
+    assert np.all(getError(vis['vis'], exact['vis']) < 1e-10)
+
+
+def test_uv_shape():
+    img = makeImage()
+    bl, pa = getBaselines(img, npt=20)
+    ref = img.getVisibility(bl=bl, pa=pa, dpc=DPC)
+
+    # The same (u,v) points for all channels
+    vis = img.sampleVisibilities(u=ref['u'][:, 0], v=ref['v'][:, 0], dpc=DPC, method='fft')
+    np.testing.assert_array_equal(vis['u'], np.repeat(ref['u'][:, :1], 2, axis=1))
+    assert vis['vis'].shape == (20, 2)
+
+    with pytest.raises(ValueError):
+        img.sampleVisibilities(u=ref['u'], v=ref['v'][:10], dpc=DPC)
+    with pytest.raises(ValueError):
+        img.sampleVisibilities(u=ref['u'], v=ref['v'], dpc=DPC, method='nufft')
@@ -10,7 +10,12 @@ def makemcImage(inc=[0., 45., 75., 90.], posang=None,
                 camwav=[434., 870., 2600., 9098.4], wavfname=None, 
                 npix=300, sizeau=None, phi=0., 
                 dotausurf=False, dooptdepth=False, dostokes=True, 
-                secondorder=False):
+                secondorder=False, nproc=None):
+    """ creates continuum images at several inclinations
+    nproc : int, optional
+        if set, the continuum images of the inclinations are calculated 
+        in parallel by at most nproc radmc3d processes (see image.makeImages)
+    """
     inc = np.array(inc, dtype=np.float64)
     ninc= len(inc)
 
@@ -22,12 +27,20 @@ def makemcImage(inc=[0., 45., 75., 90.], posang=None,
     clock_begin = time.time()
 
     # continuum
+    if nproc is not None:
+        views = [{'npix':npix, 'loadlambda':1, 'incl':inc[ii], 'phi':phi, 
+            'sizeau':sizeau, 'stokes':dostokes, 'secondorder':secondorder, 
+            'nostar':True, 'posang':posang, 
+            'fname':'myimage.i%d.out'%(inc[ii])} for ii in range(ninc)]
+        image.makeImages(views=views, nproc=nproc)
+
     for ii in range(ninc):
-        fname = 'myimage.i%d.out'%(inc[ii])
-        image.makeImage(npix=npix, loadlambda=1, incl=inc[ii], phi=phi, 
-            sizeau=sizeau, stokes=dostokes, secondorder=secondorder, nostar=True, 
-            posang=posang, 
-            fname=fname)
+        if nproc is None:
+            fname = 'myimage.i%d.out'%(inc[ii])
+            image.makeImage(npix=npix, loadlambda=1, incl=inc[ii], phi=phi, 
+                sizeau=sizeau, stokes=dostokes, secondorder=secondorder, nostar=True, 
+                posang=posang, 
+                fname=fname)
 
     # --------- make the tau surface or optical depth imag---------
         if (dotausurf or dooptdepth):
@@ -912,12 +912,12 @@ def commence(rundir, polunitlen=-2, dis=400, polmax=None,
         kpara90 = 1.
         korth90 = 1.
 
-    # read dust density and temperature
-    dat = analyze.readData(fdir=rundir, binary=False, ddens=True, dtemp=True)
-    # see if heatsource.inp exists to read accretion luminosity
-    if os.path.isfile(os.path.join(rundir, 'heatsource.inp')):
-        qvisdat = analyze.readData(fdir=rundir, binary=False, qvis=True)
-        acclum = qvisdat.getHeatingLum()
+    # dust density and temperature (and heatsource.inp if it exists) are read on first use
+    doqvis = os.path.isfile(os.path.join(rundir, 'heatsource.inp'))
+    dat = analyze.readData(fdir=rundir, binary=False, ddens=True, dtemp=True, qvis=doqvis, lazy=True)
+    # accretion luminosity
+    if doqvis:
+        acclum = dat.getHeatingLum()
     else:
         acclum = 0.
 